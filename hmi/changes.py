@@ -0,0 +1,103 @@
+from __future__ import annotations
+
+from typing import Dict, Optional, Tuple
+
+from .models import PLCConfig, SnapshotDelta, TunnelData
+from .signals import DEFAULT_REGISTRY, SignalRegistry
+from .snapshot import TunnelView
+
+
+class ChangeDetector:
+    """Detección de cambios entre instantáneas con banda muerta por campo.
+
+    Cada campo se compara con el último valor *emitido* (no con el del ciclo
+    anterior), de modo que una deriva lenta acaba saliendo de la banda en vez
+    de perderse. Cada ``keyframe_s`` segundos se emite la instantánea
+    completa; con ``keyframe_s <= 0`` todos los ciclos son completos. Los
+    campos salen del registro de señales: las analógicas con banda muerta y
+    las BOOL (más nombre y calidad) exactas.
+    """
+
+    def __init__(
+        self,
+        deadbands: Optional[Dict[str, float]] = None,
+        keyframe_s: float = 10.0,
+        signals: Optional[SignalRegistry] = None,
+    ):
+        signals = signals or DEFAULT_REGISTRY
+        self.analog_fields: Tuple[str, ...] = signals.analog_keys
+        self.exact_fields: Tuple[str, ...] = ("name",) + tuple(k for k in signals.keys if k in signals.bool_keys) + (
+            "quality",
+        )
+        self.all_fields = self.analog_fields + self.exact_fields
+        self.deadbands: Dict[str, float] = signals.deadbands(deadbands)
+        self.keyframe_s = float(keyframe_s)
+        self._sent: Dict[int, Dict[str, object]] = {}
+        self._next_keyframe = 0.0
+        self.cycles = 0
+        self.keyframes = 0
+        self.tunnels_sent = 0
+        self.fields_sent = 0
+
+    @classmethod
+    def from_config(cls, cfg: PLCConfig, signals: Optional[SignalRegistry] = None) -> "ChangeDetector":
+        return cls(
+            deadbands=getattr(cfg, "deadbands", None),
+            keyframe_s=getattr(cfg, "keyframe_interval_s", 10.0),
+            signals=signals,
+        )
+
+    def force_keyframe(self) -> None:
+        """Emitir la instantánea completa en el siguiente ciclo (p. ej. tras una reconexión)."""
+        self._next_keyframe = 0.0
+
+    def _changed(self, td: TunnelData, sent: Dict[str, object]) -> Tuple[str, ...]:
+        out = []
+        for f in self.analog_fields:
+            try:
+                # "not <=" también detecta NaN
+                if not abs(float(getattr(td, f)) - float(sent[f])) <= self.deadbands.get(f, 0.0):
+                    out.append(f)
+            except (AttributeError, KeyError, TypeError, ValueError):
+                out.append(f)
+        for f in self.exact_fields:
+            if getattr(td, f, None) != sent.get(f):
+                out.append(f)
+        return tuple(out)
+
+    def diff(self, data: Dict[int, TunnelData], now: float, ts: Optional[float] = None) -> SnapshotDelta:
+        """Comparar una instantánea con lo emitido y devolver solo lo que cambió."""
+        self.cycles += 1
+        keyframe = self.keyframe_s <= 0 or now >= self._next_keyframe
+        if keyframe:
+            self.keyframes += 1
+            self._next_keyframe = now + max(0.0, self.keyframe_s)
+        delta = SnapshotDelta(keyframe=keyframe)
+        if ts is not None:
+            delta.ts = ts
+        for tid, td in data.items():
+            sent = self._sent.get(tid)
+            if keyframe or sent is None:
+                fields = self.all_fields
+                sent = self._sent[tid] = {}
+            else:
+                fields = self._changed(td, sent)
+                if not fields:
+                    continue
+            for f in fields:
+                value = getattr(td, f, None)
+                sent[f] = dict(value) if isinstance(value, dict) else value
+            # Copia propia para la UI: la instantánea se reutiliza en el ciclo siguiente
+            delta.tunnels[tid] = td.detach() if isinstance(td, TunnelView) else td
+            delta.fields[tid] = fields
+            self.tunnels_sent += 1
+            self.fields_sent += len(fields)
+        return delta
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "delta_cycles": self.cycles,
+            "keyframes": self.keyframes,
+            "tunnels_sent": self.tunnels_sent,
+            "fields_sent": self.fields_sent,
+        }
@@ -0,0 +1,200 @@
+from __future__ import annotations
+
+import heapq
+from concurrent.futures import Future
+from itertools import count
+from threading import Lock
+from time import monotonic
+from typing import Callable, Dict, Hashable, List, Optional, Tuple
+
+from .models import CommandResult
+
+# Prioridades de las órdenes (menor = más urgente). Las de seguridad (paro,
+# cancelar deshielo) se ejecutan incluso entre dos peticiones de un ciclo de lectura.
+PRIORITY_SAFETY = 0
+PRIORITY_NORMAL = 1
+PRIORITY_LOW = 2
+
+# Ventana de agrupación de escrituras repetidas a un mismo tag (s)
+COALESCE_WINDOW_S = 0.15
+
+# Escritura simple agrupable: (túnel, clave de tag, valor)
+WriteItem = Tuple[int, str, object]
+
+
+class WriteCommand:
+    """Orden de escritura pendiente.
+
+    ``run`` ejecuta la orden y devuelve True si el PLC la aceptó. Las
+    escrituras simples de un valor declaran además ``write`` (túnel, clave,
+    valor) para poder agruparse con otras en una sola petición, y
+    ``coalesce_key`` para que una orden posterior al mismo tag sustituya su
+    valor mientras siga en cola (gana el último). ``delay_s`` retrasa la
+    ejecución para dar tiempo a esa agrupación.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        tunnel_id: int,
+        run: Callable[[], bool],
+        priority: int = PRIORITY_NORMAL,
+        callback: Optional[Callable[[CommandResult], None]] = None,
+        write: Optional[WriteItem] = None,
+        coalesce_key: Optional[Hashable] = None,
+        delay_s: float = 0.0,
+    ):
+        self.name = name
+        self.tunnel_id = tunnel_id
+        self.run = run
+        self.priority = priority
+        self.callback = callback
+        self.write = write
+        self.coalesce_key = coalesce_key
+        self.future: Future = Future()
+        self.created = monotonic()
+        self.due = self.created + max(0.0, delay_s)
+        # Órdenes sustituidas por esta (reciben el mismo resultado)
+        self.merged: List[WriteCommand] = []
+
+
+class CommandQueue:
+    """Cola de órdenes de escritura por prioridad, segura entre hilos.
+
+    La UI encola desde su hilo con ``submit`` (que devuelve un Future con el
+    CommandResult) y el hilo de sondeo las ejecuta con ``run_pending``: todas
+    cuando está libre y solo las de seguridad entre peticiones de lectura.
+    A igual prioridad se respeta el orden de llegada. Las escrituras simples
+    que vencen juntas se envían en bloque con ``batch_writer`` y cada una
+    recibe su propio resultado.
+    """
+
+    def __init__(
+        self,
+        last_error: Optional[Callable[[], Optional[str]]] = None,
+        batch_writer: Optional[Callable[[List[WriteItem]], List[Optional[str]]]] = None,
+    ):
+        self._heap: List[Tuple[int, int, WriteCommand]] = []
+        self._by_key: Dict[Hashable, WriteCommand] = {}
+        self._seq = count()
+        self._lock = Lock()
+        self._last_error = last_error
+        self._batch_writer = batch_writer
+
+    def submit(self, command: WriteCommand) -> Future:
+        with self._lock:
+            key = command.coalesce_key
+            queued = self._by_key.get(key) if key is not None else None
+            if queued is not None:
+                # Mismo tag aún en cola: gana el último valor, se conserva el plazo del primero
+                queued.run = command.run
+                queued.write = command.write
+                queued.merged.append(command)
+                return command.future
+            heapq.heappush(self._heap, (command.priority, next(self._seq), command))
+            if key is not None:
+                self._by_key[key] = command
+        return command.future
+
+    def pending(self, max_priority: int = PRIORITY_LOW) -> bool:
+        with self._lock:
+            return bool(self._heap) and self._heap[0][0] <= max_priority
+
+    def next_due(self) -> Optional[float]:
+        """Instante monotónico en que vence la próxima orden (None si no hay)."""
+        with self._lock:
+            return min((c.due for _, _, c in self._heap), default=None)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._heap)
+
+    def _take_due(self, max_priority: int) -> List[WriteCommand]:
+        """Sacar, en orden de prioridad y llegada, las órdenes vencidas hasta ``max_priority``."""
+        now = monotonic()
+        taken: List[WriteCommand] = []
+        keep: List[Tuple[int, int, WriteCommand]] = []
+        with self._lock:
+            while self._heap and self._heap[0][0] <= max_priority:
+                entry = heapq.heappop(self._heap)
+                cmd = entry[2]
+                if cmd.due > now:
+                    keep.append(entry)
+                    continue
+                if cmd.coalesce_key is not None:
+                    self._by_key.pop(cmd.coalesce_key, None)
+                taken.append(cmd)
+            for entry in keep:
+                heapq.heappush(self._heap, entry)
+        return taken
+
+    def run_pending(self, max_priority: int = PRIORITY_LOW) -> int:
+        """Ejecutar las órdenes vencidas hasta ``max_priority``; devuelve cuántas."""
+        done = 0
+        while True:
+            cmds = self._take_due(max_priority)
+            if not cmds:
+                return done
+            batch: List[WriteCommand] = []
+            for cmd in cmds:
+                if cmd.write is not None and self._batch_writer is not None:
+                    batch.append(cmd)
+                    continue
+                # Orden compuesta (p. ej. un pulso): antes se vacía el bloque pendiente para respetar el orden
+                self._flush(batch)
+                batch = []
+                self._run_one(cmd)
+            self._flush(batch)
+            done += len(cmds)
+
+    def _run_one(self, cmd: WriteCommand) -> None:
+        started = monotonic()
+        error = ""
+        try:
+            ok = bool(cmd.run())
+        except Exception as e:
+            ok = False
+            error = str(e)
+        if not ok and not error:
+            error = self._error_text()
+        self._finish(cmd, ok, error, started)
+
+    def _flush(self, batch: List[WriteCommand]) -> None:
+        if not batch:
+            return
+        started = monotonic()
+        try:
+            errors = self._batch_writer([cmd.write for cmd in batch])
+        except Exception as e:
+            errors = [str(e) or "Escritura fallida"] * len(batch)
+        for cmd, err in zip(batch, errors):
+            self._finish(cmd, err is None, err or "", started)
+
+    def _error_text(self) -> str:
+        if self._last_error is None:
+            return ""
+        try:
+            return self._last_error() or ""
+        except Exception:
+            return ""
+
+    def _finish(self, cmd: WriteCommand, ok: bool, error: str, started: float) -> None:
+        now = monotonic()
+        for c in [cmd] + cmd.merged:
+            result = CommandResult(
+                name=c.name,
+                tunnel_id=c.tunnel_id,
+                ok=ok,
+                error=error,
+                priority=c.priority,
+                queued_ms=(started - c.created) * 1000.0,
+                latency_ms=(now - c.created) * 1000.0,
+                coalesced=len(cmd.merged) if c is cmd else 0,
+            )
+            c.future.set_result(result)
+            # Las órdenes absorbidas solo avisan si su callback es distinto (la UI recibe un único resultado)
+            if c.callback is not None and (c is cmd or c.callback != cmd.callback):
+                try:
+                    c.callback(result)
+                except Exception:
+                    pass
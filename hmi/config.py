@@ -4,6 +4,7 @@ from pathlib import Path
 from typing import List, Optional
 
 from .models import AppConfig, PLCConfig, TagAddress, TunnelConfig
+from .signals import declared_signals, merge_signals
 
 
 class ConfigManager:
@@ -28,9 +29,20 @@ class ConfigManager:
         for t in data.get("tunnels", []):
             tags = {k: TagAddress(**v) for k, v in t.get("tags", {}).items()}
             calibrations = t.get("calibrations", {})
-            tunnels_list.append(TunnelConfig(id=t["id"], name=t["name"], tags=tags, calibrations=calibrations))
+            tunnels_list.append(
+                TunnelConfig(
+                    id=t["id"],
+                    name=t["name"],
+                    tags=tags,
+                    calibrations=calibrations,
+                    plc_id=t.get("plc_id", ""),
+                )
+            )
         ui = data.get("ui", {})
-        return AppConfig(plc=plc, tunnels=tunnels_list, ui=ui)
+        plcs = [PLCConfig(**p) for p in data.get("plcs", [])]
+        # Solo se guardan las diferencias con las señales estándar
+        signals = merge_signals(data.get("signals", []))
+        return AppConfig(plc=plc, tunnels=tunnels_list, ui=ui, plcs=plcs, signals=signals)
 
     def save(self, cfg: AppConfig) -> None:
         data = {
@@ -41,11 +53,17 @@ class ConfigManager:
                     "name": t.name,
                     "tags": {k: asdict(v) for k, v in t.tags.items()},
                     "calibrations": t.calibrations,
+                    **({"plc_id": t.plc_id} if t.plc_id else {}),
                 }
                 for t in cfg.tunnels
             ],
             "ui": cfg.ui,
         }
+        if cfg.plcs:
+            data["plcs"] = [asdict(p) for p in cfg.plcs]
+        signals = declared_signals(cfg.signals)
+        if signals:
+            data["signals"] = signals
         self.path.write_text(json.dumps(data, indent=2, ensure_ascii=False), encoding="utf-8")
 
     def default_config(self) -> AppConfig:
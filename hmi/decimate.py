@@ -0,0 +1,70 @@
+from __future__ import annotations
+
+from typing import Tuple
+
+import numpy as np
+
+
+def minmax(ts: np.ndarray, values: np.ndarray, buckets: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Reducir una serie a (como mucho) 2 puntos por tramo de tiempo: su mínimo y su máximo.
+
+    Conserva los picos (lo que importa en una alarma de temperatura) y el
+    orden temporal de cada par. Un tramo sin valores (todo NaN) deja un NaN,
+    que el gráfico dibuja como hueco. Vectorizado: sin bucles en Python.
+    """
+    n = len(ts)
+    if buckets <= 0 or n <= 2 * buckets:
+        return ts, values
+    edges = np.searchsorted(ts, np.linspace(ts[0], ts[-1], buckets + 1)[1:-1])
+    starts = np.unique(np.concatenate(([0], edges)))
+    starts = starts[starts < n]
+    idx = np.arange(n)
+    clean = np.where(np.isnan(values), np.inf, values)
+    lo = np.minimum.reduceat(clean, starts)
+    hi = np.maximum.reduceat(np.where(np.isnan(values), -np.inf, values), starts)
+    counts = np.diff(np.append(starts, n))
+    # Primera posición del mínimo y del máximo de cada tramo
+    first_lo = np.minimum.reduceat(np.where(clean == np.repeat(lo, counts), idx, n), starts)
+    first_hi = np.minimum.reduceat(np.where(values == np.repeat(hi, counts), idx, n), starts)
+    empty = np.isinf(lo)
+    first_lo[empty] = starts[empty]
+    first_hi[empty] = starts[empty]
+    a = np.minimum(first_lo, first_hi)
+    b = np.maximum(first_lo, first_hi)
+    pick = np.empty(2 * len(starts), dtype=np.intp)
+    pick[0::2] = a
+    pick[1::2] = b
+    out_v = values[pick].astype(np.float64)
+    out_v[np.repeat(empty, 2)] = np.nan
+    return ts[pick], out_v
+
+
+def lttb(ts: np.ndarray, values: np.ndarray, n_out: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Largest-Triangle-Three-Buckets: ``n_out`` puntos que conservan la forma visual de la serie.
+
+    Más fiel que min/max para curvas suaves, pero con un bucle por tramo;
+    los huecos (NaN) se descartan antes de reducir.
+    """
+    ok = ~np.isnan(values)
+    if not ok.all():
+        ts, values = ts[ok], values[ok]
+    n = len(ts)
+    if n_out < 3 or n <= n_out:
+        return ts, values
+    x = np.asarray(ts, dtype=np.float64)
+    y = np.asarray(values, dtype=np.float64)
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.intp)
+    pick = np.empty(n_out, dtype=np.intp)
+    pick[0] = 0
+    pick[-1] = n - 1
+    a = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+        # Media del tramo siguiente (el último punto para el último tramo)
+        nlo, nhi = hi, (edges[i + 2] if i + 2 < len(edges) else n)
+        cx = x[nlo:nhi].mean()
+        cy = y[nlo:nhi].mean()
+        area = np.abs((x[a] - cx) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (cy - y[a]))
+        a = lo + int(np.argmax(area))
+        pick[i + 1] = a
+    return ts[pick], values[pick]
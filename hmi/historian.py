@@ -0,0 +1,447 @@
+from __future__ import annotations
+
+import json
+import mmap
+import os
+import struct
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, List, Mapping, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .history import HISTORY_INTERVAL_S, sample_row
+from .signals import DEFAULT_REGISTRY, SignalRegistry
+
+# Cabecera de segmento: MAGIC + longitud (uint32) + JSON con la disposición, relleno a 8 bytes
+SEGMENT_MAGIC = b"HMIHIST1"
+SEGMENT_SUFFIX = ".seg"
+FSYNC_S = 60.0
+RETENTION_DAYS = 90
+# Periodo de cada segmento: formato del nombre y salto que seguro cae en el periodo siguiente
+_SEGMENTS = {"day": ("%Y%m%d", 36 * 3600.0), "month": ("%Y%m", 32 * 86400.0)}
+
+
+def _period_of(ts: float, segment: str = "day") -> str:
+    return time.strftime(_SEGMENTS[segment][0], time.localtime(ts))
+
+
+def _period_bounds(name: str, segment: str = "day") -> Tuple[float, float]:
+    """Inicio y fin (hora local) del periodo de un segmento (AAAAMMDD o AAAAMM)."""
+    fmt, jump = _SEGMENTS[segment]
+    start = time.mktime(time.strptime(name, fmt))
+    end = time.mktime(time.strptime(_period_of(start + jump, segment), fmt))
+    return start, end
+
+
+def record_dtype(n_keys: int, n_tunnels: int, n_aggs: int = 0) -> np.dtype:
+    """Registro de ancho fijo: sello (f8) + valores (f4) de todas las señales y túneles.
+
+    Con ``n_aggs`` (agregados de un nivel de resumen) los valores son
+    (agregados, señales, túneles).
+    """
+    shape = (n_aggs, n_keys, n_tunnels) if n_aggs else (n_keys, n_tunnels)
+    return np.dtype([("ts", "<f8"), ("v", "<f4", shape)])
+
+
+def _read_header(f) -> Tuple[dict, int]:
+    head = f.read(len(SEGMENT_MAGIC) + 4)
+    if len(head) < len(SEGMENT_MAGIC) + 4 or not head.startswith(SEGMENT_MAGIC):
+        raise ValueError("Segmento de histórico no válido")
+    (length,) = struct.unpack("<I", head[len(SEGMENT_MAGIC) :])
+    meta = json.loads(f.read(length).decode("utf-8"))
+    offset = len(head) + length
+    return meta, offset + (-offset) % 8
+
+
+def _header_bytes(meta: dict) -> bytes:
+    raw = json.dumps(meta, ensure_ascii=False).encode("utf-8")
+    out = SEGMENT_MAGIC + struct.pack("<I", len(raw)) + raw
+    return out + b"\0" * ((-len(out)) % 8)
+
+
+class DiskHistorian:
+    """Histórico en disco de solo anexado: un segmento por día con registros de ancho fijo.
+
+    Cada registro es una muestra de toda la planta (sello + señales × túneles
+    en float32). La cabecera del segmento guarda la disposición (claves y
+    túneles); si cambia a mitad de día se abre un segmento nuevo
+    (``AAAAMMDD-1.seg``). Escribe solo el hilo de adquisición: cada muestra va
+    al fichero al momento y se hace fsync como mucho cada ``fsync_s``
+    segundos, tanto al anexar como desde ``sync_due`` (que el hilo de
+    adquisición llama periódicamente aunque no lleguen muestras), así que un
+    corte pierde a lo sumo ese tramo. Al reabrir un
+    segmento se descarta el registro incompleto del final.
+
+    Los niveles de resumen (ver rollups.py) usan la misma clase con
+    ``aggregates`` (min, max, ...) y, si son gruesos, un segmento por mes.
+
+    Las consultas (``query``) pueden hacerse desde cualquier hilo: abren el
+    segmento con mmap y buscan el tramo por búsqueda binaria sobre los sellos,
+    sin cargar el fichero.
+    """
+
+    def __init__(
+        self,
+        directory,
+        tunnel_ids: Sequence[int],
+        keys: Sequence[str],
+        interval_s: float = HISTORY_INTERVAL_S,
+        fsync_s: float = FSYNC_S,
+        retention_days: int = RETENTION_DAYS,
+        aggregates: Sequence[str] = (),
+        segment: str = "day",
+    ):
+        self.directory = Path(directory)
+        self.tunnel_ids: Tuple[int, ...] = tuple(tunnel_ids)
+        self.keys: Tuple[str, ...] = tuple(keys)
+        self.index: Dict[int, int] = {tid: i for i, tid in enumerate(self.tunnel_ids)}
+        self.interval_s = max(0.0, float(interval_s))
+        self.fsync_s = max(0.0, float(fsync_s))
+        self.retention_days = int(retention_days)
+        self.aggregates: Tuple[str, ...] = tuple(aggregates)
+        self.segment = segment if segment in _SEGMENTS else "day"
+        self.dtype = record_dtype(len(self.keys), len(self.tunnel_ids), len(self.aggregates))
+        self._record = np.zeros(1, dtype=self.dtype)
+        self._row = np.zeros((len(self.keys), len(self.tunnel_ids)), dtype=np.float32)
+        self._file = None
+        self._period = ""
+        self._path: Optional[Path] = None
+        # Posición del primer registro en el segmento abierto (tras la cabecera)
+        self._first_record = 0
+        self._last_ts = float("-inf")
+        self._last_sync = 0.0
+        self._dirty = False
+        self.written = 0
+        self.errors = 0
+        self.last_error = ""
+
+    @classmethod
+    def from_config(cls, cfg, tunnels, signals: Optional[SignalRegistry] = None, root=None) -> "DiskHistorian":
+        signals = signals or DEFAULT_REGISTRY
+        directory = Path(getattr(cfg, "historian_dir", "history") or "history")
+        if not directory.is_absolute() and root is not None:
+            directory = Path(root) / directory
+        return cls(
+            directory,
+            [t.id for t in tunnels],
+            signals.history_keys(),
+            interval_s=getattr(cfg, "history_interval_s", HISTORY_INTERVAL_S),
+            fsync_s=getattr(cfg, "historian_fsync_s", FSYNC_S),
+            retention_days=getattr(cfg, "historian_retention_days", RETENTION_DAYS),
+        )
+
+    # --- Escritura (hilo de adquisición) ---------------------------------------
+
+    def _meta(self) -> dict:
+        return {
+            "keys": list(self.keys),
+            "tunnels": list(self.tunnel_ids),
+            "record_size": self.dtype.itemsize,
+            "interval_s": self.interval_s,
+            "aggregates": list(self.aggregates),
+            "segment": self.segment,
+        }
+
+    def _open(self, period: str) -> None:
+        self.close()
+        self.directory.mkdir(parents=True, exist_ok=True)
+        meta = self._meta()
+        n = 0
+        while True:
+            path = self.directory / (period + (f"-{n}" if n else "") + SEGMENT_SUFFIX)
+            if not path.exists():
+                header = _header_bytes(meta)
+                with open(path, "wb") as f:
+                    f.write(header)
+                    f.flush()
+                    os.fsync(f.fileno())
+                self._first_record = len(header)
+                break
+            try:
+                with open(path, "rb") as f:
+                    old, offset = _read_header(f)
+            except (OSError, ValueError):
+                old, offset = None, 0
+            if old is not None and all(old.get(k, []) == meta[k] for k in ("keys", "tunnels", "aggregates")):
+                # Mismo formato: seguir anexando tras el último registro completo
+                size = path.stat().st_size
+                whole = offset + (size - offset) // self.dtype.itemsize * self.dtype.itemsize
+                if whole != size:
+                    os.truncate(path, whole)
+                if whole > offset:
+                    with open(path, "rb") as f:
+                        f.seek(whole - self.dtype.itemsize)
+                        self._last_ts = float(np.frombuffer(f.read(8), dtype="<f8")[0])
+                self._first_record = offset
+                break
+            n += 1
+        self._file = open(path, "ab", buffering=0)
+        self._period = period
+        self._path = path
+        self._last_sync = time.monotonic()
+        self._prune(period)
+
+    def _prune(self, current: str) -> None:
+        """Borrar los segmentos cuyo periodo terminó hace más de ``retention_days``."""
+        if self.retention_days <= 0:
+            return
+        start = _period_bounds(current, self.segment)[0]
+        limit = _period_of(start - self.retention_days * 86400.0, self.segment)
+        for path in self.directory.glob("*" + SEGMENT_SUFFIX):
+            if _segment_order(path)[0] < limit:
+                try:
+                    path.unlink()
+                except OSError:
+                    pass
+
+    def append(self, data: Mapping, ts: Optional[float] = None) -> bool:
+        """Anexar la muestra de un ciclo; False si aún no toca o falló el disco (ver ``last_error``)."""
+        ts = float(getattr(data, "ts", 0.0) if ts is None else ts)
+        if ts - self._last_ts < 0.9 * self.interval_s:
+            return False
+        return self.append_row(ts, sample_row(data, self.tunnel_ids, self.index, self.keys, self._row))
+
+    def append_row(self, ts: float, row: np.ndarray, replace: bool = False) -> bool:
+        """Anexar un registro ya preparado (valores con la forma de ``dtype["v"]``).
+
+        Con ``replace`` un registro con el mismo sello que el último lo
+        sustituye (intervalo de resumen guardado a medias al cerrar).
+        """
+        # Los sellos de un segmento deben crecer (búsqueda binaria)
+        if ts < self._last_ts or (ts == self._last_ts and not replace):
+            return False
+        try:
+            period = _period_of(ts, self.segment)
+            if period != self._period or self._file is None:
+                self._open(period)
+                if ts < self._last_ts or (ts == self._last_ts and not replace):
+                    return False
+            self._record["ts"][0] = ts
+            self._record["v"][0] = row
+            if ts == self._last_ts and self._overwrite_last(self._record.tobytes()):
+                self._dirty = True
+                self.sync_due()
+                return True
+            self._file.write(self._record.tobytes())
+            self._last_ts = ts
+            self._dirty = True
+            self.written += 1
+            self.sync_due()
+            return True
+        except OSError as e:
+            self.errors += 1
+            self.last_error = str(e)
+            self.close()
+            return False
+
+    def _overwrite_last(self, data: bytes) -> bool:
+        """Escribir ``data`` sobre el último registro del segmento abierto; False si no tiene registros.
+
+        Se sobrescribe en su sitio, sin truncar, para no invalidar los mmap de las consultas en curso.
+        """
+        pos = os.fstat(self._file.fileno()).st_size - len(data)
+        if pos < self._first_record:
+            return False
+        with open(self._path, "r+b") as f:
+            f.seek(pos)
+            f.write(data)
+        return True
+
+    def sync_due(self) -> bool:
+        """fsync de lo escrito si han pasado ``fsync_s`` desde el último; True si lo hizo."""
+        if not self._dirty or time.monotonic() - self._last_sync < self.fsync_s:
+            return False
+        try:
+            self.sync()
+        except OSError as e:
+            self.errors += 1
+            self.last_error = str(e)
+            self.close()
+            return False
+        return True
+
+    def sync(self) -> None:
+        if self._file is not None and self._dirty:
+            os.fsync(self._file.fileno())
+            self._dirty = False
+        self._last_sync = time.monotonic()
+
+    def close(self) -> None:
+        if self._file is None:
+            return
+        try:
+            self.sync()
+        except OSError:
+            pass
+        try:
+            self._file.close()
+        except OSError:
+            pass
+        self._file = None
+        self._period = ""
+        self._dirty = False
+
+    # --- Consulta (cualquier hilo) ---------------------------------------------
+
+    def segments(self, since: Optional[float] = None, until: Optional[float] = None) -> List[Path]:
+        """Segmentos que pueden tener muestras entre ``since`` y ``until``, en orden."""
+        out = []
+        if not self.directory.exists():
+            return out
+        for path in sorted(self.directory.glob("*" + SEGMENT_SUFFIX), key=_segment_order):
+            try:
+                start, end = _period_bounds(_segment_order(path)[0], self.segment)
+            except ValueError:
+                continue
+            if (until is None or start <= until) and (since is None or end > since):
+                out.append(path)
+        return out
+
+    def query(
+        self,
+        tunnel_id: int,
+        key: str,
+        since: Optional[float] = None,
+        until: Optional[float] = None,
+        max_points: Optional[int] = None,
+        agg: str = "avg",
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Sellos y valores de una señal de un túnel entre ``since`` y ``until`` (incluidos).
+
+        Con ``max_points`` el rango se reduce por tramos de N registros a su
+        mínimo y su máximo (``envelope``), así que los picos cortos se
+        conservan. En un nivel de resumen ``agg`` elige el agregado; al
+        reducir se usan sus columnas min y max.
+        """
+        parts: List[Tuple[np.ndarray, np.ndarray]] = []
+        spans = []
+        for path in self.segments(since, until):
+            span = read_segment_span(path, since, until)
+            if span is not None:
+                spans.append((path, span))
+        total = sum(hi - lo for _, (_, lo, hi) in spans)
+        # Dos puntos (mínimo y máximo) por tramo
+        bucket = max(1, -(-total // max(1, max_points // 2))) if max_points else 1
+        for path, (meta, lo, hi) in spans:
+            try:
+                k = meta["keys"].index(key)
+                t = meta["tunnels"].index(tunnel_id)
+                aggs = meta.get("aggregates") or []
+                a_lo = a_hi = aggs.index(agg) if aggs else None
+                if aggs and bucket > 1:
+                    a_lo = aggs.index("min" if agg in ("avg", "last", "min") else agg)
+                    a_hi = aggs.index("max" if agg in ("avg", "last", "max") else agg)
+                parts.append(_read_column(path, lo, hi, bucket, k, t, a_lo, a_hi))
+            except (ValueError, OSError, BufferError):
+                continue
+        if not parts:
+            return np.empty(0, dtype=np.float64), np.empty(0, dtype=np.float32)
+        return np.concatenate([p[0] for p in parts]), np.concatenate([p[1] for p in parts])
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "historian_written": self.written,
+            "historian_errors": self.errors,
+            "historian_segment": self._path.name if self._path is not None else "",
+        }
+
+
+def _segment_order(path: Path):
+    stem = path.name[: -len(SEGMENT_SUFFIX)]
+    period, _, n = stem.partition("-")
+    return period, int(n or 0)
+
+
+@contextmanager
+def _mapped_records(path: Path):
+    """(meta, registros) de un segmento sobre un mmap de solo lectura; registros None si está vacío.
+
+    Las vistas obtenidas dentro del bloque no deben salir de él (se cierra el mmap).
+    """
+    with open(path, "rb") as f:
+        meta, offset = _read_header(f)
+        dtype = record_dtype(len(meta["keys"]), len(meta["tunnels"]), len(meta.get("aggregates", [])))
+        count = (os.fstat(f.fileno()).st_size - offset) // dtype.itemsize
+        if count <= 0:
+            yield meta, None
+            return
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            holder = [np.frombuffer(mm, dtype=dtype, count=count, offset=offset)]
+            yield meta, holder
+        finally:
+            holder.clear()
+            mm.close()
+
+
+def read_segment_span(path: Path, since: Optional[float], until: Optional[float]):
+    """(meta, lo, hi) de los registros del segmento entre ``since`` y ``until``, o None."""
+    try:
+        with _mapped_records(path) as (meta, holder):
+            if holder is None:
+                return None
+            ts = holder[0]["ts"]
+            lo = 0 if since is None else int(np.searchsorted(ts, since, side="left"))
+            hi = len(ts) if until is None else int(np.searchsorted(ts, until, side="right"))
+            del ts
+    except (OSError, ValueError, BufferError):
+        return None
+    return (meta, lo, hi) if hi > lo else None
+
+
+def envelope(ts: np.ndarray, low: np.ndarray, high: np.ndarray, bucket: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Mínimo de ``low`` y máximo de ``high`` por tramo de ``bucket`` muestras, en orden temporal.
+
+    ``low`` y ``high`` son la misma serie en bruto o las columnas min y max
+    de un nivel de resumen. Un tramo sin valores deja un NaN (hueco).
+    """
+    n = len(ts)
+    nb = -(-n // bucket)
+    pad = nb * bucket - n
+    lo_f = np.pad(np.where(np.isnan(low), np.inf, low), (0, pad), constant_values=np.inf).reshape(nb, bucket)
+    hi_f = np.pad(np.where(np.isnan(high), -np.inf, high), (0, pad), constant_values=-np.inf).reshape(nb, bucket)
+    rows = np.arange(nb)
+    j_lo = lo_f.argmin(axis=1)
+    j_hi = hi_f.argmax(axis=1)
+    v_lo = lo_f[rows, j_lo]
+    v_hi = hi_f[rows, j_hi]
+    i_lo = rows * bucket + j_lo
+    i_hi = rows * bucket + j_hi
+    lo_first = i_lo <= i_hi
+    idx = np.empty(2 * nb, dtype=np.intp)
+    idx[0::2] = np.where(lo_first, i_lo, i_hi)
+    idx[1::2] = np.where(lo_first, i_hi, i_lo)
+    values = np.empty(2 * nb, dtype=np.float32)
+    values[0::2] = np.where(lo_first, v_lo, v_hi)
+    values[1::2] = np.where(lo_first, v_hi, v_lo)
+    values[~np.isfinite(values)] = np.nan
+    # Un solo punto si mínimo y máximo son la misma muestra con el mismo valor (o el tramo está vacío)
+    keep = np.ones(2 * nb, dtype=bool)
+    keep[1::2] = (i_lo != i_hi) | (v_lo != v_hi)
+    keep[1::2] &= np.isfinite(v_lo)
+    return ts[idx[keep]], values[keep]
+
+
+def _read_column(
+    path: Path,
+    lo: int,
+    hi: int,
+    bucket: int,
+    k: int,
+    t: int,
+    a_lo: Optional[int] = None,
+    a_hi: Optional[int] = None,
+) -> Tuple[np.ndarray, np.ndarray]:
+    with _mapped_records(path) as (_meta, holder):
+        sel = holder[0][lo:hi]
+        low = sel["v"][:, k, t] if a_lo is None else sel["v"][:, a_lo, k, t]
+        high = sel["v"][:, k, t] if a_hi is None else sel["v"][:, a_hi, k, t]
+        ts = sel["ts"].copy()
+        if bucket > 1:
+            out = envelope(ts, np.array(low, dtype=np.float32), np.array(high, dtype=np.float32), bucket)
+        else:
+            out = ts, low.copy()
+        del sel, low, high
+    return out
@@ -0,0 +1,185 @@
+from __future__ import annotations
+
+from threading import Lock
+from typing import Dict, Mapping, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .models import QUALITY_GOOD, QUALITY_STALE
+from .signals import DEFAULT_REGISTRY, SignalRegistry
+from .snapshot import PlantSnapshot
+
+# Historia en memoria por defecto: 4 h de muestras de 1 s
+HISTORY_SECONDS = 4 * 3600.0
+HISTORY_INTERVAL_S = 1.0
+
+
+def sample_row(data: Mapping, tunnel_ids: Tuple[int, ...], index: Dict[int, int], keys: Sequence[str], row: np.ndarray):
+    """Volcar las señales ``keys`` de una instantánea en ``row`` (señales × túneles).
+
+    Lo que no tiene valor válido (calidad ni buena ni STALE, túnel sin datos)
+    queda como NaN. Con una PlantSnapshot de la misma disposición se copia
+    columna a columna, sin recorrer túneles.
+    """
+    row.fill(np.nan)
+    if isinstance(data, PlantSnapshot) and data.ids == tunnel_ids:
+        present = np.frombuffer(data.present, dtype=np.uint8).astype(bool)
+        for i, key in enumerate(keys):
+            column = data.values.get(key)
+            if column is None:
+                continue
+            q = np.asarray(data.quality[key])
+            ok = present & ((q == QUALITY_GOOD) | (q == QUALITY_STALE))
+            np.copyto(row[i], column, where=ok)
+        return row
+    for tid, td in data.items():
+        col = index.get(tid)
+        if col is None:
+            continue
+        quality = getattr(td, "quality", {}) or {}
+        for i, key in enumerate(keys):
+            if quality.get(key, QUALITY_GOOD) in (QUALITY_GOOD, QUALITY_STALE):
+                try:
+                    row[i, col] = float(getattr(td, key))
+                except (AttributeError, TypeError, ValueError):
+                    pass
+    return row
+
+
+class RingHistory:
+    """Histórico reciente en memoria: un búfer circular por túnel y señal.
+
+    Todo se reserva al crear el objeto: ``values`` es un array
+    (señales, túneles, 2·capacidad) y ``ts`` un array (2·capacidad,) con el
+    sello de cada muestra, común a toda la planta. Cada muestra se escribe en
+    su posición y en la réplica ``capacidad`` más allá, de modo que cualquier
+    ventana es un tramo contiguo y ``window`` devuelve vistas sin copiar.
+    Añadir es O(1) y la memoria no pasa de ``nbytes``.
+
+    Escribe solo el hilo de adquisición (``append``); las vistas que devuelve
+    ``window`` siguen siendo válidas hasta que el búfer da la vuelta
+    (``capacity`` muestras más tarde). Los valores sin calidad válida o de
+    túneles sin datos en el ciclo se guardan como NaN.
+    """
+
+    def __init__(
+        self,
+        tunnel_ids: Sequence[int],
+        keys: Sequence[str],
+        capacity: int,
+        interval_s: float = HISTORY_INTERVAL_S,
+        dtype=np.float32,
+    ):
+        self.tunnel_ids: Tuple[int, ...] = tuple(tunnel_ids)
+        self.keys: Tuple[str, ...] = tuple(keys)
+        self.capacity = max(1, int(capacity))
+        self.interval_s = max(0.0, float(interval_s))
+        self.index: Dict[int, int] = {tid: i for i, tid in enumerate(self.tunnel_ids)}
+        self.key_index: Dict[str, int] = {k: i for i, k in enumerate(self.keys)}
+        self.values = np.full((len(self.keys), len(self.tunnel_ids), 2 * self.capacity), np.nan, dtype=dtype)
+        self.ts = np.zeros(2 * self.capacity, dtype=np.float64)
+        # Muestra de un ciclo antes de publicarla (evita reservar en cada append)
+        self._row = np.full((len(self.keys), len(self.tunnel_ids)), np.nan, dtype=dtype)
+        self._head = 0
+        self._count = 0
+        self._last_ts = float("-inf")
+        self._lock = Lock()
+        self.appended = 0
+        self.skipped = 0
+
+    @classmethod
+    def from_config(cls, cfg, tunnels, signals: Optional[SignalRegistry] = None) -> "RingHistory":
+        signals = signals or DEFAULT_REGISTRY
+        interval = float(getattr(cfg, "history_interval_s", HISTORY_INTERVAL_S)) or HISTORY_INTERVAL_S
+        seconds = float(getattr(cfg, "history_seconds", HISTORY_SECONDS))
+        return cls([t.id for t in tunnels], signals.history_keys(), int(seconds / interval), interval)
+
+    @staticmethod
+    def memory_bytes(n_tunnels: int, n_keys: int, capacity: int, itemsize: int = 4) -> int:
+        """Memoria que reservaría un RingHistory con estas dimensiones."""
+        return 2 * capacity * (n_keys * n_tunnels * itemsize + 8) + n_keys * n_tunnels * itemsize
+
+    @property
+    def nbytes(self) -> int:
+        return self.values.nbytes + self.ts.nbytes + self._row.nbytes
+
+    def __len__(self) -> int:
+        return self._count
+
+    def clear(self) -> None:
+        with self._lock:
+            self._head = 0
+            self._count = 0
+            self._last_ts = float("-inf")
+
+    def append(self, data: Mapping, ts: Optional[float] = None) -> bool:
+        """Añadir la muestra de un ciclo; False si aún no toca (``interval_s``) o no hay túneles."""
+        ts = float(getattr(data, "ts", 0.0) if ts is None else ts)
+        if ts < self._last_ts:
+            # El reloj retrocedió: la búsqueda por tiempo necesita sellos crecientes
+            self.clear()
+        elif ts - self._last_ts < 0.9 * self.interval_s:
+            self.skipped += 1
+            return False
+        row = sample_row(data, self.tunnel_ids, self.index, self.keys, self._row)
+        pos = self._head
+        self.values[:, :, pos] = row
+        self.values[:, :, pos + self.capacity] = row
+        self.ts[pos] = ts
+        self.ts[pos + self.capacity] = ts
+        # Publicar la muestra ya escrita
+        with self._lock:
+            self._head = (pos + 1) % self.capacity
+            self._count = min(self._count + 1, self.capacity)
+            self._last_ts = ts
+        self.appended += 1
+        return True
+
+    def _span(self) -> Tuple[int, int]:
+        with self._lock:
+            return (self._head - self._count) % self.capacity, self._count
+
+    def window(
+        self,
+        tunnel_id: int,
+        key: str,
+        since: Optional[float] = None,
+        until: Optional[float] = None,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Vistas (sellos, valores) de una señal de un túnel entre ``since`` y ``until`` (incluidos)."""
+        k = self.key_index[key]
+        t = self.index[tunnel_id]
+        start, count = self._span()
+        ts = self.ts[start : start + count]
+        lo = 0 if since is None else int(np.searchsorted(ts, since, side="left"))
+        hi = count if until is None else int(np.searchsorted(ts, until, side="right"))
+        hi = max(lo, hi)
+        return ts[lo:hi], self.values[k, t, start + lo : start + hi]
+
+    def last(self, tunnel_id: int, key: str, seconds: float) -> Tuple[np.ndarray, np.ndarray]:
+        """Ventana de los últimos ``seconds`` segundos."""
+        with self._lock:
+            end = self._last_ts
+        return self.window(tunnel_id, key, since=end - float(seconds))
+
+    def oldest(self) -> Optional[float]:
+        """Sello de la muestra más antigua retenida (None si está vacío)."""
+        start, count = self._span()
+        return float(self.ts[start]) if count else None
+
+    def latest(self, tunnel_id: int, key: str) -> Optional[Tuple[float, float]]:
+        start, count = self._span()
+        if not count:
+            return None
+        pos = start + count - 1
+        return float(self.ts[pos]), float(self.values[self.key_index[key], self.index[tunnel_id], pos])
+
+    def stats(self) -> Dict[str, float]:
+        start, count = self._span()
+        return {
+            "history_samples": count,
+            "history_capacity": self.capacity,
+            "history_span_s": float(self.ts[start + count - 1] - self.ts[start]) if count else 0.0,
+            "history_bytes": self.nbytes,
+            "history_skipped": self.skipped,
+        }
@@ -1,5 +1,5 @@
 from dataclasses import dataclass, field
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Tuple
 from time import time
 
 
@@ -18,16 +18,132 @@ class TunnelConfig:
     name: str
     tags: Dict[str, TagAddress]
     calibrations: Dict[str, float] = field(default_factory=dict)  # offsets por señal
+    # PLC que controla el túnel (PLCConfig.id); vacío = PLC principal
+    plc_id: str = ""
+
+
+# Clases de escaneo de señales: "fast" en cada ciclo (poll_interval_ms), "slow"
+# cada slow_interval_ms y "on_demand" solo mientras el detalle del túnel está abierto
+SCAN_FAST = "fast"
+SCAN_SLOW = "slow"
+SCAN_ON_DEMAND = "on_demand"
+
+
+@dataclass
+class SignalDef:
+    """Señal de túnel declarada en el registro (AppConfig.signals).
+
+    ``tags`` son las claves de tag que la alimentan, por orden de preferencia
+    (vacío = la propia ``key``). Las señales ``source="computed"`` no se leen
+    del PLC (las calcula la adquisición). Un túnel sin tag para una señal
+    ``required`` queda fuera del plan de lectura.
+    """
+
+    key: str
+    type: str = "REAL"  # "REAL" o "BOOL"
+    scan_class: str = SCAN_FAST
+    unit: str = ""
+    deadband: float = 0.0
+    label: str = ""
+    tags: List[str] = field(default_factory=list)
+    required: bool = False
+    source: str = "plc"  # "plc" o "computed"
+    # Guardar en el histórico y mostrar en el detalle (si no tiene control propio)
+    history: bool = True
+    ui: bool = True
+
+
+def default_signals() -> List[SignalDef]:
+    """Señales estándar de un túnel."""
+    return [
+        SignalDef("temp_ambiente", "REAL", SCAN_FAST, "°C", 0.05, "Ambiente", required=True),
+        SignalDef("temp_pulpa1", "REAL", SCAN_FAST, "°C", 0.05, "Pulpa 1", required=True),
+        SignalDef("temp_pulpa2", "REAL", SCAN_FAST, "°C", 0.05, "Pulpa 2", required=True),
+        SignalDef("setpoint", "REAL", SCAN_SLOW, "°C", 0.05, "Setpoint", required=True),
+        SignalDef("setpoint_pulpa1", "REAL", SCAN_ON_DEMAND, "°C", 0.05, "SP Pulpa 1"),
+        SignalDef("setpoint_pulpa2", "REAL", SCAN_ON_DEMAND, "°C", 0.05, "SP Pulpa 2"),
+        SignalDef("estado", "BOOL", SCAN_FAST, "", 0.0, "Estado", required=True),
+        SignalDef(
+            "deshielo_activo",
+            "BOOL",
+            SCAN_FAST,
+            "",
+            0.0,
+            "Deshielo",
+            tags=["deshielo_activo", "deshielo_mando", "deshielo_set", "deshielo_onoff"],
+        ),
+        SignalDef("valvula_posicion", "REAL", SCAN_ON_DEMAND, "%", 0.5, "Válvula"),
+        # La UI muestra el tiempo de enfriamiento al segundo
+        SignalDef("tiempo_enfriamiento", "REAL", SCAN_FAST, "s", 1.0, "Tiempo", source="computed", history=False),
+    ]
+
+
+def default_scan_classes() -> Dict[str, str]:
+    """Clase por defecto de cada clave de tag; las no listadas son "fast"."""
+    return {s.key: s.scan_class for s in default_signals() if s.source == "plc" and s.scan_class != SCAN_FAST}
+
+
+def default_deadbands() -> Dict[str, float]:
+    """Banda muerta por campo de TunnelData para la detección de cambios (unidades del campo)."""
+    return {s.key: s.deadband for s in default_signals() if s.deadband > 0}
+
+
+def default_rollups() -> Dict[str, int]:
+    """Niveles de resumen del histórico y su retención en días."""
+    return {"1m": 365, "1h": 3650}
 
 
 @dataclass
 class PLCConfig:
+    # Identificador del PLC en topologías con varios controladores
+    id: str = "plc1"
     ip: str = "192.168.0.1"
     rack: int = 0
     slot: int = 1
     port: int = 102
     poll_interval_ms: int = 1000
     simulation: bool = True
+    # Intervalo adaptativo: entre poll_min_ms y poll_max_ms según carga y ritmo de cambio (°C/s)
+    adaptive_poll: bool = True
+    poll_min_ms: int = 250
+    poll_max_ms: int = 5000
+    poll_change_threshold: float = 0.05
+    # Modo de lectura: "multi" (read_multi_vars agrupando tags) o "single" (una petición por tag)
+    read_mode: str = "multi"
+    # Reconexión en segundo plano: espera inicial y máxima entre intentos (s)
+    reconnect_base_s: float = 0.5
+    reconnect_cap_s: float = 30.0
+    # Conexiones simultáneas al PLC para repartir las lecturas (1 = sin pool)
+    connections: int = 1
+    # Periodo del grupo lento y clase de escaneo por clave de tag
+    slow_interval_ms: int = 10000
+    scan_classes: Dict[str, str] = field(default_factory=default_scan_classes)
+    # Segundos entre reintentos de una dirección rechazada por el PLC (cuarentena)
+    quarantine_retry_s: float = 30.0
+    # Hueco máximo en bytes para fusionar tags vecinos de un mismo DB en una lectura (< 0 desactiva)
+    coalesce_gap: int = 16
+    # Detección de cambios: banda muerta por campo y periodo de la instantánea completa (s)
+    deadbands: Dict[str, float] = field(default_factory=default_deadbands)
+    keyframe_interval_s: float = 10.0
+    # Histórico en memoria (RingHistory): segundos retenidos y periodo de muestreo
+    history_seconds: float = 4 * 3600.0
+    history_interval_s: float = 1.0
+    # Histórico en disco: "file" (segmentos diarios), "sqlite" o "" (desactivado); carpeta relativa a la app
+    historian: str = "file"
+    historian_dir: str = "history"
+    historian_fsync_s: float = 60.0
+    historian_retention_days: int = 90
+    # SQLite: segundos entre transacciones del hilo escritor
+    historian_batch_s: float = 5.0
+    # Niveles de resumen (min/max/media/último): periodo -> días retenidos; {} = solo bruto
+    rollups: Dict[str, int] = field(default_factory=default_rollups)
+
+
+# Calidad de una señal leída (TunnelData.quality)
+QUALITY_GOOD = 0  # leída correctamente en este ciclo
+QUALITY_BAD_ADDRESS = 1  # el PLC rechaza la dirección (en cuarentena)
+QUALITY_COMM_ERROR = 2  # fallo de comunicación y sin valor previo
+QUALITY_STALE = 3  # fallo de comunicación; se conserva el último valor bueno
 
 
 @dataclass
@@ -45,6 +161,61 @@ class TunnelData:
     valvula_posicion: float = 0.0
     tiempo_enfriamiento: float = 0.0  # segundos con el túnel encendido
     ts: float = field(default_factory=time)
+    # Calidad (QUALITY_*) y sello de tiempo de origen por campo; vacío = todo bueno
+    quality: Dict[str, int] = field(default_factory=dict)
+    source_ts: Dict[str, float] = field(default_factory=dict)
+    # Señales del registro sin campo propio (clave -> valor); accesibles también como atributo
+    extra: Dict[str, float] = field(default_factory=dict)
+
+    def __getattr__(self, name: str):
+        extra = self.__dict__.get("extra")
+        if extra is not None and name in extra:
+            return extra[name]
+        raise AttributeError(name)
+
+
+@dataclass
+class SnapshotDelta:
+    """Cambios de un ciclo de adquisición respecto a lo ya emitido.
+
+    ``tunnels`` solo lleva los túneles con algún campo fuera de su banda
+    muerta y ``fields`` qué campos cambiaron en cada uno. En una instantánea
+    completa (``keyframe``) van todos los túneles y todos sus campos.
+    """
+
+    tunnels: Dict[int, TunnelData] = field(default_factory=dict)
+    fields: Dict[int, Tuple[str, ...]] = field(default_factory=dict)
+    keyframe: bool = False
+    ts: float = field(default_factory=time)
+
+
+@dataclass
+class ConnectionEvent:
+    """Cambio de estado de la conexión con un PLC."""
+
+    plc: str
+    connected: bool
+    ts: float = field(default_factory=time)
+    # Duración del corte que termina (solo en reconexiones) e intentos necesarios
+    outage_s: float = 0.0
+    attempts: int = 0
+    error: str = ""
+
+
+@dataclass
+class CommandResult:
+    """Resultado de una orden de escritura encolada."""
+
+    name: str
+    tunnel_id: int
+    ok: bool
+    error: str = ""
+    priority: int = 1
+    # Espera en cola y latencia total desde que se pulsó (ms)
+    queued_ms: float = 0.0
+    latency_ms: float = 0.0
+    # Órdenes repetidas al mismo tag absorbidas por esta (gana el último valor)
+    coalesced: int = 0
 
 
 @dataclass
@@ -52,3 +223,11 @@ class AppConfig:
     plc: PLCConfig
     tunnels: List[TunnelConfig]
     ui: dict = field(default_factory=dict)
+    # PLC adicionales; los túneles se asignan con TunnelConfig.plc_id
+    plcs: List[PLCConfig] = field(default_factory=list)
+    # Registro de señales (las declaradas en config se combinan por clave con las estándar)
+    signals: List[SignalDef] = field(default_factory=default_signals)
+
+    def all_plcs(self) -> List[PLCConfig]:
+        """PLC principal seguido de los adicionales."""
+        return [self.plc] + [p for p in self.plcs if p.id != self.plc.id]
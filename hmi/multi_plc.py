@@ -0,0 +1,272 @@
+from __future__ import annotations
+
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from concurrent.futures import TimeoutError as FutureTimeout
+from time import monotonic, time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from .models import ConnectionEvent, PLCConfig, TunnelConfig
+from .plc_client import BasePLC
+from .signals import SignalRegistry
+from .snapshot import PlantSnapshot
+
+
+class _Controller:
+    """Un PLC de la topología con su propio hilo (snap7 exige usar el cliente siempre desde el mismo)."""
+
+    def __init__(self, plc_id: str, plc, tunnel_ids: List[int]):
+        self.id = plc_id
+        self.plc = plc
+        self.tunnel_ids = tunnel_ids
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"plc-{plc_id}")
+        # Lectura en curso (si un PLC lento no terminó, no se lanza otra)
+        self.pending: Optional[Future] = None
+        # Escrituras pendientes (función, argumentos, Future): las ejecuta el hilo del PLC
+        # entre dos peticiones de la lectura en curso o, si no lee, en cuanto queda libre
+        self.writes: deque = deque()
+        # Última instantánea completa del PLC (su doble búfer la protege de la lectura en curso)
+        self.last: Optional[PlantSnapshot] = None
+        # Posición de sus túneles en la instantánea combinada, por disposición de origen
+        self.dst_idx: Tuple[Tuple[int, ...], List[int]] = ((), [])
+        self.connected = False
+        self.cycle_ms = 0.0
+
+
+class MultiPLC(BasePLC):
+    """Varios PLC leídos en paralelo como si fueran uno.
+
+    Cada controlador se lee en su hilo y los resultados se combinan en un
+    único diccionario por túnel. Si un PLC no responde dentro del plazo del
+    ciclo, sus túneles se entregan con el último valor leído marcado como
+    obsoleto (STALE) y su lectura sigue en segundo plano sin frenar al resto.
+    Las escrituras se dirigen al PLC del túnel y se ejecutan en su hilo,
+    sin esperar a que termine su lectura: el ``preempt_hook`` de cada PLC las
+    atiende entre dos peticiones del ciclo en curso.
+    """
+
+    def __init__(
+        self,
+        cfg: PLCConfig,
+        tunnels: List[TunnelConfig],
+        controllers: Dict[str, BasePLC],
+        signals: Optional[SignalRegistry] = None,
+    ):
+        super().__init__(cfg, tunnels, signals)
+        by_plc: Dict[str, List[int]] = {}
+        for t in tunnels:
+            by_plc.setdefault(t.plc_id or cfg.id, []).append(t.id)
+        self._controllers: Dict[str, _Controller] = {
+            pid: _Controller(pid, plc, by_plc.get(pid, [])) for pid, plc in controllers.items()
+        }
+        self._route: Dict[int, _Controller] = {
+            tid: ctl for ctl in self._controllers.values() for tid in ctl.tunnel_ids
+        }
+        for ctl in self._controllers.values():
+            ctl.plc.preempt_hook = lambda ctl=ctl: self._drain_writes(ctl)
+        # Plazo para esperar a los PLC en cada ciclo y para las escrituras
+        self.read_timeout_s = max(0.2, 0.8 * cfg.poll_interval_ms / 1000.0)
+        self.write_timeout_s = 5.0
+
+    @staticmethod
+    def _drain_writes(ctl: _Controller) -> None:
+        """Ejecutar las escrituras pendientes de un PLC; solo desde su hilo."""
+        while ctl.writes:
+            try:
+                fn, args, fut = ctl.writes.popleft()
+            except IndexError:
+                return
+            # Cancelada por timeout del llamante: ya no se escribe
+            if not fut.set_running_or_notify_cancel():
+                continue
+            try:
+                fut.set_result(fn(*args))
+            except Exception as e:
+                fut.set_exception(e)
+
+    def _submit(self, ctl: _Controller, method: str, *args) -> Future:
+        """Encolar una llamada al PLC sin ponerla detrás de su lectura en curso."""
+        fut: Future = Future()
+        ctl.writes.append((getattr(ctl.plc, method), args, fut))
+        # Si el PLC está leyendo, la atiende su preempt_hook antes; si no, esta tarea
+        ctl.executor.submit(self._drain_writes, ctl)
+        return fut
+
+    def _wait(self, fut: Future, timeout: Optional[float] = None):
+        try:
+            return fut.result(timeout=self.write_timeout_s if timeout is None else timeout)
+        except FutureTimeout:
+            fut.cancel()
+            raise
+
+    def _run(self, ctl: _Controller, method: str, *args, timeout: Optional[float] = None):
+        """Ejecutar un método del PLC en su hilo y esperar el resultado."""
+        return self._wait(self._submit(ctl, method, *args), timeout)
+
+    def connect(self) -> bool:
+        ok = True
+        for ctl in self._controllers.values():
+            try:
+                ctl.connected = bool(self._run(ctl, "connect"))
+            except Exception:
+                ctl.connected = False
+            ok = ok and ctl.connected
+        return ok
+
+    def disconnect(self) -> None:
+        for ctl in self._controllers.values():
+            ctl.connected = False
+            ctl.executor.submit(ctl.plc.disconnect)
+
+    def is_connected(self) -> bool:
+        """Conectado solo si lo están todos los PLC."""
+        return all(ctl.connected for ctl in self._controllers.values())
+
+    def _read_one(self, ctl: _Controller, scan_classes) -> PlantSnapshot:
+        started = monotonic()
+        try:
+            return ctl.plc.read_all(scan_classes)
+        finally:
+            ctl.connected = bool(ctl.plc.is_connected())
+            ctl.cycle_ms = (monotonic() - started) * 1000.0
+
+    @staticmethod
+    def _merge(ctl: _Controller, src: Optional[PlantSnapshot], out: PlantSnapshot, stale: bool = False) -> None:
+        """Copiar los túneles de un PLC a la instantánea combinada (STALE si no respondió)."""
+        if src is None:
+            return
+        if ctl.dst_idx[0] != src.ids:
+            ctl.dst_idx = (src.ids, [out.index.get(tid, -1) for tid in src.ids])
+        if -1 in ctl.dst_idx[1]:
+            # Túnel fuera de la topología: no debería ocurrir; se ignora el PLC antes que romper el ciclo
+            return
+        src.copy_into(out, stale=stale, dst_idx=ctl.dst_idx[1])
+
+    def read_all(self, scan_classes: Optional[Iterable[str]] = None) -> PlantSnapshot:
+        classes = None if scan_classes is None else set(scan_classes)
+        for ctl in self._controllers.values():
+            if ctl.pending is None:
+                ctl.pending = ctl.executor.submit(self._read_one, ctl, classes)
+        deadline = monotonic() + self.read_timeout_s
+        # Esperar por tramos cortos para atender las órdenes urgentes mientras tanto
+        waiting = {ctl.pending for ctl in self._controllers.values()}
+        while waiting:
+            remaining = deadline - monotonic()
+            _, waiting = wait(waiting, timeout=max(0.0, min(0.05, remaining)))
+            self._preempt()
+            if remaining <= 0:
+                break
+        out = self._snaps.next()
+        out.clear()
+        out.ts = time()
+        for ctl in self._controllers.values():
+            fut = ctl.pending
+            try:
+                data = fut.result(timeout=0)
+            except FutureTimeout:
+                # PLC lento: se entrega lo último conocido y se recoge en un ciclo posterior
+                self._merge(ctl, ctl.last, out, stale=True)
+                continue
+            except Exception as e:
+                data = None
+                self._last_error = f"PLC {ctl.id}: {e}"
+            ctl.pending = None
+            if data:
+                ctl.last = data
+                self._merge(ctl, data, out)
+            else:
+                self._merge(ctl, ctl.last, out, stale=True)
+            if not ctl.connected:
+                err = ctl.plc.last_error()
+                if err:
+                    self._last_error = f"PLC {ctl.id}: {err}"
+        return out
+
+    # Escrituras: al PLC del túnel, en su hilo
+    def _write(self, method: str, tunnel_id: int, *args) -> bool:
+        ctl = self._route.get(tunnel_id)
+        if ctl is None:
+            self._last_error = f"Túnel {tunnel_id} sin PLC asignado"
+            return False
+        try:
+            ok = bool(self._run(ctl, method, tunnel_id, *args))
+        except Exception as e:
+            self._last_error = f"PLC {ctl.id}: escritura sin respuesta ({e or 'timeout'})"
+            return False
+        if not ok:
+            err = ctl.plc.last_error()
+            if err:
+                self._last_error = f"PLC {ctl.id}: {err}"
+        return ok
+
+    def write_setpoint(self, tunnel_id: int, value: float) -> bool:
+        return self._write("write_setpoint", tunnel_id, value)
+
+    def write_estado(self, tunnel_id: int, value: bool) -> bool:
+        return self._write("write_estado", tunnel_id, value)
+
+    def write_setpoint_p1(self, tunnel_id: int, value: float) -> bool:
+        return self._write("write_setpoint_p1", tunnel_id, value)
+
+    def write_setpoint_p2(self, tunnel_id: int, value: float) -> bool:
+        return self._write("write_setpoint_p2", tunnel_id, value)
+
+    def write_by_key(self, tunnel_id: int, tag_key: str, value) -> bool:
+        return self._write("write_by_key", tunnel_id, tag_key, value)
+
+    def write_many(self, items: List[Tuple[int, str, object]]) -> List[Optional[str]]:
+        """Agrupar por PLC y escribir cada grupo en el hilo de su PLC, en paralelo."""
+        results: List[Optional[str]] = [None] * len(items)
+        groups: Dict[str, List[int]] = {}
+        for n, (tunnel_id, _, _) in enumerate(items):
+            ctl = self._route.get(tunnel_id)
+            if ctl is None:
+                results[n] = f"Túnel {tunnel_id} sin PLC asignado"
+            else:
+                groups.setdefault(ctl.id, []).append(n)
+        futures = []
+        for pid, idx in groups.items():
+            ctl = self._controllers[pid]
+            futures.append((ctl, idx, self._submit(ctl, "write_many", [items[n] for n in idx])))
+        for ctl, idx, fut in futures:
+            try:
+                out = self._wait(fut)
+            except Exception as e:
+                out = [f"PLC {ctl.id}: escritura sin respuesta ({e or 'timeout'})"] * len(idx)
+            for n, r in zip(idx, out):
+                results[n] = None if r is None else f"PLC {ctl.id}: {r}"
+        return results
+
+    def read_stats(self) -> Dict[str, int]:
+        stats: Dict[str, int] = {}
+        for ctl in self._controllers.values():
+            try:
+                for k, v in ctl.plc.read_stats().items():
+                    if isinstance(v, (int, float)) and k != "pdu_size":
+                        stats[k] = stats.get(k, 0) + v
+            except Exception:
+                pass
+            stats[f"cycle_ms_{ctl.id}"] = round(ctl.cycle_ms, 1)
+        stats["plcs"] = len(self._controllers)
+        return stats
+
+    def set_on_demand_tunnels(self, tunnel_ids: Iterable[int]) -> None:
+        ids = set(tunnel_ids)
+        super().set_on_demand_tunnels(ids)
+        for ctl in self._controllers.values():
+            ctl.plc.set_on_demand_tunnels(ids.intersection(ctl.tunnel_ids))
+
+    def invalidate_read_plan(self) -> None:
+        for ctl in self._controllers.values():
+            ctl.plc.invalidate_read_plan()
+
+    def drain_events(self) -> List[ConnectionEvent]:
+        events: List[ConnectionEvent] = []
+        for ctl in self._controllers.values():
+            try:
+                for ev in ctl.plc.drain_events():
+                    ev.plc = ctl.id
+                    events.append(ev)
+            except Exception:
+                pass
+        return events
@@ -1,15 +1,76 @@
 from __future__ import annotations
 
-from typing import Dict, List, Optional, Union
+import ctypes
+from concurrent.futures import Future, ThreadPoolExecutor
+from threading import Lock
+from time import monotonic, time
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
 
-from .models import PLCConfig, TagAddress, TunnelConfig, TunnelData
+from .models import (
+    QUALITY_BAD_ADDRESS,
+    SCAN_ON_DEMAND,
+    ConnectionEvent,
+    PLCConfig,
+    TagAddress,
+    TunnelConfig,
+)
+from .read_plan import (
+    DEFAULT_PDU_SIZE,
+    PlanGroup,
+    PlanLocation,
+    ReadPlan,
+    ValueBuffer,
+    chunk_writes,
+    compile_read_plan,
+)
+from .signals import DEFAULT_REGISTRY, SignalRegistry
+from .snapshot import PlantSnapshot, SnapshotBuffers, fill_from_buffer, gather_map
+from .supervisor import ReconnectSupervisor, tcp_probe
+
+
+# Longitudes de palabra de S7: bit (S7WLBit, Start = byte·8 + bit) y byte (S7WLByte)
+S7_WL_BIT = 0x01
+S7_WL_BYTE = 0x02
+
+
+class _PoolLink:
+    """Conexión adicional del pool de lectura, atada a su propio hilo de trabajo.
+
+    snap7 no admite usar un mismo cliente desde varios hilos, así que cada
+    conexión se crea, se usa y se reconecta siempre en el mismo hilo.
+    """
+
+    def __init__(self, index: int):
+        self.index = index
+        self.client = None
+        self.connected = False
+        self.last_error: Optional[str] = None
+        self.requests = 0
+        self.next_retry = 0.0
+        # Conexión o lectura aún en curso en el hilo de la conexión
+        self.pending: Optional[Future] = None
+        # Buffer propio de las lecturas de esta conexión (se copia al del ciclo solo si el lote termina a tiempo)
+        self.plan: Optional[ReadPlan] = None
+        self.buf: Optional[ValueBuffer] = None
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"snap7-pool-{index}")
 
 
 class BasePLC:
-    def __init__(self, cfg: PLCConfig, tunnels: List[TunnelConfig]):
+    def __init__(self, cfg: PLCConfig, tunnels: List[TunnelConfig], signals: Optional[SignalRegistry] = None):
         self.cfg = cfg
         self.tunnels_map: Dict[int, TunnelConfig] = {t.id: t for t in tunnels}
+        # Registro de señales: qué se lee y qué columnas tiene la instantánea
+        self.signals: SignalRegistry = signals or DEFAULT_REGISTRY
         self._last_error: Optional[str] = None
+        # Plan de lectura compilado (se construye en el primer ciclo)
+        self._plan: Optional[ReadPlan] = None
+        self._plan_valid = False
+        # Túneles con el detalle abierto: habilitan las señales "on_demand"
+        self._on_demand: set = set()
+        # Llamado entre peticiones de lectura para ejecutar órdenes urgentes (p. ej. un paro)
+        self.preempt_hook: Optional[Callable[[], None]] = None
+        # Instantáneas en columnas, en doble búfer (read_all entrega una y rellena la otra)
+        self._snaps = SnapshotBuffers([t.id for t in tunnels], [t.name for t in tunnels], self.signals)
 
     # API esperada
     def connect(self) -> bool:
@@ -21,7 +82,12 @@ class BasePLC:
     def is_connected(self) -> bool:
         raise NotImplementedError
 
-    def read_all(self) -> Dict[int, TunnelData]:
+    def read_all(self, scan_classes: Optional[Iterable[str]] = None) -> PlantSnapshot:
+        """Leer todos los túneles; con ``scan_classes`` solo se refrescan esas clases.
+
+        Devuelve una PlantSnapshot (se usa como ``Dict[int, TunnelData]``);
+        sigue siendo válida hasta la lectura después de la siguiente.
+        """
         raise NotImplementedError
 
     def write_setpoint(self, tunnel_id: int, value: float) -> bool:
@@ -40,13 +106,52 @@ class BasePLC:
     def write_by_key(self, tunnel_id: int, tag_key: str, value) -> bool:
         raise NotImplementedError
 
+    def write_many(self, items: List[Tuple[int, str, object]]) -> List[Optional[str]]:
+        """Escribir varios tags (túnel, clave de tag, valor).
+
+        Devuelve por ítem None si se escribió o el mensaje de error. Por
+        defecto escribe uno a uno; Snap7PLC los agrupa en write_multi_vars.
+        """
+        results: List[Optional[str]] = []
+        for tunnel_id, tag_key, value in items:
+            try:
+                ok = self.write_by_key(tunnel_id, tag_key, value)
+            except Exception as e:
+                ok = False
+                self._last_error = str(e)
+            results.append(None if ok else (self._last_error or "Escritura fallida"))
+        return results
+
+    def read_stats(self) -> Dict[str, int]:
+        """Métricas del plan de lectura (PDU, tramos, peticiones por ciclo)."""
+        return {}
+
+    def set_on_demand_tunnels(self, tunnel_ids: Iterable[int]) -> None:
+        """Túneles cuyas señales "on_demand" deben leerse (detalle abierto)."""
+        self._on_demand = set(tunnel_ids)
+
+    def invalidate_read_plan(self) -> None:
+        """Descartar el plan compilado; se recompila en la próxima lectura."""
+        self._plan_valid = False
+
+    def drain_events(self) -> List[ConnectionEvent]:
+        """Eventos de conexión (caídas y reconexiones) pendientes de publicar."""
+        return []
+
+    def _preempt(self) -> None:
+        if self.preempt_hook is not None:
+            try:
+                self.preempt_hook()
+            except Exception:
+                pass
+
     def last_error(self) -> Optional[str]:
         return self._last_error
 
 
 class Snap7PLC(BasePLC):
-    def __init__(self, cfg: PLCConfig, tunnels: List[TunnelConfig]):
-        super().__init__(cfg, tunnels)
+    def __init__(self, cfg: PLCConfig, tunnels: List[TunnelConfig], signals: Optional[SignalRegistry] = None):
+        super().__init__(cfg, tunnels, signals)
         # Carga perezosa de snap7
         try:
             from snap7.client import Client  # type: ignore
@@ -57,6 +162,22 @@ class Snap7PLC(BasePLC):
                 from snap7.snap7types import Areas as _Areas  # type: ignore
         except Exception as e:
             raise RuntimeError(f"python-snap7 no disponible: {e}")
+        # Estructura de ítem para lecturas multi-variable (opcional según versión)
+        try:
+            try:
+                from snap7.types import S7DataItem as _S7DataItem  # type: ignore
+            except Exception:
+                from snap7.snap7types import S7DataItem as _S7DataItem  # type: ignore
+        except Exception:
+            _S7DataItem = None
+        self._S7DataItem = _S7DataItem
+        # "multi" agrupa tags en read_multi_vars; "single" conserva una petición por tag
+        mode = str(getattr(cfg, "read_mode", "multi") or "multi").lower()
+        if mode == "multi" and _S7DataItem is None:
+            mode = "single"
+        self.read_mode = mode
+        # Hueco máximo (bytes) para fusionar tags vecinos en un mismo tramo; < 0 desactiva
+        self.coalesce_gap = int(getattr(cfg, "coalesce_gap", 16))
         self._Client = Client
         self._get_real = get_real
         self._set_real = set_real
@@ -78,6 +199,36 @@ class Snap7PLC(BasePLC):
         # que se crea en el hilo correcto y con parámetros limpios
         self.client = None
         self._connected = False
+        # PDU negociada con la CPU (240/480/960); se actualiza en cada conexión
+        self.pdu_size = DEFAULT_PDU_SIZE
+        # Peticiones S7 emitidas en el último ciclo de lectura
+        self.requests_per_cycle = 0
+        # Buffer de valores del ciclo, reutilizado mientras no cambie el plan
+        self._values: Optional[ValueBuffer] = None
+        self._gather: dict = {}
+        # Cuarentena de direcciones rechazadas: clave de ubicación -> próximo reintento
+        self.quarantine_retry_s = float(getattr(cfg, "quarantine_retry_s", 30.0))
+        self._quarantine: Dict[tuple, float] = {}
+        self._plan_excluded: set = set()
+        # Clases del registro de señales; PLCConfig.scan_classes las ajusta por clave de tag
+        self.scan_classes: Dict[str, str] = self.signals.scan_classes(getattr(cfg, "scan_classes", None))
+        # Pool de lectura: conexiones adicionales a la principal, cada una en su hilo
+        connections = max(1, int(getattr(cfg, "connections", 1) or 1))
+        self._pool: List[_PoolLink] = [_PoolLink(n) for n in range(1, connections)]
+        # Segundos entre reintentos de una conexión del pool caída y espera máxima por su lote
+        self.pool_retry_s = 5.0
+        self.pool_timeout_s = 5.0
+        # Cliente ya conectado por el supervisor, a la espera de que lo adopte el hilo de adquisición
+        self._handover = None
+        self._client_lock = Lock()
+        # Reconexión en segundo plano: read_all y las escrituras nunca esperan a connect()
+        self._supervisor = ReconnectSupervisor(
+            self._reconnect,
+            self._probe,
+            base_s=float(getattr(cfg, "reconnect_base_s", 0.5)),
+            cap_s=float(getattr(cfg, "reconnect_cap_s", 30.0)),
+            name=str(getattr(cfg, "id", "") or cfg.ip),
+        )
 
     def connect(self) -> bool:
         try:
@@ -94,49 +245,148 @@ class Snap7PLC(BasePLC):
                 except Exception as _:
                     pass
 
-                # Nota: puerto 102 es el predeterminado; algunos wrappers no lo exponen directamente.
-                # Pasar puerto desde configuración si está disponible y reintentar con 102 si falla
-                port_to_use = getattr(self.cfg, "port", 102) or 102
-                connected = False
-                try:
-                    try:
-                        self.client.connect(self.cfg.ip, self.cfg.rack, self.cfg.slot, port_to_use)
-                        connected = True
-                    except TypeError:
-                        # Compatibilidad con versiones antiguas de python-snap7 sin argumento tcpport
-                        self.client.connect(self.cfg.ip, self.cfg.rack, self.cfg.slot)
-                        connected = True
-                except Exception as e1:
-                    # Fallback con puerto 102 si el puerto configurado no es 102
-                    if port_to_use != 102:
-                        try:
-                            try:
-                                self.client.connect(self.cfg.ip, self.cfg.rack, self.cfg.slot, 102)
-                                connected = True
-                            except TypeError:
-                                self.client.connect(self.cfg.ip, self.cfg.rack, self.cfg.slot)
-                                connected = True
-                        except Exception as e2:
-                            self._last_error = f"Conexión fallida (puerto {port_to_use} y fallback 102): {e1} / {e2}"
-                            self._connected = False
-                            return False
-                    else:
-                        self._last_error = f"Conexión fallida (puerto {port_to_use}): {e1}"
-                        self._connected = False
-                        return False
+                err = self._dial(self.client)
+                if err:
+                    self._last_error = err
+                    self._connected = False
+                    return False
                 self._connected = True
+                self._update_pdu_size()
+                self._supervisor.resume()
+                self._supervisor.report_up()
             return True
         except Exception as e:
             self._last_error = f"Conexión fallida: {e}"
             self._connected = False
             return False
 
+    def _probe(self) -> bool:
+        """Sonda TCP rápida al PLC antes de intentar la conexión snap7 completa."""
+        port = int(getattr(self.cfg, "port", 102) or 102)
+        if tcp_probe(self.cfg.ip, (port,) if port == 102 else (port, 102)) is None:
+            self._last_error = f"PLC {self.cfg.ip} no responde (puerto {port})"
+            return False
+        return True
+
+    def _reconnect(self) -> bool:
+        """Intento de reconexión; se ejecuta en el hilo del supervisor.
+
+        El cliente nuevo se conecta aparte y se deja en ``_handover``; el hilo
+        de adquisición lo adopta en su siguiente lectura o escritura
+        (``_adopt_client``). Así ``self.client`` solo se usa y se sustituye
+        desde ese hilo: snap7 no admite compartir un cliente entre hilos.
+        """
+        client = self._Client()
+        err = self._dial(client)
+        if err:
+            self._last_error = err
+            self._destroy_client(client)
+            return False
+        with self._client_lock:
+            unused, self._handover = self._handover, client
+        # Uno anterior que nadie llegó a adoptar
+        if unused is not None:
+            self._destroy_client(unused)
+        return True
+
+    @staticmethod
+    def _destroy_client(client) -> None:
+        try:
+            client.disconnect()
+        except Exception:
+            pass
+        try:
+            client.destroy()
+        except Exception:
+            pass
+
+    def _adopt_client(self) -> None:
+        """Sustituir el cliente por el que dejó listo el supervisor; solo desde el hilo de adquisición."""
+        with self._client_lock:
+            client, self._handover = self._handover, None
+        if client is None:
+            return
+        old, self.client = self.client, client
+        self._connected = True
+        self._update_pdu_size()
+        if old is not None:
+            self._destroy_client(old)
+
+    def _ensure_connected(self) -> bool:
+        """Estado de conexión sin bloquear: si está caída, avisa al supervisor y devuelve False."""
+        if self._handover is not None:
+            self._adopt_client()
+        if self._connected:
+            return True
+        self._supervisor.report_down(self._last_error)
+        self._supervisor.kick()
+        return self._connected
+
+    def drain_events(self) -> List[ConnectionEvent]:
+        return self._supervisor.drain_events()
+
+    def _dial(self, client) -> Optional[str]:
+        """Conectar ``client`` al PLC configurado. Devuelve el mensaje de error o None."""
+        # Nota: puerto 102 es el predeterminado; algunos wrappers no lo exponen directamente.
+        # Pasar puerto desde configuración si está disponible y reintentar con 102 si falla
+        port_to_use = getattr(self.cfg, "port", 102) or 102
+        try:
+            try:
+                client.connect(self.cfg.ip, self.cfg.rack, self.cfg.slot, port_to_use)
+            except TypeError:
+                # Compatibilidad con versiones antiguas de python-snap7 sin argumento tcpport
+                client.connect(self.cfg.ip, self.cfg.rack, self.cfg.slot)
+            return None
+        except Exception as e1:
+            # Fallback con puerto 102 si el puerto configurado no es 102
+            if port_to_use != 102:
+                try:
+                    try:
+                        client.connect(self.cfg.ip, self.cfg.rack, self.cfg.slot, 102)
+                    except TypeError:
+                        client.connect(self.cfg.ip, self.cfg.rack, self.cfg.slot)
+                    return None
+                except Exception as e2:
+                    return f"Conexión fallida (puerto {port_to_use} y fallback 102): {e1} / {e2}"
+            return f"Conexión fallida (puerto {port_to_use}): {e1}"
+
+    def _update_pdu_size(self) -> None:
+        """Leer la PDU negociada; si cambia, el plan se recompila para ajustarse a ella."""
+        try:
+            pdu = int(self.client.get_pdu_length())
+        except Exception:
+            pdu = 0
+        if pdu <= 0:
+            pdu = DEFAULT_PDU_SIZE
+        if pdu != self.pdu_size:
+            self.pdu_size = pdu
+            self.invalidate_read_plan()
+
     def disconnect(self) -> None:
+        # Sin reintentos en segundo plano tras un cierre explícito (connect() los reactiva)
+        self._supervisor.stop()
         try:
             self.client.disconnect()
         except Exception:
             pass
         self._connected = False
+        with self._client_lock:
+            client, self._handover = self._handover, None
+        if client is not None:
+            self._destroy_client(client)
+        # Cerrar las conexiones del pool en sus propios hilos
+        for link in self._pool:
+            link.connected = False
+            if link.client is not None:
+                link.executor.submit(self._close_link, link)
+
+    @staticmethod
+    def _close_link(link: _PoolLink) -> None:
+        try:
+            link.client.disconnect()
+        except Exception:
+            pass
+        link.connected = False
 
     def is_connected(self) -> bool:
         try:
@@ -150,50 +400,25 @@ class Snap7PLC(BasePLC):
             self._connected = False
         return self._connected
 
-    def _read_tag(self, tag: TagAddress) -> Optional[Union[float, bool]]:
-        try:
-            area = getattr(tag, "area", "DB").upper()
-            if area == "DB":
-                area_const = self._Areas.DB
-                dbnum = tag.db
-            elif area == "I":
-                area_const = self._Areas.PE
-                dbnum = 0
-            elif area == "Q":
-                area_const = self._Areas.PA
-                dbnum = 0
-            else:  # M
-                area_const = self._Areas.MK
-                dbnum = 0
+    def _area_const(self, area: str):
+        """Constante snap7 para un área "DB", "I", "Q" o "M"."""
+        if area == "DB":
+            return self._Areas.DB
+        elif area == "I":
+            return self._Areas.PE
+        elif area == "Q":
+            return self._Areas.PA
+        else:  # M
+            return self._Areas.MK
 
-            if tag.type.upper() == "REAL":
-                data = self.client.read_area(area_const, dbnum, tag.start, 4)
-                return float(self._get_real(data, 0))
-            elif tag.type.upper() == "BOOL":
-                data = self.client.read_area(area_const, dbnum, tag.start, 1)
-                return bool(self._get_bool(data, 0, tag.bit))
-            else:
-                return None
-        except Exception as e:
-            self._last_error = f"Lectura fallida DB{tag.db}.{tag.start}/{tag.type}: {e}"
-            self._connected = False
-            return None
+    def _resolve_area(self, tag: TagAddress):
+        """Devuelve (constante de área, número de DB) para un tag."""
+        area = getattr(tag, "area", "DB").upper()
+        return self._area_const(area), (tag.db if area == "DB" else 0)
 
     def _write_tag(self, tag: TagAddress, value) -> bool:
         try:
-            area = getattr(tag, "area", "DB").upper()
-            if area == "DB":
-                area_const = self._Areas.DB
-                dbnum = tag.db
-            elif area == "I":
-                area_const = self._Areas.PE
-                dbnum = 0
-            elif area == "Q":
-                area_const = self._Areas.PA
-                dbnum = 0
-            else:  # M
-                area_const = self._Areas.MK
-                dbnum = 0
+            area_const, dbnum = self._resolve_area(tag)
 
             if tag.type.upper() == "REAL":
                 b = bytearray(4)
@@ -201,7 +426,14 @@ class Snap7PLC(BasePLC):
                 self.client.write_area(area_const, dbnum, tag.start, b)
                 return True
             elif tag.type.upper() == "BOOL":
-                # leer byte actual para preservar otros bits
+                if self._S7DataItem is not None:
+                    # Escritura de bit atómica en una sola petición (sin leer el byte)
+                    err = self._write_items([self._encode_write(tag, value)])[0]
+                    if err:
+                        self._last_error = err
+                        return False
+                    return True
+                # snap7 sin S7DataItem: leer byte actual para preservar otros bits
                 current = self.client.read_area(area_const, dbnum, tag.start, 1)
                 b = bytearray(current)
                 self._set_bool(b, 0, tag.bit, bool(value))
@@ -211,57 +443,454 @@ class Snap7PLC(BasePLC):
                 return False
         except Exception as e:
             self._last_error = f"Escritura fallida DB{tag.db}.{tag.start}/{tag.type}: {e}"
+            # Dirección rechazada por la CPU: falla este tag, la conexión sigue válida
+            if not self._is_address_error(e):
+                self._connected = False
+            return False
+
+    def _write_multi(self, items) -> None:
+        """write_multi_vars conservando el resultado por ítem.
+
+        El envoltorio de python-snap7 copia los ítems antes de llamar a la
+        librería y pierde su campo Result; si la librería está accesible se
+        llama directamente sobre nuestro array.
+        """
+        lib = getattr(self.client, "_lib", None)
+        handle = getattr(self.client, "_s7_client", None)
+        if lib is None or handle is None:
+            self.client.write_multi_vars(items)
+            return
+        rc = lib.Cli_WriteMultiVars(handle, ctypes.byref(items), ctypes.c_int32(len(items)))
+        if rc:
+            try:
+                from snap7.common import error_text  # type: ignore
+
+                raise RuntimeError(error_text(rc, context="client"))
+            except ImportError:
+                raise RuntimeError(f"Error snap7 {rc:#x}")
+
+    def _encode_write(self, tag: TagAddress, value) -> Tuple[TagAddress, int, int, bytearray]:
+        """(tag, longitud de palabra, inicio, datos) de una escritura REAL o BOOL."""
+        if tag.type.upper() == "BOOL":
+            return tag, S7_WL_BIT, int(tag.start) * 8 + int(tag.bit), bytearray([1 if value else 0])
+        b = bytearray(4)
+        self._set_real(b, 0, float(value))
+        return tag, S7_WL_BYTE, int(tag.start), b
+
+    def _write_items(self, writes: List[Tuple[TagAddress, int, int, bytearray]]) -> List[Optional[str]]:
+        """Enviar escrituras ya codificadas en el mínimo de peticiones write_multi_vars.
+
+        Devuelve por ítem None o el mensaje de error. Un fallo de comunicación
+        marca la conexión como caída y el resto de peticiones se da por fallido.
+        """
+        results: List[Optional[str]] = [None] * len(writes)
+        for request in chunk_writes([len(w[3]) for w in writes], self.pdu_size):
+            if not self._connected:
+                for i in request:
+                    results[i] = self._last_error or "PLC desconectado"
+                continue
+            arr = (self._S7DataItem * len(request))()
+            keep = []
+            for item, i in zip(arr, request):
+                tag, wordlen, start, data = writes[i]
+                area_const, dbnum = self._resolve_area(tag)
+                raw = (ctypes.c_uint8 * len(data)).from_buffer_copy(data)
+                item.Area = int(getattr(area_const, "value", area_const))
+                item.WordLen = wordlen
+                item.Result = 0
+                item.DBNumber = int(dbnum)
+                item.Start = start
+                # En S7WLBit la cantidad es 1 bit; en S7WLByte, los bytes de datos
+                item.Amount = 1 if wordlen == S7_WL_BIT else len(data)
+                item.pData = ctypes.cast(raw, ctypes.POINTER(ctypes.c_uint8))
+                keep.append(raw)
+            try:
+                self._write_multi(arr)
+            except Exception as e:
+                msg = f"Escritura multi-variable fallida ({len(request)} ítems): {e}"
+                self._last_error = msg
+                if not self._is_address_error(e):
+                    self._connected = False
+                for i in request:
+                    results[i] = msg
+                continue
+            for item, i in zip(arr, request):
+                if item.Result != 0:
+                    tag = writes[i][0]
+                    where = f"{tag.start}.{tag.bit}" if writes[i][1] == S7_WL_BIT else str(tag.start)
+                    results[i] = f"Escritura rechazada DB{tag.db}.{where}/{tag.type}: código {item.Result:#x}"
+        return results
+
+    def write_many(self, items: List[Tuple[int, str, object]]) -> List[Optional[str]]:
+        """Escribe REAL y BOOL en el mínimo de peticiones write_multi_vars (según la PDU).
+
+        Los BOOL van como bits (S7WLBit), sin leer antes el byte, así que no
+        pisan otros bits que el PLC haya cambiado. Varias escrituras al mismo
+        bit se reducen a la última y las de un mismo byte viajan en la misma
+        petición. Cada ítem conserva su propio resultado.
+        """
+        results: List[Optional[str]] = [None] * len(items)
+        writes: List[Tuple[TagAddress, int, int, bytearray]] = []
+        # Ítems de entrada que resuelve cada escritura (un bit repetido comparte una)
+        owners: List[List[int]] = []
+        by_bit: Dict[Tuple[int, int, int], int] = {}
+        single: List[Tuple[int, TagAddress, object]] = []
+        for n, (tunnel_id, tag_key, value) in enumerate(items):
+            tcfg = self.tunnels_map.get(tunnel_id)
+            tag = tcfg.tags.get(tag_key) if tcfg else None
+            if tag is None:
+                results[n] = f"Tag {tag_key} no definido para túnel {tunnel_id}"
+                continue
+            kind = tag.type.upper()
+            if kind not in ("REAL", "BOOL") or self._S7DataItem is None:
+                single.append((n, tag, value))
+                continue
+            w = self._encode_write(tag, value)
+            if kind == "BOOL":
+                area_const, dbnum = self._resolve_area(tag)
+                key = (int(getattr(area_const, "value", area_const)), int(dbnum), w[2])
+                if key in by_bit:
+                    # Mismo bit otra vez: gana el último valor
+                    writes[by_bit[key]] = w
+                    owners[by_bit[key]].append(n)
+                    continue
+                by_bit[key] = len(writes)
+            writes.append(w)
+            owners.append([n])
+        if not (writes or single):
+            return results
+        if not self._ensure_connected():
+            err = f"PLC desconectado; reintento en {self._supervisor.retry_in():.0f} s"
+            self._last_error = err
+            for idx in owners:
+                for n in idx:
+                    results[n] = err
+            for n, _, _ in single:
+                results[n] = err
+            return results
+        # Agrupar por byte para que los bits de un mismo byte compartan petición
+        def _byte_first(i: int):
+            tag, wordlen, start, _ = writes[i]
+            return (0, tag.db, start // 8, i) if wordlen == S7_WL_BIT else (1, 0, 0, i)
+
+        order = sorted(range(len(writes)), key=_byte_first)
+        out = self._write_items([writes[i] for i in order])
+        for i, err in zip(order, out):
+            for n in owners[i]:
+                results[n] = err
+        for n, tag, value in single:
+            if not self._write_tag(tag, value):
+                results[n] = self._last_error or "Escritura fallida"
+        return results
+
+    def _read_plan(self) -> ReadPlan:
+        """Plan de lectura compilado.
+
+        Se reconstruye solo tras invalidate_read_plan() o cuando cambia el
+        conjunto de direcciones en cuarentena; los últimos valores buenos se
+        conservan en el buffer nuevo.
+        """
+        excluded = set(self._quarantine)
+        if self._plan is None or not self._plan_valid or excluded != self._plan_excluded:
+            old_plan, old_buf = self._plan, self._values
+            self._plan = compile_read_plan(
+                self.tunnels_map,
+                self._area_const,
+                self.coalesce_gap,
+                self.pdu_size,
+                exclude=excluded,
+                scan_classes=self.scan_classes,
+                signals=self.signals,
+            )
+            self._values = self._plan.new_buffer()
+            if old_plan is not None and old_buf is not None:
+                self._plan.carry_over(self._values, old_plan, old_buf)
+            # Disposición de la instantánea y volcado ubicación -> columna precompilados
+            ids = [pt.id for pt in self._plan.tunnels]
+            self._snaps = SnapshotBuffers(ids, [pt.name for pt in self._plan.tunnels], self.signals)
+            self._gather = gather_map(
+                [(col, f, i) for col, pt in enumerate(self._plan.tunnels) for f, i in pt.fields.items()]
+            )
+            self._plan_valid = True
+            self._plan_excluded = excluded
+        return self._plan
+
+    def read_stats(self) -> Dict[str, int]:
+        plan = self._read_plan()
+        planned = len(plan.requests) if self.read_mode == "multi" else len(plan.locations) - len(plan.quarantined)
+        stats = {
+            "pdu_size": self.pdu_size,
+            "signals": plan.signal_count,
+            "locations": len(plan.locations),
+            "spans": len(plan.spans),
+            "quarantined": len(plan.quarantined),
+            "requests_planned": planned,
+            "requests_last_cycle": self.requests_per_cycle,
+            "connections": 1 + sum(1 for link in self._pool if link.connected),
+        }
+        # Peticiones por clase de escaneo
+        for g in plan.groups:
+            key = f"requests_{g.scan_class}"
+            stats[key] = stats.get(key, 0) + (len(g.requests) if self.read_mode == "multi" else g.count)
+        return stats
+
+    def _due_groups(self, plan: ReadPlan, scan_classes: Optional[Iterable[str]]) -> List[PlanGroup]:
+        """Grupos a leer en este ciclo; sin ``scan_classes`` se lee todo."""
+        if scan_classes is None:
+            return list(plan.groups)
+        wanted = set(scan_classes)
+        due = []
+        for g in plan.groups:
+            if g.scan_class not in wanted:
+                continue
+            if g.scan_class == SCAN_ON_DEMAND and not self._on_demand.intersection(g.tunnel_ids):
+                continue
+            due.append(g)
+        return due
+
+    @staticmethod
+    def _is_address_error(exc: Exception) -> bool:
+        """El PLC respondió pero rechazó la dirección ("CPU : ..."): no hace falta reconectar."""
+        return "cpu :" in str(exc).lower()
+
+    def _link_failed(self, link: Optional[_PoolLink], message: str) -> None:
+        """Fallo de comunicación en la conexión principal (``link`` None) o en una del pool."""
+        if link is None:
+            self._last_error = message
             self._connected = False
+        else:
+            link.last_error = message
+            link.connected = False
+
+    def _read_location(
+        self, i: int, loc: PlanLocation, buf: ValueBuffer, now: float, link: Optional[_PoolLink] = None
+    ) -> bool:
+        """Lee una ubicación con read_area.
+
+        Una dirección rechazada por el PLC pasa a cuarentena con calidad
+        BAD_ADDRESS; una que vuelve a responder sale de ella. Devuelve False
+        solo ante un fallo de comunicación.
+        """
+        client = self.client if link is None else link.client
+        if link is None:
+            self.requests_per_cycle += 1
+        else:
+            link.requests += 1
+        try:
+            data = client.read_area(loc.area_const, loc.db, loc.start, loc.size)
+        except Exception as e:
+            if self._is_address_error(e):
+                buf.quality[i] = QUALITY_BAD_ADDRESS
+                self._quarantine[loc.key] = now + self.quarantine_retry_s
+                self._last_error = f"Dirección {loc.label} en cuarentena: {e}"
+                return True
+            self._link_failed(link, f"Lectura fallida {loc.label}: {e}")
             return False
+        buf.set(i, loc.decoder(data, 0, loc.bit), now)
+        self._quarantine.pop(loc.key, None)
+        return True
 
-    def read_all(self) -> Dict[int, TunnelData]:
-        out: Dict[int, TunnelData] = {}
-        if not self._connected and not self.connect():
-            return out
-        for tid, tcfg in self.tunnels_map.items():
+    def _read_spans(
+        self, plan: ReadPlan, requests: List[List[int]], buf: ValueBuffer, now: float, link: Optional[_PoolLink] = None
+    ) -> List[List[int]]:
+        """Lee ``requests`` (índices de tramos) con read_multi_vars y los decodifica en ``buf``.
+
+        Las peticiones son las del plan, ya ajustadas a la PDU negociada. Cada
+        tramo se decodifica de una vez con su SpanDecoder. Si el PLC rechaza un
+        tramo, sus ubicaciones se leen una a una para aislar (y poner en
+        cuarentena) solo las direcciones malas. Ante un fallo de comunicación
+        devuelve las peticiones que quedaron sin leer (vacío si todo fue bien).
+        """
+        for n, request in enumerate(requests):
+            if link is None:
+                # Órdenes urgentes antes de cada petición de la conexión principal
+                self._preempt()
+                if not self._connected:
+                    return list(requests[n:])
+            client = self.client if link is None else link.client
+            chunk = [plan.spans[i] for i in request]
+            items = (self._S7DataItem * len(chunk))()
+            buffers = []
+            for item, span in zip(items, chunk):
+                raw = (ctypes.c_uint8 * span.size)()
+                item.Area = int(getattr(span.area_const, "value", span.area_const))
+                item.WordLen = S7_WL_BYTE
+                item.Result = 0
+                item.DBNumber = int(span.db)
+                item.Start = int(span.start)
+                item.Amount = span.size
+                item.pData = ctypes.cast(raw, ctypes.POINTER(ctypes.c_uint8))
+                buffers.append(raw)
             try:
-                ta = tcfg.tags
-                amb = self._read_tag(ta["temp_ambiente"]) or 0.0
-                p1 = self._read_tag(ta["temp_pulpa1"]) or 0.0
-                p2 = self._read_tag(ta["temp_pulpa2"]) or 0.0
-                sp = self._read_tag(ta["setpoint"]) or 0.0
-                sp_p1 = self._read_tag(ta["setpoint_pulpa1"]) if "setpoint_pulpa1" in ta else 0.0
-                sp_p2 = self._read_tag(ta["setpoint_pulpa2"]) if "setpoint_pulpa2" in ta else 0.0
-                est = self._read_tag(ta["estado"]) or False
-                defrost = False
-                try:
-                    # Prioridad de tags de estado de deshielo
-                    for k in ("deshielo_activo", "deshielo_mando", "deshielo_set", "deshielo_onoff"):
-                        if k in ta:
-                            defrost = bool(self._read_tag(ta[k]))
-                            break
-                except Exception:
-                    defrost = False
-                valve = 0.0
+                if link is None:
+                    self.requests_per_cycle += 1
+                else:
+                    link.requests += 1
+                client.read_multi_vars(items)
+            except Exception as e:
+                message = f"Lectura multi-variable fallida ({len(chunk)} tramos): {e}"
+                if not self._is_address_error(e):
+                    self._link_failed(link, message)
+                    return list(requests[n:])
+                self._last_error = message
+                # El PLC rechazó la petición entera: aislar las direcciones malas una a una
+                rejected = chunk
+            else:
+                rejected = []
+                for item, raw, span in zip(items, buffers, chunk):
+                    if item.Result != 0:
+                        rejected.append(span)
+                        continue
+                    span.decoder.decode_into(bytes(raw), buf, now)
+            for span in rejected:
+                for i in range(span.first, span.first + span.count):
+                    if not self._read_location(i, plan.locations[i], buf, now, link):
+                        return list(requests[n:])
+        return []
+
+    def _read_work(
+        self, plan: ReadPlan, work: list, buf: ValueBuffer, now: float, link: Optional[_PoolLink] = None
+    ) -> list:
+        """Leer una parte del ciclo (peticiones en modo multi, ubicaciones en modo single).
+
+        Devuelve la parte que no se pudo leer por un fallo de comunicación.
+        """
+        if self.read_mode == "multi":
+            return self._read_spans(plan, work, buf, now, link)
+        for n, i in enumerate(work):
+            if link is None:
+                self._preempt()
+            if not self._read_location(i, plan.locations[i], buf, now, link):
+                return list(work[n:])
+        return []
+
+    def _split_work(self, plan: ReadPlan, work: list, parts: int) -> List[list]:
+        """Repartir el trabajo del ciclo en ``parts`` lotes de carga parecida (bytes leídos)."""
+        if self.read_mode == "multi":
+            weight = lambda r: sum(plan.spans[i].size for i in r) + 12 * len(r)  # noqa: E731
+        else:
+            weight = lambda i: plan.locations[i].size + 12  # noqa: E731
+        shares: List[list] = [[] for _ in range(parts)]
+        loads = [0] * parts
+        for w in sorted(work, key=weight, reverse=True):
+            k = loads.index(min(loads))
+            shares[k].append(w)
+            loads[k] += weight(w)
+        return shares
+
+    def _revive_pool(self, now: float) -> None:
+        """Reconectar en segundo plano (en su propio hilo) las conexiones del pool caídas."""
+        for link in self._pool:
+            if link.connected or link.pending is not None or now < link.next_retry:
+                continue
+            link.next_retry = now + self.pool_retry_s
+            link.pending = link.executor.submit(self._connect_link, link)
+
+    def _connect_link(self, link: _PoolLink) -> bool:
+        """Abrir la conexión ``link``; se ejecuta en el hilo de esa conexión."""
+        try:
+            if link.client is not None:
                 try:
-                    if "valvula_posicion" in ta:
-                        v = self._read_tag(ta["valvula_posicion"])  # REAL 0..100
-                        valve = float(v or 0.0)
+                    link.client.disconnect()
                 except Exception:
-                    valve = 0.0
-                td = TunnelData(
-                    id=tcfg.id,
-                    name=tcfg.name,
-                    temp_ambiente=float(amb),
-                    temp_pulpa1=float(p1),
-                    temp_pulpa2=float(p2),
-                    setpoint=float(sp),
-                    setpoint_pulpa1=float(sp_p1 or 0.0),
-                    setpoint_pulpa2=float(sp_p2 or 0.0),
-                    estado=bool(est),
-                    deshielo_activo=bool(defrost),
-                    valvula_posicion=float(valve),
-                )
-                out[tid] = td
+                    pass
+            link.client = self._Client()
+            err = self._dial(link.client)
+            link.last_error = err
+            link.connected = err is None
+        except Exception as e:
+            link.last_error = f"Conexión fallida: {e}"
+            link.connected = False
+        finally:
+            link.pending = None
+        return link.connected
+
+    def _work_ranges(self, plan: ReadPlan, work: list) -> List[Tuple[int, int]]:
+        """Rangos (first, count) del plan que cubre una parte del ciclo."""
+        if self.read_mode == "multi":
+            return [(plan.spans[i].first, plan.spans[i].count) for r in work for i in r]
+        return [(i, 1) for i in work]
+
+    def _read_parallel(self, plan: ReadPlan, work: list, buf: ValueBuffer, now: float) -> list:
+        """Leer el ciclo repartido entre la conexión principal y las del pool.
+
+        Cada conexión del pool lee su lote en su propio hilo, sobre su propio
+        buffer, mientras la principal lee el suyo. Solo lo que el lote leyó a
+        tiempo se copia al buffer del ciclo: una conexión abandonada por
+        timeout sigue escribiendo en el suyo sin tocar los ciclos siguientes,
+        y no recibe más lotes hasta que termina. Lo que una conexión del pool
+        no pudo leer lo relee la principal en el mismo ciclo, de modo que la
+        instantánea sigue siendo completa. Devuelve lo que quedó sin leer.
+        """
+        self._revive_pool(monotonic())
+        live = [link for link in self._pool if link.connected and link.pending is None]
+        if not live:
+            return self._read_work(plan, work, buf, now)
+        shares = self._split_work(plan, work, len(live) + 1)
+        futures = []
+        for link, share in zip(live, shares[1:]):
+            if share:
+                if link.plan is not plan:
+                    link.plan, link.buf = plan, plan.new_buffer()
+                link.requests = 0
+                futures.append((link, share, link.executor.submit(self._read_work, plan, share, link.buf, now, link)))
+        leftover = self._read_work(plan, shares[0], buf, now)
+        deadline = monotonic() + self.pool_timeout_s
+        for link, share, fut in futures:
+            try:
+                rest = fut.result(timeout=max(0.0, deadline - monotonic()))
             except Exception as e:
-                self._last_error = f"Lectura túnel {tcfg.id} fallida: {e}"
-                self._connected = False
-                return out
+                # Sin respuesta a tiempo: se da por caída y su hilo queda ocupado hasta que snap7 expire
+                link.connected = False
+                link.last_error = f"Conexión {link.index} sin respuesta: {e or 'timeout'}"
+                link.pending = fut
+                fut.add_done_callback(lambda _f, link=link: setattr(link, "pending", None))
+                rest = share
+            else:
+                # Lo leído es el principio del lote; lo que falta queda en ``rest``
+                for first, count in self._work_ranges(plan, share[: len(share) - len(rest)]):
+                    buf.copy_range(link.buf, first, count)
+            self.requests_per_cycle += link.requests
+            if rest:
+                if leftover:
+                    leftover.extend(rest)
+                else:
+                    leftover = self._read_work(plan, rest, buf, now)
+        return leftover
+
+    def read_all(self, scan_classes: Optional[Iterable[str]] = None) -> PlantSnapshot:
+        if not self._ensure_connected():
+            return self._snaps.empty
+        plan = self._read_plan()
+        buf = self._values
+        if plan.errors:
+            self._last_error = plan.errors[-1]
+        now = time()
+        groups = self._due_groups(plan, scan_classes)
+        for g in groups:
+            buf.begin(g.first, g.count)
+        self.requests_per_cycle = 0
+        if self.read_mode == "multi":
+            work = [r for g in groups for r in g.requests]
+        else:
+            work = [i for g in groups for i in range(g.first, g.first + g.count)]
+        if self._pool and len(work) > 1:
+            ok = not self._read_parallel(plan, work, buf, now)
+        else:
+            ok = not self._read_work(plan, work, buf, now)
+        # Direcciones en cuarentena: se reintentan solo cuando vence su plazo
+        for i in plan.quarantined:
+            loc = plan.locations[i]
+            if ok and now >= self._quarantine.get(loc.key, 0.0):
+                ok = self._read_location(i, loc, buf, now)
+            else:
+                buf.quality[i] = QUALITY_BAD_ADDRESS
+        for g in groups:
+            buf.finish(g.first, g.count)
+        out = self._snaps.next()
+        fill_from_buffer(out, self._gather, buf.values, buf.quality, buf.ts)
+        out.ts = now
+        out.mark_all()
         return out
 
     def write_setpoint(self, tunnel_id: int, value: float) -> bool:
@@ -273,7 +902,8 @@ class Snap7PLC(BasePLC):
         if not tag:
             self._last_error = f"Tag setpoint no definido para túnel {tunnel_id}"
             return False
-        if not self._connected and not self.connect():
+        if not self._ensure_connected():
+            self._last_error = f"PLC desconectado; reintento en {self._supervisor.retry_in():.0f} s"
             return False
         return self._write_tag(tag, float(value))
 
@@ -286,7 +916,8 @@ class Snap7PLC(BasePLC):
         if not tag:
             self._last_error = f"Tag estado no definido para túnel {tunnel_id}"
             return False
-        if not self._connected and not self.connect():
+        if not self._ensure_connected():
+            self._last_error = f"PLC desconectado; reintento en {self._supervisor.retry_in():.0f} s"
             return False
         return self._write_tag(tag, bool(value))
 
@@ -299,7 +930,8 @@ class Snap7PLC(BasePLC):
         if not tag:
             self._last_error = f"Tag setpoint_pulpa1 no definido para túnel {tunnel_id}"
             return False
-        if not self._connected and not self.connect():
+        if not self._ensure_connected():
+            self._last_error = f"PLC desconectado; reintento en {self._supervisor.retry_in():.0f} s"
             return False
         return self._write_tag(tag, float(value))
 
@@ -312,7 +944,8 @@ class Snap7PLC(BasePLC):
         if not tag:
             self._last_error = f"Tag setpoint_pulpa2 no definido para túnel {tunnel_id}"
             return False
-        if not self._connected and not self.connect():
+        if not self._ensure_connected():
+            self._last_error = f"PLC desconectado; reintento en {self._supervisor.retry_in():.0f} s"
             return False
         return self._write_tag(tag, float(value))
 
@@ -325,6 +958,7 @@ class Snap7PLC(BasePLC):
         if not tag:
             self._last_error = f"Tag {tag_key} no definido para túnel {tunnel_id}"
             return False
-        if not self._connected and not self.connect():
+        if not self._ensure_connected():
+            self._last_error = f"PLC desconectado; reintento en {self._supervisor.retry_in():.0f} s"
             return False
         return self._write_tag(tag, value)
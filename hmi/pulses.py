@@ -0,0 +1,166 @@
+from __future__ import annotations
+
+import heapq
+from itertools import count
+from threading import Lock
+from time import monotonic
+from typing import Callable, Dict, List, Optional, Tuple
+
+# Duración de los pulsos de mando (s)
+PULSE_S = 0.2
+# Espera inicial y máxima entre reintentos de una reposición fallida (s); se dobla en cada fallo
+RETRY_S = 0.5
+RETRY_CAP_S = 10.0
+# Intentos rechazados por el PLC tras los que una reposición se descarta
+MAX_REJECTIONS = 3
+
+# Errores de escritura que no son de comunicación: el PLC respondió y rechazó
+# el ítem o el tag no existe en la configuración; reintentar no lo arregla
+_REJECTION_MARKERS = ("rechazada", "no definido", "no encontrado", "sin plc asignado", "cpu :")
+
+
+def is_rejection(error: str) -> bool:
+    """True si ``error`` es un rechazo del PLC o de la configuración, no un fallo de comunicación."""
+    text = str(error).lower()
+    return any(m in text for m in _REJECTION_MARKERS)
+
+
+class PendingReset:
+    """Reposición pendiente de un tag tras un pulso o una orden temporizada."""
+
+    def __init__(self, tunnel_id: int, tag_key: str, value, due: float, name: str = ""):
+        self.tunnel_id = tunnel_id
+        self.tag_key = tag_key
+        self.value = value
+        self.due = due
+        self.name = name or tag_key
+        self.created = monotonic()
+        self.attempts = 0
+        self.rejections = 0
+        self.dropped = False
+        self.last_error = ""
+
+
+class PulseScheduler:
+    """Reposiciones de pulsos y órdenes temporizadas sobre un montículo de plazos.
+
+    Tras escribir el flanco de un pulso se programa aquí su vuelta a reposo.
+    ``run_due`` escribe de una vez (``write_many``) todas las reposiciones
+    vencidas. Las que fallan por comunicación (p. ej. durante una
+    reconexión) se reintentan con espera creciente (RETRY_S doblando hasta
+    RETRY_CAP_S) hasta que el PLC las acepta; las que el PLC rechaza se
+    descartan tras ``max_rejections`` intentos (``dropped``). Un segundo
+    pulso sobre el mismo tag reutiliza la reposición pendiente con el plazo
+    más tardío.
+    """
+
+    def __init__(self, retry_s: float = RETRY_S, retry_cap_s: float = RETRY_CAP_S, max_rejections: int = MAX_REJECTIONS):
+        self.retry_s = float(retry_s)
+        self.retry_cap_s = max(self.retry_s, float(retry_cap_s))
+        self.max_rejections = max(1, int(max_rejections))
+        self._heap: List[Tuple[float, int, PendingReset]] = []
+        self._by_tag: Dict[Tuple[int, str], PendingReset] = {}
+        self._seq = count()
+        self._lock = Lock()
+        self.sent = 0
+        self.failures = 0
+        self.dropped = 0
+
+    def schedule(self, tunnel_id: int, tag_key: str, delay_s: float, value=False, name: str = "") -> PendingReset:
+        """Programar la escritura de ``value`` en el tag dentro de ``delay_s`` segundos."""
+        due = monotonic() + max(0.0, float(delay_s))
+        with self._lock:
+            reset = self._by_tag.get((tunnel_id, tag_key))
+            if reset is not None:
+                reset.value = value
+                if due > reset.due:
+                    reset.due = due
+                    heapq.heappush(self._heap, (due, next(self._seq), reset))
+                return reset
+            reset = PendingReset(tunnel_id, tag_key, value, due, name)
+            self._by_tag[(tunnel_id, tag_key)] = reset
+            heapq.heappush(self._heap, (due, next(self._seq), reset))
+            return reset
+
+    def _pop_due(self, now: float) -> List[PendingReset]:
+        due: List[PendingReset] = []
+        with self._lock:
+            while self._heap and self._heap[0][0] <= now:
+                when, _, reset = heapq.heappop(self._heap)
+                # Entradas antiguas de una reposición cuyo plazo se alargó
+                if when != reset.due or self._by_tag.get((reset.tunnel_id, reset.tag_key)) is not reset:
+                    continue
+                due.append(reset)
+        return due
+
+    def run_due(
+        self,
+        write_many: Callable[[List[Tuple[int, str, object]]], List[Optional[str]]],
+        now: Optional[float] = None,
+        everything: bool = False,
+    ) -> List[PendingReset]:
+        """Escribir las reposiciones vencidas (todas con ``everything``).
+
+        Devuelve las que fallaron; las descartadas en este intento llevan ``dropped``.
+        """
+        now = monotonic() if now is None else now
+        due = self._pop_due(float("inf") if everything else now)
+        if not due:
+            return []
+        planned = [r.due for r in due]
+        try:
+            errors = write_many([(r.tunnel_id, r.tag_key, r.value) for r in due])
+        except Exception as e:
+            errors = [str(e) or "Escritura fallida"] * len(due)
+        failed: List[PendingReset] = []
+        with self._lock:
+            for reset, err, when in zip(due, errors, planned):
+                reset.attempts += 1
+                if reset.due != when:
+                    # Reprogramada por otro pulso mientras se escribía: sigue pendiente
+                    continue
+                if err is None:
+                    self._by_tag.pop((reset.tunnel_id, reset.tag_key), None)
+                    self.sent += 1
+                    continue
+                reset.last_error = err
+                self.failures += 1
+                failed.append(reset)
+                if is_rejection(err):
+                    reset.rejections += 1
+                    if reset.rejections >= self.max_rejections:
+                        reset.dropped = True
+                        self._by_tag.pop((reset.tunnel_id, reset.tag_key), None)
+                        self.dropped += 1
+                        continue
+                backoff = min(self.retry_cap_s, self.retry_s * 2 ** min(reset.attempts - 1, 16))
+                reset.due = monotonic() + backoff
+                heapq.heappush(self._heap, (reset.due, next(self._seq), reset))
+        return failed
+
+    def next_due(self) -> Optional[float]:
+        with self._lock:
+            return min((r.due for r in self._by_tag.values()), default=None)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._by_tag)
+
+    def pending(self) -> List[Dict[str, object]]:
+        """Reposiciones pendientes, para diagnóstico."""
+        now = monotonic()
+        with self._lock:
+            resets = sorted(self._by_tag.values(), key=lambda r: r.due)
+        return [
+            {
+                "name": r.name,
+                "tunnel_id": r.tunnel_id,
+                "tag": r.tag_key,
+                "value": r.value,
+                "due_in_s": round(r.due - now, 3),
+                "age_s": round(now - r.created, 3),
+                "attempts": r.attempts,
+                "error": r.last_error,
+            }
+            for r in resets
+        ]
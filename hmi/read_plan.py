@@ -0,0 +1,499 @@
+from __future__ import annotations
+
+import struct
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .models import (
+    QUALITY_COMM_ERROR,
+    QUALITY_GOOD,
+    QUALITY_STALE,
+    SCAN_FAST,
+    SCAN_ON_DEMAND,
+    SCAN_SLOW,
+    TagAddress,
+    TunnelConfig,
+)
+from .signals import DEFAULT_REGISTRY, SignalRegistry
+
+# PDU mínima que negocian las CPU S7; se usa mientras no se conozca la real
+DEFAULT_PDU_SIZE = 240
+# Máximo de variables por petición read_multi_vars (MaxVars de snap7)
+MAX_VARS_PER_REQUEST = 20
+# Sobrecarga S7 de una lectura multi-variable: cabecera + función/nº de ítems,
+# 12 bytes por ítem en la petición y 4 bytes por ítem en la respuesta
+_REQ_HEADER = 12
+_REQ_ITEM = 12
+_RESP_HEADER = 14
+_RESP_ITEM = 4
+
+
+def max_span_for_pdu(pdu_size: int) -> int:
+    """Bytes de datos que caben en la respuesta de un único ítem."""
+    return max(1, int(pdu_size) - _RESP_HEADER - _RESP_ITEM)
+
+
+# Tamaño máximo por defecto de un tramo coalescido (PDU de 240 bytes)
+MAX_SPAN_BYTES = max_span_for_pdu(DEFAULT_PDU_SIZE)
+
+# Orden de las clases de escaneo (de más a menos frecuente)
+_SCAN_RANK = {SCAN_FAST: 0, SCAN_SLOW: 1, SCAN_ON_DEMAND: 2}
+
+_REAL = struct.Struct(">f")
+
+
+def tag_size(tag: TagAddress) -> Optional[int]:
+    """Bytes que ocupa un tag en el PLC (None si el tipo no está soportado)."""
+    t = tag.type.upper()
+    if t == "REAL":
+        return 4
+    if t == "BOOL":
+        return 1
+    return None
+
+
+def area_key(tag: TagAddress) -> Tuple[str, int]:
+    """Clave (área, DB) de un tag. Fuera de DB el número de bloque no aplica."""
+    area = getattr(tag, "area", "DB").upper()
+    return area, (tag.db if area == "DB" else 0)
+
+
+@dataclass
+class ReadSpan:
+    """Rango contiguo de bytes de un área/DB que se lee en una sola petición."""
+    area: str
+    db: int
+    start: int
+    size: int
+    # (índice del tag en la lista de entrada, tag); el offset en el buffer es tag.start - start
+    tags: List[Tuple[int, TagAddress]] = field(default_factory=list)
+
+    @property
+    def end(self) -> int:
+        return self.start + self.size
+
+
+def plan_spans(tags: List[TagAddress], max_gap: int = 16, max_span: int = MAX_SPAN_BYTES) -> List[ReadSpan]:
+    """Agrupa tags por (área, DB) y fusiona rangos cercanos en tramos de lectura.
+
+    Dos tags se leen en el mismo tramo si el hueco entre ellos es como mucho
+    ``max_gap`` bytes y el tramo resultante no supera ``max_span`` bytes. Con
+    ``max_gap < 0`` no se fusiona nada: cada tag genera su propio tramo.
+    Los tags de tipo no soportado se omiten.
+    """
+    groups: Dict[Tuple[str, int], List[Tuple[int, TagAddress, int]]] = {}
+    for i, tag in enumerate(tags):
+        size = tag_size(tag)
+        if size is None:
+            continue
+        groups.setdefault(area_key(tag), []).append((i, tag, size))
+
+    spans: List[ReadSpan] = []
+    for (area, db), entries in groups.items():
+        entries.sort(key=lambda e: (e[1].start, e[0]))
+        current: Optional[ReadSpan] = None
+        for i, tag, size in entries:
+            end = tag.start + size
+            if (
+                current is not None
+                and max_gap >= 0
+                and tag.start - current.end <= max_gap
+                and max(end, current.end) - current.start <= max_span
+            ):
+                current.size = max(end, current.end) - current.start
+                current.tags.append((i, tag))
+                continue
+            current = ReadSpan(area=area, db=db, start=tag.start, size=size, tags=[(i, tag)])
+            spans.append(current)
+    return spans
+
+
+def address_label(tag: TagAddress) -> str:
+    """Dirección legible de un tag (p. ej. "DB101.4/REAL" o "M4.1/BOOL")."""
+    area, db = area_key(tag)
+    if area == "DB":
+        return f"DB{db}.{tag.start}/{tag.type.upper()}"
+    return f"{area}{tag.start}.{tag.bit}/{tag.type.upper()}"
+
+
+def decode_real(buf, offset: int, bit: int = 0) -> float:
+    return _REAL.unpack_from(buf, offset)[0]
+
+
+def decode_bool(buf, offset: int, bit: int = 0) -> bool:
+    return bool((buf[offset] >> bit) & 1)
+
+
+DECODERS: Dict[str, Callable] = {"REAL": decode_real, "BOOL": decode_bool}
+
+
+def chunk_spans(sizes: List[int], pdu_size: int = DEFAULT_PDU_SIZE) -> List[List[int]]:
+    """Reparte tramos (por tamaño en bytes) en peticiones que caben en la PDU.
+
+    Devuelve listas de índices, una por petición. Usa first-fit decreasing
+    sobre el tamaño de la respuesta, respetando también el límite de ítems
+    por petición; el resultado queda a lo sumo a un par de peticiones del
+    óptimo y en la práctica suele coincidir con él.
+    """
+    max_items = max(1, min(MAX_VARS_PER_REQUEST, (int(pdu_size) - _REQ_HEADER) // _REQ_ITEM))
+    budget = int(pdu_size) - _RESP_HEADER
+    # Cada ítem de respuesta se rellena a longitud par
+    costs = [_RESP_ITEM + size + (size & 1) for size in sizes]
+    order = sorted(range(len(sizes)), key=lambda i: costs[i], reverse=True)
+    bins: List[List[int]] = []
+    used: List[int] = []
+    for i in order:
+        for b, items in enumerate(bins):
+            if len(items) < max_items and used[b] + costs[i] <= budget:
+                items.append(i)
+                used[b] += costs[i]
+                break
+        else:
+            bins.append([i])
+            used.append(costs[i])
+    return [sorted(items) for items in bins]
+
+
+def chunk_writes(sizes: List[int], pdu_size: int = DEFAULT_PDU_SIZE) -> List[List[int]]:
+    """Reparte escrituras (por bytes de datos) en peticiones write_multi_vars que caben en la PDU.
+
+    En la escritura los datos viajan en la petición: cada ítem ocupa su
+    parámetro (12 bytes) más la cabecera de datos (4) y los datos rellenados
+    a longitud par. Se conserva el orden de llegada.
+    """
+    max_items = max(1, min(MAX_VARS_PER_REQUEST, (int(pdu_size) - _REQ_HEADER) // _REQ_ITEM))
+    budget = int(pdu_size) - _REQ_HEADER
+    bins: List[List[int]] = []
+    used = 0
+    for i, size in enumerate(sizes):
+        cost = _REQ_ITEM + _RESP_ITEM + size + (size & 1)
+        if bins and len(bins[-1]) < max_items and used + cost <= budget:
+            bins[-1].append(i)
+            used += cost
+        else:
+            bins.append([i])
+            used = cost
+    return bins
+
+
+class ValueBuffer:
+    """Valores decodificados por ubicación del plan, con calidad y sello de tiempo.
+
+    ``values`` guarda REAL como float y BOOL como 0/1 en un único bloque
+    contiguo (``numpy.ndarray``). ``quality`` lleva un código
+    QUALITY_* por ubicación y ``ts`` el instante de la última lectura buena.
+    Los valores se conservan entre ciclos para poder servirlos como STALE.
+    """
+
+    def __init__(self, size: int):
+        self.size = size
+        self.values = np.zeros(size)
+        self.ts = np.zeros(size)
+        self.quality = bytearray([QUALITY_COMM_ERROR]) * size
+        self._pending = bytes([QUALITY_COMM_ERROR]) * size
+
+    def begin(self, first: int, count: int) -> None:
+        """Marca un rango como pendiente; lo que no se lea en el ciclo queda como error de comunicación."""
+        self.quality[first:first + count] = self._pending[:count]
+
+    def finish(self, first: int, count: int) -> None:
+        """Lo pendiente del rango que ya tenía un valor bueno anterior pasa a STALE."""
+        q = self.quality
+        ts = self.ts
+        for i in range(first, first + count):
+            if q[i] == QUALITY_COMM_ERROR and ts[i] > 0.0:
+                q[i] = QUALITY_STALE
+
+    def get(self, i: Optional[int]) -> Optional[float]:
+        if i is None or self.quality[i] not in (QUALITY_GOOD, QUALITY_STALE):
+            return None
+        return float(self.values[i])
+
+    def set(self, i: int, value, ts: float) -> None:
+        self.values[i] = float(value)
+        self.ts[i] = ts
+        self.quality[i] = QUALITY_GOOD
+
+    def copy_range(self, src: "ValueBuffer", first: int, count: int) -> None:
+        """Copiar ``[first, first + count)`` desde otro buffer del mismo plan (p. ej. el de una conexión del pool)."""
+        end = first + count
+        self.values[first:end] = src.values[first:end]
+        self.ts[first:end] = src.ts[first:end]
+        self.quality[first:end] = src.quality[first:end]
+
+
+class SpanDecoder:
+    """Decodificador precompilado de un tramo.
+
+    Escribe los REAL del tramo en ``values[first:first + n_real]`` y los BOOL a
+    continuación, en una sola operación por tipo mediante indexado sobre el
+    buffer (``>f4`` y máscaras de bit).
+    """
+
+    def __init__(self, first: int, reals: List[int], bools: List[Tuple[int, int]]):
+        self.first = first
+        self.n_real = len(reals)
+        self.n_bool = len(bools)
+        self._good = bytes([QUALITY_GOOD]) * (self.n_real + self.n_bool)
+        offs = np.asarray(reals, dtype=np.intp)
+        self._real_idx = (offs[:, None] + np.arange(4, dtype=np.intp)).reshape(-1)
+        self._bool_off = np.asarray([o for o, _ in bools], dtype=np.intp)
+        self._bool_bit = np.asarray([b for _, b in bools], dtype=np.uint8)
+
+    def decode_into(self, data: bytes, buf: ValueBuffer, ts: float) -> None:
+        a = self.first
+        b = a + self.n_real
+        c = b + self.n_bool
+        raw = np.frombuffer(data, dtype=np.uint8)
+        if self.n_real:
+            buf.values[a:b] = raw[self._real_idx].view(">f4")
+        if self.n_bool:
+            buf.values[b:c] = (raw[self._bool_off] >> self._bool_bit) & 1
+        buf.quality[a:c] = self._good
+        buf.ts[a:c] = ts
+
+
+def tunnel_reads(ta: Dict[str, TagAddress], signals: Optional[SignalRegistry] = None) -> List[Tuple[str, str, TagAddress]]:
+    """Ternas (señal, clave de tag, tag) que se leen para un túnel según el registro de señales."""
+    return (signals or DEFAULT_REGISTRY).tunnel_reads(ta)
+
+
+def location_key(tag: TagAddress) -> Tuple[str, int, int, str, int]:
+    """Identidad física de un tag: (área, DB, byte, tipo, bit).
+
+    El bit solo distingue direcciones BOOL; en un REAL se ignora.
+    """
+    area, db = area_key(tag)
+    t = tag.type.upper()
+    return area, db, int(tag.start), t, (int(tag.bit) if t == "BOOL" else 0)
+
+
+@dataclass
+class PlanLocation:
+    """Dirección física única ya resuelta: área, tamaño y decodificador.
+
+    ``users`` son los (túnel, campo) que comparten esta dirección; se lee una
+    sola vez por ciclo y el valor se reparte a todos ellos.
+    """
+    area_const: Any
+    db: int
+    start: int
+    size: int
+    bit: int
+    decoder: Callable
+    label: str
+    key: Tuple[str, int, int, str, int]
+    users: List[Tuple[int, str]] = field(default_factory=list)
+    # Clase más rápida entre sus usuarios y túneles que la piden (para "on_demand")
+    scan_class: str = SCAN_ON_DEMAND
+    tunnel_ids: set = field(default_factory=set)
+
+
+@dataclass
+class PlanSpan:
+    """Tramo compilado; sus ubicaciones ocupan ``[first, first + count)`` en el plan."""
+    area: str
+    area_const: Any
+    db: int
+    start: int
+    size: int
+    first: int
+    count: int
+    decoder: SpanDecoder
+
+    @property
+    def label(self) -> str:
+        addr = f"DB{self.db}.{self.start}" if self.area == "DB" else f"{self.area}{self.start}"
+        return f"{addr} ({self.size} bytes)"
+
+
+@dataclass
+class PlanGroup:
+    """Ubicaciones de una misma clase de escaneo, leídas juntas.
+
+    Ocupan ``[first, first + count)`` en el plan; ``requests`` son índices de
+    ``ReadPlan.spans``. En "on_demand" hay un grupo por conjunto de túneles.
+    """
+    scan_class: str
+    tunnel_ids: Tuple[int, ...]
+    first: int
+    count: int
+    requests: List[List[int]] = field(default_factory=list)
+
+
+@dataclass
+class PlanTunnel:
+    id: int
+    name: str
+    fields: Dict[str, int]  # campo de TunnelData -> índice de ubicación
+
+
+@dataclass
+class ReadPlan:
+    """Plan de lectura compilado a partir de ``tunnels_map``.
+
+    Se construye una vez y se reutiliza en cada ciclo; solo se recompila
+    cuando cambian los tags de algún túnel.
+    """
+    locations: List[PlanLocation]
+    spans: List[PlanSpan]
+    tunnels: List[PlanTunnel]
+    errors: List[str] = field(default_factory=list)
+    groups: List[PlanGroup] = field(default_factory=list)
+    pdu_size: int = DEFAULT_PDU_SIZE
+    # Ubicaciones en cuarentena: fuera de los tramos, se reintentan por separado
+    quarantined: List[int] = field(default_factory=list)
+
+    @property
+    def requests(self) -> List[List[int]]:
+        """Todas las peticiones read_multi_vars (índices de ``spans``) de un ciclo completo."""
+        return [r for g in self.groups for r in g.requests]
+
+    @property
+    def signal_count(self) -> int:
+        return sum(len(t.fields) for t in self.tunnels)
+
+    def new_buffer(self) -> ValueBuffer:
+        return ValueBuffer(len(self.locations))
+
+    def carry_over(self, buf: ValueBuffer, old_plan: "ReadPlan", old_buf: ValueBuffer) -> None:
+        """Copiar a ``buf`` los últimos valores de ``old_buf`` para las ubicaciones comunes."""
+        old_index = {loc.key: i for i, loc in enumerate(old_plan.locations)}
+        for i, loc in enumerate(self.locations):
+            j = old_index.get(loc.key)
+            if j is not None and old_buf.ts[j] > 0.0:
+                buf.values[i] = old_buf.values[j]
+                buf.ts[i] = old_buf.ts[j]
+                buf.quality[i] = old_buf.quality[j]
+
+
+def compile_read_plan(
+    tunnels_map: Dict[int, TunnelConfig],
+    area_const: Callable[[str], Any],
+    max_gap: int = 16,
+    pdu_size: int = DEFAULT_PDU_SIZE,
+    exclude: Optional[set] = None,
+    scan_classes: Optional[Dict[str, str]] = None,
+    signals: Optional[SignalRegistry] = None,
+) -> ReadPlan:
+    """Compila el plan de lectura de todos los túneles.
+
+    ``area_const`` traduce "DB"/"I"/"Q"/"M" a la constante del cliente snap7.
+    Las señales que apuntan a la misma dirección física (dentro de un túnel o
+    entre túneles) comparten una única ubicación, que toma la clase de escaneo
+    más rápida de sus usuarios (``scan_classes`` por clave de tag, por defecto
+    las del registro de señales ``signals``). Los tramos no mezclan clases y se limitan a lo
+    que cabe en una PDU de ``pdu_size`` bytes y se reparten en el mínimo de
+    peticiones que respetan ese límite. Las ubicaciones cuya clave está en
+    ``exclude`` (cuarentena) no entran en ningún tramo y quedan al final, en
+    ``quarantined``. Un túnel con tags obligatorios ausentes o tipos no
+    soportados queda fuera del plan y se anota en ``errors``.
+    """
+    signals = signals or DEFAULT_REGISTRY
+    classes = signals.scan_classes() if scan_classes is None else scan_classes
+    locations: List[PlanLocation] = []
+    location_tags: List[TagAddress] = []
+    by_key: Dict[Tuple[str, int, int, str, int], int] = {}
+    tunnels: List[PlanTunnel] = []
+    errors: List[str] = []
+    for tid, tcfg in tunnels_map.items():
+        try:
+            reads = signals.tunnel_reads(tcfg.tags)
+        except KeyError as e:
+            errors.append(f"Túnel {tcfg.id}: tag obligatorio {e} no definido")
+            continue
+        fields: Dict[str, int] = {}
+        for field_name, tag_key, tag in reads:
+            decoder = DECODERS.get(tag.type.upper())
+            if decoder is None:
+                errors.append(f"Túnel {tcfg.id}: tipo {tag.type} no soportado en {field_name}")
+                continue
+            key = location_key(tag)
+            idx = by_key.get(key)
+            if idx is None:
+                area, db, start, _, bit = key
+                idx = by_key[key] = len(locations)
+                location_tags.append(tag)
+                locations.append(
+                    PlanLocation(
+                        area_const=area_const(area),
+                        db=db,
+                        start=start,
+                        size=tag_size(tag),
+                        bit=bit,
+                        decoder=decoder,
+                        label=address_label(tag),
+                        key=key,
+                    )
+                )
+            loc = locations[idx]
+            loc.users.append((tid, field_name))
+            cls = classes.get(tag_key, classes.get(field_name, SCAN_FAST))
+            if _SCAN_RANK.get(cls, 0) < _SCAN_RANK[loc.scan_class]:
+                loc.scan_class = cls if cls in _SCAN_RANK else SCAN_FAST
+            loc.tunnel_ids.add(tid)
+            fields[field_name] = idx
+        tunnels.append(PlanTunnel(id=tcfg.id, name=tcfg.name, fields=fields))
+
+    # Agrupar por clase de escaneo (y conjunto de túneles en "on_demand")
+    exclude = exclude or set()
+    by_group: Dict[Tuple[str, Tuple[int, ...]], List[int]] = {}
+    for i, loc in enumerate(locations):
+        if loc.key in exclude:
+            continue
+        tids = tuple(sorted(loc.tunnel_ids)) if loc.scan_class == SCAN_ON_DEMAND else ()
+        by_group.setdefault((loc.scan_class, tids), []).append(i)
+    order: List[int] = []
+    spans: List[PlanSpan] = []
+    groups: List[PlanGroup] = []
+    # Reordenar las ubicaciones grupo a grupo y tramo a tramo (REAL y luego BOOL)
+    # para que cada tramo se decodifique sobre un rango contiguo del buffer
+    for (cls, tids), active in sorted(by_group.items(), key=lambda kv: (_SCAN_RANK[kv[0][0]], kv[0][1])):
+        group = PlanGroup(scan_class=cls, tunnel_ids=tids, first=len(order), count=len(active))
+        first_span = len(spans)
+        for rs in plan_spans([location_tags[i] for i in active], max_gap, max_span_for_pdu(pdu_size)):
+            idxs = [active[i] for i, _ in rs.tags]
+            reals = sorted((i for i in idxs if locations[i].decoder is decode_real), key=lambda i: locations[i].start)
+            bools = sorted(
+                (i for i in idxs if locations[i].decoder is decode_bool),
+                key=lambda i: (locations[i].start, locations[i].bit),
+            )
+            decoder = SpanDecoder(
+                len(order),
+                [locations[i].start - rs.start for i in reals],
+                [(locations[i].start - rs.start, locations[i].bit) for i in bools],
+            )
+            spans.append(
+                PlanSpan(
+                    area=rs.area,
+                    area_const=area_const(rs.area),
+                    db=rs.db,
+                    start=rs.start,
+                    size=rs.size,
+                    first=len(order),
+                    count=len(idxs),
+                    decoder=decoder,
+                )
+            )
+            order.extend(reals)
+            order.extend(bools)
+        sizes = [sp.size for sp in spans[first_span:]]
+        group.requests = [[first_span + i for i in req] for req in chunk_spans(sizes, pdu_size)]
+        groups.append(group)
+    quarantined = list(range(len(order), len(locations)))
+    order.extend(i for i, loc in enumerate(locations) if loc.key in exclude)
+    remap = {old: new for new, old in enumerate(order)}
+    locations = [locations[i] for i in order]
+    for pt in tunnels:
+        pt.fields = {f: remap[i] for f, i in pt.fields.items()}
+    return ReadPlan(
+        locations=locations,
+        spans=spans,
+        tunnels=tunnels,
+        errors=errors,
+        groups=groups,
+        pdu_size=int(pdu_size),
+        quarantined=quarantined,
+    )
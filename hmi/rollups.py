@@ -0,0 +1,309 @@
+from __future__ import annotations
+
+import re
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from threading import Lock
+from typing import Dict, List, Mapping, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .historian import FSYNC_S, DiskHistorian
+from .history import sample_row
+from .signals import DEFAULT_REGISTRY, SignalRegistry
+from .sqlite_historian import SqliteHistorian
+
+# Agregados de cada intervalo de un nivel de resumen (n = muestras válidas)
+AGGREGATES = ("min", "max", "avg", "last", "n")
+_PERIOD = re.compile(r"^\s*(\d+(?:\.\d+)?)\s*([smhd])\s*$")
+_UNITS = {"s": 1.0, "m": 60.0, "h": 3600.0, "d": 86400.0}
+
+
+def parse_period(name: str) -> float:
+    """Segundos de un nivel por su nombre ("1m", "15m", "1h", "1d")."""
+    m = _PERIOD.match(str(name))
+    if not m:
+        raise ValueError(f"Periodo de resumen no válido: {name!r}")
+    return float(m.group(1)) * _UNITS[m.group(2)]
+
+
+class Downsampler:
+    """Acumulador incremental de un nivel de resumen (min/max/media/último por señal y túnel).
+
+    Recibe muestras en bruto (``add_sample``) o intervalos de un nivel más
+    fino (``add_rollup``) y devuelve el intervalo anterior cuando llega una
+    muestra de otro. El intervalo devuelto es un búfer interno: hay que
+    consumirlo (o copiarlo) antes de la siguiente llamada.
+    """
+
+    def __init__(self, period_s: float, shape: Tuple[int, int]):
+        self.period_s = float(period_s)
+        self._bucket: Optional[float] = None
+        self._min = np.full(shape, np.nan, dtype=np.float32)
+        self._max = np.full(shape, np.nan, dtype=np.float32)
+        self._sum = np.zeros(shape, dtype=np.float64)
+        self._n = np.zeros(shape, dtype=np.float64)
+        self._last = np.full(shape, np.nan, dtype=np.float32)
+        self._out = np.empty((len(AGGREGATES),) + tuple(shape), dtype=np.float32)
+
+    def _roll(self, ts: float):
+        bucket = ts - ts % self.period_s
+        closed = None
+        if self._bucket is not None and bucket != self._bucket:
+            closed = self.flush()
+        self._bucket = bucket
+        return closed
+
+    def add_sample(self, ts: float, row: np.ndarray):
+        closed = self._roll(ts)
+        valid = ~np.isnan(row)
+        np.fmin(self._min, row, out=self._min)
+        np.fmax(self._max, row, out=self._max)
+        np.add(self._sum, row, out=self._sum, where=valid)
+        self._n += valid
+        np.copyto(self._last, row, where=valid)
+        return closed
+
+    def add_rollup(self, ts: float, agg: np.ndarray):
+        closed = self._roll(ts)
+        lo, hi, avg, last, n = agg
+        valid = n > 0
+        np.fmin(self._min, lo, out=self._min)
+        np.fmax(self._max, hi, out=self._max)
+        np.add(self._sum, avg * n, out=self._sum, where=valid)
+        self._n += n
+        np.copyto(self._last, last, where=valid & ~np.isnan(last))
+        return closed
+
+    def peek(self):
+        """(inicio, agregados) del intervalo en curso sin vaciar el acumulador, o None si no hay."""
+        if self._bucket is None:
+            return None
+        out = self._out
+        out[0] = self._min
+        out[1] = self._max
+        with np.errstate(invalid="ignore", divide="ignore"):
+            out[2] = np.where(self._n > 0, self._sum / np.maximum(self._n, 1), np.nan)
+        out[3] = self._last
+        out[4] = self._n
+        return self._bucket, out
+
+    def flush(self):
+        """(inicio, agregados) del intervalo en curso, o None si no hay; deja el acumulador vacío."""
+        closed = self.peek()
+        if closed is None:
+            return None
+        self._bucket = None
+        self._min.fill(np.nan)
+        self._max.fill(np.nan)
+        self._sum.fill(0.0)
+        self._n.fill(0.0)
+        self._last.fill(np.nan)
+        return closed
+
+
+class TieredHistorian:
+    """Histórico en bruto más niveles de resumen mantenidos al vuelo (1 s → 1 min → 1 h).
+
+    Cada nivel es un almacén propio (segmentos o SQLite, como el bruto) con
+    su retención, alimentado en cascada: el bruto alimenta al primer nivel y
+    cada intervalo cerrado alimenta al siguiente, sin releer nada del disco.
+    ``query`` elige el nivel según el rango y el ancho en píxeles pedidos:
+    el más grueso que aún da al menos un punto por píxel y que conserva
+    datos tan antiguos como el inicio del rango.
+    """
+
+    def __init__(self, raw, tiers: Sequence[Tuple[str, float, object]] = ()):
+        self.raw = raw
+        self.tiers: List[Tuple[str, float, object]] = sorted(tiers, key=lambda t: t[1])
+        self.tunnel_ids = raw.tunnel_ids
+        self.keys = raw.keys
+        self.index = raw.index
+        self.interval_s = raw.interval_s
+        shape = (len(self.keys), len(self.tunnel_ids))
+        self._row = np.zeros(shape, dtype=np.float32)
+        self._samplers = [Downsampler(period, shape) for _, period, _ in self.tiers]
+        # Intervalo en curso guardado a medias por close(), por nivel: su fila se sustituye al cerrarlo
+        self._partial: Dict[int, float] = {}
+        self._last_ts = float("-inf")
+        self._reader: Optional[ThreadPoolExecutor] = None
+        self._lock = Lock()
+        self.errors = 0
+        self.last_error = ""
+
+    @classmethod
+    def from_config(cls, cfg, tunnels, signals: Optional[SignalRegistry] = None, root=None) -> "TieredHistorian":
+        """Bruto y niveles según PLCConfig.historian ("file" o "sqlite") y PLCConfig.rollups."""
+        signals = signals or DEFAULT_REGISTRY
+        kind = getattr(cfg, "historian", "file")
+        backend = SqliteHistorian if kind == "sqlite" else DiskHistorian
+        raw = backend.from_config(cfg, tunnels, signals, root)
+        ids = [t.id for t in tunnels]
+        keys = signals.history_keys()
+        tiers = []
+        for name, days in (getattr(cfg, "rollups", None) or {}).items():
+            period = parse_period(name)
+            if backend is SqliteHistorian:
+                store = SqliteHistorian(
+                    raw.path.with_name(f"history_{name}.sqlite3"),
+                    ids,
+                    keys,
+                    interval_s=period,
+                    batch_s=raw.batch_s,
+                    retention_days=days,
+                    aggregates=AGGREGATES,
+                )
+            else:
+                store = DiskHistorian(
+                    raw.directory / name,
+                    ids,
+                    keys,
+                    interval_s=period,
+                    fsync_s=raw.fsync_s,
+                    retention_days=days,
+                    aggregates=AGGREGATES,
+                    segment="day" if period < 3600.0 else "month",
+                )
+            tiers.append((name, period, store))
+        return cls(raw, tiers)
+
+    def _stores(self):
+        return [self.raw] + [store for _, _, store in self.tiers]
+
+    def _update_errors(self) -> None:
+        stores = self._stores()
+        self.errors = sum(s.errors for s in stores)
+        self.last_error = next((s.last_error for s in stores if s.last_error), self.last_error)
+
+    def _cascade(self, level: int, closed) -> None:
+        """Guardar un intervalo cerrado del nivel ``level`` y pasarlo al siguiente."""
+        while closed is not None:
+            bucket, agg = closed
+            self.tiers[level][2].append_row(bucket, agg, replace=self._partial.pop(level, None) == bucket)
+            level += 1
+            closed = self._samplers[level].add_rollup(bucket, agg) if level < len(self.tiers) else None
+
+    def append(self, data: Mapping, ts: Optional[float] = None) -> bool:
+        """Anexar la muestra de un ciclo al bruto y acumularla en los niveles."""
+        ts = float(getattr(data, "ts", 0.0) if ts is None else ts)
+        if ts - self._last_ts < 0.9 * self.interval_s:
+            return False
+        self._last_ts = ts
+        row = sample_row(data, self.tunnel_ids, self.index, self.keys, self._row)
+        ok = self.raw.append_row(ts, row)
+        if self._samplers:
+            self._cascade(0, self._samplers[0].add_sample(ts, row))
+        self._update_errors()
+        return ok
+
+    @property
+    def fsync_s(self) -> float:
+        return min((getattr(s, "fsync_s", FSYNC_S) for s in self._stores()), default=FSYNC_S)
+
+    def sync_due(self) -> bool:
+        """fsync periódico de los almacenes que lo necesiten (ver DiskHistorian.sync_due)."""
+        done = False
+        for store in self._stores():
+            sync_due = getattr(store, "sync_due", None)
+            if sync_due is not None and sync_due():
+                done = True
+        self._update_errors()
+        return done
+
+    def _save_partial(self, level: int, lower) -> Optional[Tuple[float, np.ndarray]]:
+        """Guardar la fila a medias del nivel ``level`` sin vaciar su acumulador.
+
+        ``lower`` es la fila a medias del nivel inferior, aún no acumulada en
+        este; se suma si cae en el mismo intervalo. Devuelve la fila guardada.
+        """
+        sampler = self._samplers[level]
+        current = sampler.peek()
+        if lower is not None and (current is None or lower[0] - lower[0] % sampler.period_s == current[0]):
+            merged = Downsampler(sampler.period_s, self._row.shape)
+            if current is not None:
+                merged.add_rollup(*current)
+            merged.add_rollup(*lower)
+            current = merged.flush()
+        if current is None:
+            return None
+        bucket, agg = current
+        store = self.tiers[level][2]
+        if store.append_row(bucket, agg, replace=self._partial.get(level) == bucket):
+            self._partial[level] = bucket
+        return bucket, agg.copy()
+
+    def close(self) -> None:
+        """Guardar los intervalos en curso y cerrar todos los almacenes.
+
+        Los acumuladores se conservan: si la adquisición sigue (p. ej. el
+        Poller se reinicia tras cambiar la configuración) el intervalo
+        completo sustituye a la fila a medias en lugar de rechazarse.
+        """
+        lower = None
+        for level in range(len(self._samplers)):
+            lower = self._save_partial(level, lower)
+        for store in self._stores():
+            store.close()
+        with self._lock:
+            if self._reader is not None:
+                self._reader.shutdown(wait=False)
+                self._reader = None
+        self._update_errors()
+
+    # --- Consulta --------------------------------------------------------------
+
+    def _horizon(self, store) -> float:
+        days = getattr(store, "retention_days", 0)
+        return time.time() - days * 86400.0 if days > 0 else float("-inf")
+
+    def select_tier(self, since: float, until: float, width_px: Optional[int] = None) -> int:
+        """Nivel para un rango: 0 = bruto, i = ``tiers[i - 1]``."""
+        span = max(0.0, float(until) - float(since))
+        level = 0
+        if width_px:
+            for i, (_, period, _) in enumerate(self.tiers, 1):
+                if span / period >= width_px:
+                    level = i
+        stores = self._stores()
+        # Si el nivel ya purgó el inicio del rango, pasar a uno más grueso
+        while level < len(self.tiers) and since < self._horizon(stores[level]):
+            level += 1
+        return level
+
+    def period_of(self, level: int) -> float:
+        return self.interval_s if level == 0 else self.tiers[level - 1][1]
+
+    def query(
+        self,
+        tunnel_id: int,
+        key: str,
+        since: float,
+        until: float,
+        width_px: Optional[int] = None,
+        agg: str = "avg",
+        level: Optional[int] = None,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Sellos y valores de una señal en el nivel adecuado (``agg`` solo aplica a los resumidos)."""
+        if level is None:
+            level = self.select_tier(since, until, width_px)
+        store = self._stores()[level]
+        # Tope de puntos para rangos largos sin nivel que los cubra (mínimo y máximo por tramo)
+        max_points = 4 * width_px if width_px else None
+        if level == 0:
+            return store.query(tunnel_id, key, since, until, max_points=max_points)
+        return store.query(tunnel_id, key, since, until, max_points=max_points, agg=agg)
+
+    def submit_query(self, tunnel_id: int, key: str, since: float, until: float, width_px=None, agg="avg", level=None) -> Future:
+        """Ejecutar ``query`` en un hilo lector; el Future devuelve (sellos, valores)."""
+        with self._lock:
+            if self._reader is None:
+                self._reader = ThreadPoolExecutor(max_workers=1, thread_name_prefix="historian-read")
+            reader = self._reader
+        return reader.submit(self.query, tunnel_id, key, since, until, width_px, agg, level)
+
+    def stats(self) -> Dict[str, object]:
+        stats = dict(self.raw.stats())
+        for name, _, store in self.tiers:
+            stats[f"historian_{name}_written"] = store.written
+        stats["historian_errors"] = self.errors
+        return stats
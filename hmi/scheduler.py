@@ -0,0 +1,195 @@
+from __future__ import annotations
+
+from typing import Dict, Tuple
+
+from .models import PLCConfig, TunnelData
+
+# Señales analógicas usadas para medir la velocidad de cambio de la planta
+_RATE_FIELDS = ("temp_ambiente", "temp_pulpa1", "temp_pulpa2")
+
+
+class PollPacer:
+    """Intervalo de sondeo adaptativo.
+
+    Tras cada ciclo recibe la duración real de ``read_all`` y la velocidad de
+    cambio de las temperaturas. Acorta el intervalo durante transitorios
+    (cambios rápidos, marcha/paro o deshielo), lo alarga poco a poco con la
+    planta estable y nunca lo deja por debajo de la duración del ciclo más
+    un margen, de modo que una sobrecarga estira el intervalo en vez de
+    acumular lecturas. Con ``adaptive=False`` el intervalo es fijo pero se
+    siguen contando los desbordes.
+    """
+
+    # Margen sobre la duración del ciclo y crecimiento por paso estable
+    LOAD_MARGIN = 1.5
+    GROWTH = 1.25
+    # Ciclos estables seguidos antes de empezar a alargar
+    STEADY_CYCLES = 5
+    # Ventana de medida de la velocidad de cambio (s)
+    RATE_MIN_S = 1.0
+    RATE_WINDOW_S = 5.0
+
+    def __init__(
+        self,
+        base_ms: int = 1000,
+        min_ms: int = 250,
+        max_ms: int = 5000,
+        change_threshold: float = 0.05,
+        adaptive: bool = True,
+    ):
+        self.base_ms = int(max(200, base_ms))
+        self.min_ms = int(max(200, min(min_ms, self.base_ms)))
+        self.max_ms = int(max(self.base_ms, max_ms))
+        # °C/s a partir de los cuales se considera transitorio
+        self.change_threshold = float(change_threshold)
+        self.adaptive = bool(adaptive)
+        self.interval_ms = self.base_ms
+        self.overruns = 0
+        self.last_cycle_ms = 0.0
+        self.last_change_rate = 0.0
+        self._steady = 0
+        self._prev: Dict[int, Tuple[float, tuple, tuple]] = {}
+
+    @classmethod
+    def from_config(cls, cfg: PLCConfig) -> "PollPacer":
+        return cls(
+            base_ms=cfg.poll_interval_ms,
+            min_ms=getattr(cfg, "poll_min_ms", 250),
+            max_ms=getattr(cfg, "poll_max_ms", 5000),
+            change_threshold=getattr(cfg, "poll_change_threshold", 0.05),
+            adaptive=getattr(cfg, "adaptive_poll", True),
+        )
+
+    def change_rate(self, data: Dict[int, TunnelData], now: float) -> Tuple[float, bool]:
+        """Máxima velocidad de cambio (°C/s) y si hubo un evento discreto desde el último ciclo.
+
+        La velocidad se mide contra una muestra de referencia de al menos
+        RATE_MIN_S segundos (renovada cada RATE_WINDOW_S) para que el ruido de
+        las sondas no se amplifique al acortar el intervalo.
+        """
+        rate = 0.0
+        event = False
+        for tid, td in data.items():
+            analog = tuple(float(getattr(td, f, 0.0)) for f in _RATE_FIELDS)
+            discrete = (bool(td.estado), bool(td.deshielo_activo))
+            prev = self._prev.get(tid)
+            if prev is None:
+                self._prev[tid] = (now, analog, discrete)
+                continue
+            if discrete != prev[2]:
+                event = True
+            dt = now - prev[0]
+            if dt >= self.RATE_MIN_S:
+                for a, b in zip(analog, prev[1]):
+                    rate = max(rate, abs(a - b) / dt)
+            else:
+                rate = max(rate, self.last_change_rate)
+            ref_t, ref = (now, analog) if dt >= self.RATE_WINDOW_S else (prev[0], prev[1])
+            self._prev[tid] = (ref_t, ref, discrete)
+        return rate, event
+
+    def update(self, cycle_ms: float, rate: float = 0.0, event: bool = False) -> bool:
+        """Registrar un ciclo y recalcular el intervalo. Devuelve True si hubo desborde."""
+        self.last_cycle_ms = float(cycle_ms)
+        self.last_change_rate = float(rate)
+        overrun = cycle_ms > self.interval_ms
+        if overrun:
+            self.overruns += 1
+        if not self.adaptive:
+            return overrun
+        if event or rate >= self.change_threshold:
+            # Transitorio: muestrear lo más rápido permitido
+            self._steady = 0
+            target = self.min_ms
+        elif rate < self.change_threshold / 4:
+            # Planta estable: alargar gradualmente
+            self._steady += 1
+            target = self.interval_ms * self.GROWTH if self._steady >= self.STEADY_CYCLES else self.interval_ms
+        else:
+            self._steady = 0
+            target = self.base_ms
+        floor = max(self.min_ms, cycle_ms * self.LOAD_MARGIN)
+        self.interval_ms = int(min(self.max_ms, max(floor, target)))
+        return overrun
+
+    def kick(self) -> None:
+        """Volver al intervalo base (p. ej. tras una orden del operador)."""
+        self._steady = 0
+        if self.adaptive:
+            self.interval_ms = max(int(self.last_cycle_ms * self.LOAD_MARGIN), min(self.interval_ms, self.base_ms))
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "interval_ms": self.interval_ms,
+            "last_cycle_ms": round(self.last_cycle_ms, 1),
+            "change_rate": round(self.last_change_rate, 4),
+            "overruns": self.overruns,
+        }
+
+
+class CycleClock:
+    """Plazos de adquisición absolutos sobre reloj monotónico.
+
+    Cada plazo es el anterior más el periodo, de modo que el retraso de un
+    ciclo no se acumula (sin deriva). Si un ciclo se pasa de uno o más
+    plazos, estos se saltan en lugar de ejecutarse en ráfaga. Lleva
+    contadores de jitter (inicio real menos plazo), plazos saltados y
+    periodo real de muestreo.
+    """
+
+    def __init__(self, period_s: float = 1.0):
+        self.period_s = float(period_s)
+        self.deadline: float = 0.0
+        self.cycles = 0
+        self.skipped = 0
+        self.jitter_last = 0.0
+        self.jitter_max = 0.0
+        self._jitter_sum = 0.0
+        self.period_last = 0.0
+        self.period_avg = 0.0
+        self._last_start: float = 0.0
+
+    def start(self, now: float) -> None:
+        self.deadline = now
+        self._last_start = 0.0
+
+    def set_period(self, period_s: float) -> None:
+        """Cambiar el periodo; se aplica a partir del siguiente plazo."""
+        self.period_s = float(period_s)
+
+    def begin(self, now: float) -> None:
+        """Registrar el inicio real de un ciclo."""
+        jitter = now - self.deadline
+        self.cycles += 1
+        self.jitter_last = jitter
+        self.jitter_max = max(self.jitter_max, abs(jitter))
+        self._jitter_sum += abs(jitter)
+        if self._last_start:
+            self.period_last = now - self._last_start
+            # Media móvil exponencial del periodo real
+            self.period_avg = self.period_last if not self.period_avg else 0.9 * self.period_avg + 0.1 * self.period_last
+        self._last_start = now
+
+    def next_delay(self, now: float) -> float:
+        """Avanzar al siguiente plazo (saltando los perdidos) y devolver la espera en segundos."""
+        self.deadline += self.period_s
+        if now >= self.deadline:
+            missed = int((now - self.deadline) // self.period_s) + 1
+            self.skipped += missed
+            self.deadline += missed * self.period_s
+        return self.deadline - now
+
+    def advance_to(self, now: float) -> float:
+        """Adelantar el siguiente plazo a ``now`` si era posterior; devuelve la espera restante."""
+        self.deadline = min(self.deadline, now)
+        return self.deadline - now
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "cycles": self.cycles,
+            "skipped": self.skipped,
+            "jitter_ms": round(self.jitter_last * 1000.0, 2),
+            "jitter_max_ms": round(self.jitter_max * 1000.0, 2),
+            "jitter_avg_ms": round(self._jitter_sum / self.cycles * 1000.0, 2) if self.cycles else 0.0,
+            "period_ms": round(self.period_avg * 1000.0, 1),
+        }
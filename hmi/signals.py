@@ -0,0 +1,142 @@
+from __future__ import annotations
+
+from dataclasses import asdict, fields
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from .models import SignalDef, TagAddress, default_signals
+
+# Señales que la adquisición, el ritmo de sondeo y la UI leen directamente: no se pueden quitar
+CORE_SIGNALS = (
+    "temp_ambiente",
+    "temp_pulpa1",
+    "temp_pulpa2",
+    "setpoint",
+    "estado",
+    "deshielo_activo",
+    "tiempo_enfriamiento",
+)
+
+
+def merge_signals(declared: Iterable[dict], base: Optional[List[SignalDef]] = None) -> List[SignalDef]:
+    """Combinar las señales declaradas en config con las estándar, por clave.
+
+    Una entrada con la clave de una estándar cambia solo los atributos que
+    trae; una clave nueva añade la señal al final. ``"enabled": false``
+    quita la señal, salvo las de CORE_SIGNALS (ValueError).
+    """
+    known = {f.name for f in fields(SignalDef)}
+    out: Dict[str, SignalDef] = {s.key: s for s in (default_signals() if base is None else base)}
+    for entry in declared:
+        entry = dict(entry)
+        key = entry.get("key")
+        if not key:
+            continue
+        if entry.pop("enabled", True) is False:
+            if key in CORE_SIGNALS:
+                raise ValueError(f"La señal {key!r} es imprescindible y no se puede desactivar")
+            out.pop(key, None)
+            continue
+        params = {k: v for k, v in entry.items() if k in known}
+        prev = out.get(key)
+        out[key] = SignalDef(**{**asdict(prev), **params}) if prev is not None else SignalDef(**params)
+    return list(out.values())
+
+
+def declared_signals(signals: List[SignalDef]) -> List[dict]:
+    """Lo que hay que guardar en config: solo las diferencias con las señales estándar."""
+    base = {s.key: s for s in default_signals()}
+    out: List[dict] = []
+    for s in signals:
+        prev = base.pop(s.key, None)
+        if prev is None:
+            out.append(asdict(s))
+        elif prev != s:
+            diff = {k: v for k, v in asdict(s).items() if getattr(prev, k) != v}
+            out.append({"key": s.key, **diff})
+    out.extend({"key": k, "enabled": False} for k in base)
+    return out
+
+
+class SignalRegistry:
+    """Registro de señales de túnel: qué se lee, en qué columna y cómo se muestra.
+
+    Lo usan el plan de lectura (tags y clase de escaneo), la instantánea
+    (una columna por señal), la detección de cambios (banda muerta), el
+    histórico y el detalle del túnel, de modo que añadir una señal es
+    declararla en config y asignarle un tag en cada túnel.
+    """
+
+    def __init__(self, signals: Optional[Iterable[SignalDef]] = None):
+        self.signals: List[SignalDef] = list(default_signals() if signals is None else signals)
+        self._by_key: Dict[str, SignalDef] = {s.key: s for s in self.signals}
+        self.keys: Tuple[str, ...] = tuple(s.key for s in self.signals)
+        self.bool_keys = frozenset(s.key for s in self.signals if s.type.upper() == "BOOL")
+        self.analog_keys: Tuple[str, ...] = tuple(k for k in self.keys if k not in self.bool_keys)
+        self.plc_keys: Tuple[str, ...] = tuple(s.key for s in self.signals if s.source == "plc")
+
+    @classmethod
+    def from_config(cls, app_cfg) -> "SignalRegistry":
+        return cls(getattr(app_cfg, "signals", None))
+
+    def __iter__(self) -> Iterator[SignalDef]:
+        return iter(self.signals)
+
+    def __len__(self) -> int:
+        return len(self.signals)
+
+    def __contains__(self, key) -> bool:
+        return key in self._by_key
+
+    def get(self, key: str) -> Optional[SignalDef]:
+        return self._by_key.get(key)
+
+    def scan_classes(self, overrides: Optional[Dict[str, str]] = None) -> Dict[str, str]:
+        """Clase de escaneo por clave (de señal y de tag); ``overrides`` (PLCConfig.scan_classes) manda."""
+        out: Dict[str, str] = {}
+        for s in self.signals:
+            if s.source != "plc":
+                continue
+            for tag_key in s.tags or [s.key]:
+                out[tag_key] = s.scan_class
+            out[s.key] = s.scan_class
+        out.update(overrides or {})
+        return out
+
+    def deadbands(self, overrides: Optional[Dict[str, float]] = None) -> Dict[str, float]:
+        out = {s.key: float(s.deadband) for s in self.signals}
+        out.update({k: float(v) for k, v in (overrides or {}).items()})
+        return out
+
+    def tunnel_reads(self, ta: Dict[str, TagAddress]) -> List[Tuple[str, str, TagAddress]]:
+        """Ternas (señal, clave de tag, tag) que se leen para un túnel.
+
+        Por cada señal se usa el primer tag presente de su lista. Lanza
+        KeyError si falta el tag de una señal obligatoria.
+        """
+        reads: List[Tuple[str, str, TagAddress]] = []
+        for s in self.signals:
+            if s.source != "plc":
+                continue
+            for tag_key in s.tags or [s.key]:
+                if tag_key in ta:
+                    reads.append((s.key, tag_key, ta[tag_key]))
+                    break
+            else:
+                if s.required:
+                    raise KeyError(s.key)
+        return reads
+
+    def history_keys(self) -> Tuple[str, ...]:
+        return tuple(s.key for s in self.signals if s.history)
+
+    def label(self, key: str) -> str:
+        s = self._by_key.get(key)
+        return (s.label or s.key) if s is not None else key
+
+    def unit(self, key: str) -> str:
+        s = self._by_key.get(key)
+        return s.unit if s is not None else ""
+
+
+# Registro con las señales estándar (cuando nadie pasa uno)
+DEFAULT_REGISTRY = SignalRegistry()
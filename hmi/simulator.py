@@ -2,14 +2,21 @@ from __future__ import annotations
 
 import random
 import time
-from typing import Dict, List, Union
+from typing import Dict, List, Optional, Union
 
-from .models import PLCConfig, TunnelConfig, TunnelData
+from .models import QUALITY_GOOD, PLCConfig, TunnelConfig
+from .signals import DEFAULT_REGISTRY, SignalRegistry
+from .snapshot import PlantSnapshot, SnapshotBuffers
+
+# Señales con dinámica propia en la simulación; el resto del registro se sirve desde ``state``
+_CALIBRATED = ("temp_ambiente", "temp_pulpa1", "temp_pulpa2")
+_DEFROST_TAGS = ("deshielo_activo", "deshielo_mando", "deshielo_set", "deshielo_onoff")
 
 
 class SimulatedPLC:
-    def __init__(self, cfg: PLCConfig, tunnels: List[TunnelConfig]):
+    def __init__(self, cfg: PLCConfig, tunnels: List[TunnelConfig], signals: Optional[SignalRegistry] = None):
         self.cfg = cfg
+        self.signals = signals or DEFAULT_REGISTRY
         self.tunnels_map: Dict[int, TunnelConfig] = {t.id: t for t in tunnels}
         # Estado interno simulado
         self.state: Dict[int, Dict[str, Union[float, bool]]] = {}
@@ -35,9 +42,17 @@ class SimulatedPLC:
                 # Posición de válvula (0..100 %)
                 "valvula_posicion": 0.0,
             }
+            # Señales declaradas en config sin modelo propio: valor fijo escribible
+            for key in self.signals.plc_keys:
+                self.state[t.id].setdefault(key, 0.0)
         self._connected = True
         self._last_error = None
         self._last_update = time.time()
+        self._snaps = SnapshotBuffers([t.id for t in tunnels], [t.name for t in tunnels], self.signals)
+        # La simulación entrega todas las señales del PLC con calidad buena
+        for snap in (self._snaps.next(), self._snaps.next()):
+            for f in self.signals.plc_keys:
+                snap.quality[f][:] = bytearray([QUALITY_GOOD]) * len(snap.ids)
 
     def connect(self) -> bool:
         self._connected = True
@@ -86,34 +101,28 @@ class SimulatedPLC:
             if bool(st.get("deshielo_activo", False)) and float(st.get("_defrost_end", 0.0)) > 0.0 and now >= float(st.get("_defrost_end", 0.0)):
                 st["deshielo_activo"] = False
 
-    def read_all(self) -> Dict[int, TunnelData]:
+    def read_all(self, scan_classes=None) -> PlantSnapshot:
+        # La simulación siempre devuelve todas las señales
         if not self._connected:
             self.connect()
         self._step()
-        out: Dict[int, TunnelData] = {}
-        for tid, tcfg in self.tunnels_map.items():
+        out = self._snaps.next()
+        now = time.time()
+        v = out.values
+        for col, tid in enumerate(out.ids):
             st = self.state[tid]
-            # Aplicar calibración como lo haría el PLC
-            amb = float(st["temp_ambiente"]) + float(st.get("cal_temp_ambiente", 0.0))
-            p1 = float(st["temp_pulpa1"]) + float(st.get("cal_temp_pulpa1", 0.0))
-            p2 = float(st["temp_pulpa2"]) + float(st.get("cal_temp_pulpa2", 0.0))
-
-            # Estado de deshielo efectivo (OR de tags de estado)
-            defrost_active = bool(st.get("deshielo_activo", False) or st.get("deshielo_mando", False) or st.get("deshielo_set", False) or st.get("deshielo_onoff", False))
-
-            out[tid] = TunnelData(
-                id=tcfg.id,
-                name=tcfg.name,
-                temp_ambiente=amb,
-                temp_pulpa1=p1,
-                temp_pulpa2=p2,
-                setpoint=float(st["setpoint"]),
-                setpoint_pulpa1=float(st["setpoint_pulpa1"]),
-                setpoint_pulpa2=float(st["setpoint_pulpa2"]),
-                estado=bool(st["estado"]),
-                deshielo_activo=defrost_active,
-                valvula_posicion=float(st.get("valvula_posicion", 0.0)),
-            )
+            for key in self.signals.plc_keys:
+                if key in _CALIBRATED:
+                    # Aplicar calibración como lo haría el PLC
+                    value = float(st[key]) + float(st.get("cal_" + key, 0.0))
+                elif key == "deshielo_activo":
+                    # Estado de deshielo efectivo (OR de tags de estado)
+                    value = 1.0 if any(st.get(k, False) for k in _DEFROST_TAGS) else 0.0
+                else:
+                    value = float(st.get(key, 0.0))
+                v[key][col] = value
+        out.stamp(now)
+        out.mark_all()
         return out
 
     def write_setpoint(self, tunnel_id: int, value: float) -> bool:
@@ -158,6 +167,9 @@ class SimulatedPLC:
                 self.state[tunnel_id]["deshielo_activo"] = False
                 self.state[tunnel_id]["_defrost_end"] = 0.0
                 return True
+            if tag_key.startswith("cmd_"):
+                # Mandos por pulso sin efecto en la simulación (y sus reposiciones a 0)
+                return True
             # fallback: si el estado contiene la clave, actualizar
             if tag_key in self.state[tunnel_id]:
                 self.state[tunnel_id][tag_key] = value
@@ -166,5 +178,24 @@ class SimulatedPLC:
             return False
         return False
 
+    def write_many(self, items):
+        # Una escritura por ítem; None = correcta. La simulación no tiene fallos de comunicación
+        return [
+            None if self.write_by_key(tid, key, value) else f"Escritura rechazada: {key} no simulado en túnel {tid}"
+            for tid, key, value in items
+        ]
+
+    def invalidate_read_plan(self) -> None:
+        # Sin plan de lectura en simulación
+        pass
+
+    def set_on_demand_tunnels(self, tunnel_ids) -> None:
+        # Sin grupos de escaneo en simulación
+        pass
+
+    def drain_events(self):
+        # La simulación no pierde la conexión
+        return []
+
     def last_error(self):
         return self._last_error
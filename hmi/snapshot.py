@@ -0,0 +1,235 @@
+from __future__ import annotations
+
+from collections.abc import Mapping
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .models import QUALITY_GOOD, QUALITY_STALE, TunnelData
+from .signals import DEFAULT_REGISTRY, SignalRegistry
+
+# Campos propios de TunnelData; el resto de señales del registro va a TunnelData.extra
+_TUNNELDATA_FIELDS = frozenset(TunnelData.__dataclass_fields__)
+# Calidad de un campo sin señal configurada (no aparece en TunnelView.quality)
+QUALITY_ABSENT = 255
+
+
+def _zeros(n: int):
+    return np.zeros(n)
+
+
+def _quality_column(n: int):
+    return np.full(n, QUALITY_ABSENT, dtype=np.uint8)
+
+
+class TunnelView:
+    """Vista ligera de un túnel dentro de un PlantSnapshot, con la interfaz de TunnelData.
+
+    No copia nada: cada señal del registro se lee (y escribe) como atributo
+    directamente sobre su columna. Las vistas se crean una vez con la
+    instantánea y se reutilizan en cada ciclo.
+    """
+
+    __slots__ = ("_snap", "_col")
+
+    def __init__(self, snap: "PlantSnapshot", col: int):
+        object.__setattr__(self, "_snap", snap)
+        object.__setattr__(self, "_col", col)
+
+    def __getattr__(self, name: str):
+        # Solo se llama para lo que no es atributo propio: las señales
+        snap = object.__getattribute__(self, "_snap")
+        column = snap.values.get(name)
+        if column is None:
+            raise AttributeError(name)
+        value = column[object.__getattribute__(self, "_col")]
+        return bool(value) if name in snap.bool_fields else float(value)
+
+    def __setattr__(self, name: str, value) -> None:
+        column = self._snap.values.get(name)
+        if column is None:
+            raise AttributeError(name)
+        column[self._col] = float(value)
+
+    @property
+    def id(self) -> int:
+        return self._snap.ids[self._col]
+
+    @property
+    def name(self) -> str:
+        return self._snap.names[self._col]
+
+    @property
+    def ts(self) -> float:
+        return self._snap.ts
+
+    @property
+    def quality(self) -> Dict[str, int]:
+        q = self._snap.quality
+        return {f: int(q[f][self._col]) for f in self._snap.fields if q[f][self._col] != QUALITY_ABSENT}
+
+    @property
+    def source_ts(self) -> Dict[str, float]:
+        q = self._snap.quality
+        return {
+            f: float(self._snap.source_ts[f][self._col])
+            for f in self._snap.fields
+            if q[f][self._col] != QUALITY_ABSENT
+        }
+
+    def detach(self) -> TunnelData:
+        """Copia independiente como TunnelData (para entregarla a otro hilo)."""
+        own: Dict[str, object] = {}
+        extra: Dict[str, float] = {}
+        for f in self._snap.fields:
+            value = getattr(self, f)
+            if f in _TUNNELDATA_FIELDS:
+                own[f] = value
+            else:
+                extra[f] = value
+        return TunnelData(
+            id=self.id, name=self.name, ts=self.ts, quality=self.quality, source_ts=self.source_ts, extra=extra, **own
+        )
+
+    def __repr__(self) -> str:
+        return f"TunnelView(id={self.id}, name={self.name!r})"
+
+
+class PlantSnapshot(Mapping):
+    """Instantánea de la planta en columnas (struct-of-arrays).
+
+    Cada señal es una columna contigua (``numpy.ndarray``) indexada por la posición del túnel en ``ids``, con su calidad y sello de
+    origen en columnas paralelas y un único ``ts`` por ciclo. Se comporta
+    como un ``Dict[int, TunnelData]`` de solo los túneles presentes, cuyas
+    entradas son TunnelView, de modo que el código existente no cambia. Las
+    columnas salen del registro de señales.
+    """
+
+    def __init__(self, ids: Sequence[int], names: Sequence[str], signals: Optional[SignalRegistry] = None):
+        signals = signals or DEFAULT_REGISTRY
+        self.ids: Tuple[int, ...] = tuple(ids)
+        self.names: List[str] = list(names)
+        self.index: Dict[int, int] = {tid: i for i, tid in enumerate(self.ids)}
+        # Una columna por señal del registro
+        self.fields: Tuple[str, ...] = signals.keys
+        self.bool_fields = signals.bool_keys
+        n = len(self.ids)
+        self.ts = 0.0
+        self.values = {f: _zeros(n) for f in self.fields}
+        self.source_ts = {f: _zeros(n) for f in self.fields}
+        self.quality = {f: _quality_column(n) for f in self.fields}
+        # Túneles con datos en este ciclo
+        self.present = bytearray(n)
+        self._views = [TunnelView(self, i) for i in range(n)]
+
+    def same_layout(self, ids: Sequence[int]) -> bool:
+        return self.ids == tuple(ids)
+
+    def clear(self) -> None:
+        """Sin datos (len 0); los valores se conservan para servirlos como STALE."""
+        self.present[:] = bytes(len(self.ids))
+
+    def mark_all(self) -> None:
+        self.present[:] = b"\x01" * len(self.ids)
+
+    def stamp(self, ts: float) -> None:
+        """Mismo sello de ciclo y de origen para todas las señales (fuentes sin sello propio)."""
+        self.ts = ts
+        for col in self.source_ts.values():
+            col.fill(ts)
+
+    def column(self, field_name: str):
+        return self.values[field_name]
+
+    def view(self, tunnel_id: int) -> TunnelView:
+        return self._views[self.index[tunnel_id]]
+
+    def __getitem__(self, tunnel_id: int) -> TunnelView:
+        i = self.index[tunnel_id]
+        if not self.present[i]:
+            raise KeyError(tunnel_id)
+        return self._views[i]
+
+    def __iter__(self) -> Iterator[int]:
+        return (tid for tid, p in zip(self.ids, self.present) if p)
+
+    def __len__(self) -> int:
+        return sum(self.present)
+
+    def __contains__(self, tunnel_id) -> bool:
+        i = self.index.get(tunnel_id)
+        return i is not None and bool(self.present[i])
+
+    def copy_into(self, dst: "PlantSnapshot", stale: bool = False, dst_idx: Optional[Sequence[int]] = None) -> None:
+        """Copiar los túneles presentes a ``dst`` (en sus posiciones ``dst_idx``).
+
+        Con ``stale`` la calidad de los campos con señal pasa a STALE (último
+        valor conocido de un PLC que no respondió a tiempo).
+        """
+        src_idx = [i for i, p in enumerate(self.present) if p]
+        if not src_idx:
+            return
+        if dst_idx is None:
+            dst_idx = [dst.index[self.ids[i]] for i in range(len(self.ids))]
+        to = [dst_idx[i] for i in src_idx]
+        s = np.asarray(src_idx, dtype=np.intp)
+        d = np.asarray(to, dtype=np.intp)
+        for f in self.fields:
+            dst.values[f][d] = self.values[f][s]
+            dst.source_ts[f][d] = self.source_ts[f][s]
+            q = self.quality[f][s]
+            dst.quality[f][d] = np.where(q != QUALITY_ABSENT, QUALITY_STALE, q) if stale else q
+        for b in to:
+            dst.present[b] = 1
+
+
+class SnapshotBuffers:
+    """Par de instantáneas alternas (doble búfer) con la misma disposición.
+
+    ``next()`` devuelve la que no se entregó en el último ciclo, de modo que
+    quien aún lea la anterior (otro hilo, una lectura STALE) no la ve cambiar
+    a medias. La memoria se reserva una vez; solo se vuelve a reservar si
+    cambia la lista de túneles (nuevo par).
+    """
+
+    def __init__(self, ids: Sequence[int] = (), names: Sequence[str] = (), signals: Optional[SignalRegistry] = None):
+        self._pair = [PlantSnapshot(ids, names, signals), PlantSnapshot(ids, names, signals)]
+        self._turn = 0
+        # Resultado sin datos (PLC caído): no consume búfer, así la última buena sigue intacta
+        self.empty = PlantSnapshot(ids, names, signals)
+
+    @property
+    def current(self) -> PlantSnapshot:
+        """Última instantánea entregada."""
+        return self._pair[self._turn]
+
+    def next(self) -> PlantSnapshot:
+        self._turn ^= 1
+        return self._pair[self._turn]
+
+
+def gather_map(pairs: Sequence[Tuple[int, str, int]]):
+    """Índices precompilados (destino, origen) por campo para volcar un búfer de ubicaciones.
+
+    ``pairs`` son ternas (columna del túnel, campo, índice de ubicación).
+    """
+    by_field: Dict[str, Tuple[List[int], List[int]]] = {}
+    for col, f, loc in pairs:
+        d, s = by_field.setdefault(f, ([], []))
+        d.append(col)
+        s.append(loc)
+    return {f: (np.asarray(d, dtype=np.intp), np.asarray(s, dtype=np.intp)) for f, (d, s) in by_field.items()}
+
+
+def fill_from_buffer(snap: PlantSnapshot, gmap, values, quality, ts) -> None:
+    """Volcar valores, calidad y sellos de un ValueBuffer a las columnas de ``snap``.
+
+    Los campos sin valor válido (ni bueno ni STALE) quedan a 0 como en TunnelData.
+    """
+    q_all = np.frombuffer(quality, dtype=np.uint8) if not isinstance(quality, np.ndarray) else quality
+    for f, (d, s) in gmap.items():
+        q = q_all[s]
+        ok = (q == QUALITY_GOOD) | (q == QUALITY_STALE)
+        snap.values[f][d] = np.where(ok, values[s], 0.0)
+        snap.source_ts[f][d] = ts[s]
+        snap.quality[f][d] = q
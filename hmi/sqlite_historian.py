@@ -0,0 +1,299 @@
+from __future__ import annotations
+
+import queue
+import re
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Mapping, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .history import HISTORY_INTERVAL_S, sample_row
+from .signals import DEFAULT_REGISTRY, SignalRegistry
+
+BATCH_S = 5.0
+RETENTION_DAYS = 90
+# Muestras retenidas en cola si el disco no da abasto (~10 min a 1 s); después se descartan
+QUEUE_MAX = 600
+_IDENT = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+_STOP = object()
+
+
+def _column(key: str) -> str:
+    if not _IDENT.match(key):
+        raise ValueError(f"Clave de señal no válida para SQLite: {key!r}")
+    return f'"{key}"'
+
+
+class SqliteHistorian:
+    """Histórico en SQLite (WAL) escrito por un hilo propio en transacciones grandes.
+
+    El hilo de adquisición solo encola la muestra del ciclo (``append``); el
+    hilo escritor vacía la cola e inserta cada ``batch_s`` segundos en una
+    única transacción. Una fila por túnel y muestra, con una columna por
+    señal del registro y clave primaria (tunnel_id, ts) en una tabla
+    WITHOUT ROWID, que hace de índice para las consultas por rango.
+
+    Las consultas van por una conexión de solo lectura; ``submit_query`` las
+    ejecuta en un hilo lector y devuelve un Future, de modo que la UI nunca
+    espera a la base de datos. Con ``aggregates`` (niveles de resumen de
+    rollups.py) hay una columna ``<señal>__<agregado>`` por combinación.
+    """
+
+    def __init__(
+        self,
+        path,
+        tunnel_ids: Sequence[int],
+        keys: Sequence[str],
+        interval_s: float = HISTORY_INTERVAL_S,
+        batch_s: float = BATCH_S,
+        retention_days: int = RETENTION_DAYS,
+        aggregates: Sequence[str] = (),
+    ):
+        self.path = Path(path)
+        self.tunnel_ids: Tuple[int, ...] = tuple(tunnel_ids)
+        self.keys: Tuple[str, ...] = tuple(keys)
+        self.aggregates: Tuple[str, ...] = tuple(aggregates)
+        # Mismo orden que los valores de una fila (agregado, señal)
+        names = [f"{k}__{a}" for a in self.aggregates for k in self.keys] if self.aggregates else list(self.keys)
+        self._columns = [_column(n) for n in names]
+        self._row = np.empty((len(self.keys), len(self.tunnel_ids)), dtype=np.float32)
+        self.index: Dict[int, int] = {tid: i for i, tid in enumerate(self.tunnel_ids)}
+        self.interval_s = max(0.0, float(interval_s))
+        self.batch_s = max(0.0, float(batch_s))
+        self.retention_days = int(retention_days)
+        self._queue: "queue.Queue" = queue.Queue(QUEUE_MAX)
+        self._writer: Optional[threading.Thread] = None
+        self._reader: Optional[ThreadPoolExecutor] = None
+        self._local = threading.local()
+        self._last_ts = float("-inf")
+        self._lock = threading.Lock()
+        self.queued = 0
+        self.written = 0
+        self.dropped = 0
+        self.transactions = 0
+        self.errors = 0
+        self.last_error = ""
+
+    @classmethod
+    def from_config(cls, cfg, tunnels, signals: Optional[SignalRegistry] = None, root=None) -> "SqliteHistorian":
+        signals = signals or DEFAULT_REGISTRY
+        directory = Path(getattr(cfg, "historian_dir", "history") or "history")
+        if not directory.is_absolute() and root is not None:
+            directory = Path(root) / directory
+        return cls(
+            directory / "history.sqlite3",
+            [t.id for t in tunnels],
+            signals.history_keys(),
+            interval_s=getattr(cfg, "history_interval_s", HISTORY_INTERVAL_S),
+            batch_s=getattr(cfg, "historian_batch_s", BATCH_S),
+            retention_days=getattr(cfg, "historian_retention_days", RETENTION_DAYS),
+        )
+
+    # --- Escritura -------------------------------------------------------------
+
+    def append(self, data: Mapping, ts: Optional[float] = None) -> bool:
+        """Encolar la muestra de un ciclo (no toca la base de datos); False si aún no toca o la cola está llena."""
+        ts = float(getattr(data, "ts", 0.0) if ts is None else ts)
+        if ts - self._last_ts < 0.9 * self.interval_s:
+            return False
+        return self.append_row(ts, sample_row(data, self.tunnel_ids, self.index, self.keys, self._row))
+
+    def append_row(self, ts: float, row: np.ndarray, replace: bool = False) -> bool:
+        """Encolar un registro ya preparado (señales × túneles, o agregados × señales × túneles).
+
+        Con ``replace`` un registro con el mismo sello que el último lo sustituye (INSERT OR REPLACE).
+        """
+        if ts < self._last_ts or (ts == self._last_ts and not replace):
+            return False
+        self._last_ts = ts
+        # Copia propia: el llamante reutiliza su búfer
+        row = np.array(row, dtype=np.float32)
+        self._ensure_writer()
+        try:
+            self._queue.put_nowait((ts, row))
+        except queue.Full:
+            self.dropped += 1
+            return False
+        self.queued += 1
+        return True
+
+    def _ensure_writer(self) -> None:
+        with self._lock:
+            if self._writer is None or not self._writer.is_alive():
+                self._writer = threading.Thread(target=self._write_loop, name="historian-sqlite", daemon=True)
+                self._writer.start()
+
+    def _connect_rw(self) -> sqlite3.Connection:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        con = sqlite3.connect(str(self.path), isolation_level=None)
+        con.execute("PRAGMA journal_mode=WAL")
+        con.execute("PRAGMA synchronous=NORMAL")
+        cols = "".join(f", {c} REAL" for c in self._columns)
+        con.execute(
+            f"CREATE TABLE IF NOT EXISTS samples (tunnel_id INTEGER NOT NULL, ts REAL NOT NULL{cols}, "
+            "PRIMARY KEY (tunnel_id, ts)) WITHOUT ROWID"
+        )
+        # Señales añadidas al registro después de crear la tabla
+        have = {r[1] for r in con.execute("PRAGMA table_info(samples)")}
+        for col in self._columns:
+            if col.strip('"') not in have:
+                con.execute(f"ALTER TABLE samples ADD COLUMN {col} REAL")
+        return con
+
+    def _write_loop(self) -> None:
+        try:
+            con = self._connect_rw()
+        except Exception as e:
+            self.errors += 1
+            self.last_error = str(e)
+            return
+        sql = (
+            f"INSERT OR REPLACE INTO samples (tunnel_id, ts{''.join(', ' + c for c in self._columns)}) "
+            f"VALUES (?, ?{', ?' * len(self._columns)})"
+        )
+        batch: List[Tuple[float, np.ndarray]] = []
+        deadline = time.monotonic() + self.batch_s
+        next_prune = 0.0
+        stop = False
+        while not stop:
+            try:
+                item = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                if item is _STOP:
+                    stop = True
+                else:
+                    batch.append(item)
+            except queue.Empty:
+                pass
+            now = time.monotonic()
+            if now < deadline and not stop:
+                continue
+            deadline = now + self.batch_s
+            if not batch:
+                continue
+            rows = []
+            for ts, row in batch:
+                for col, tid in enumerate(self.tunnel_ids):
+                    values = [None if v != v else v for v in row[..., col].ravel().tolist()]
+                    rows.append((tid, ts, *values))
+            try:
+                con.execute("BEGIN")
+                con.executemany(sql, rows)
+                if self.retention_days > 0 and now >= next_prune:
+                    # Purga de lo antiguo, como mucho cada hora
+                    limit = batch[-1][0] - self.retention_days * 86400.0
+                    con.executemany("DELETE FROM samples WHERE tunnel_id = ? AND ts < ?", [(t, limit) for t in self.tunnel_ids])
+                    next_prune = now + 3600.0
+                con.execute("COMMIT")
+                self.written += len(batch)
+                self.transactions += 1
+            except sqlite3.Error as e:
+                try:
+                    con.execute("ROLLBACK")
+                except sqlite3.Error:
+                    pass
+                self.errors += 1
+                self.last_error = str(e)
+            batch = []
+        try:
+            con.close()
+        except sqlite3.Error:
+            pass
+
+    def close(self) -> None:
+        """Escribir lo encolado y parar el hilo escritor (se relanza con el siguiente ``append``)."""
+        with self._lock:
+            writer, self._writer = self._writer, None
+        if writer is not None and writer.is_alive():
+            self._queue.put(_STOP)
+            writer.join()
+        if self._reader is not None:
+            self._reader.shutdown(wait=False)
+            self._reader = None
+
+    # --- Consulta --------------------------------------------------------------
+
+    def _connect_ro(self) -> Optional[sqlite3.Connection]:
+        con = getattr(self._local, "con", None)
+        if con is None:
+            if not self.path.exists():
+                return None
+            con = sqlite3.connect(f"{self.path.resolve().as_uri()}?mode=ro", uri=True)
+            self._local.con = con
+        return con
+
+    def query(
+        self,
+        tunnel_id: int,
+        key: str,
+        since: Optional[float] = None,
+        until: Optional[float] = None,
+        max_points: Optional[int] = None,
+        agg: str = "avg",
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Sellos y valores de una señal de un túnel entre ``since`` y ``until`` (incluidos).
+
+        Bloquea: desde la UI usar ``submit_query``. Con ``max_points`` se
+        devuelven el mínimo y el máximo de cada tramo de tiempo, así que los
+        picos cortos se conservan. En un nivel de resumen ``agg`` elige el
+        agregado; al reducir se usan sus columnas min y max.
+        """
+        col = _column(f"{key}__{agg}" if self.aggregates else key)
+        col_lo = col_hi = col
+        if self.aggregates:
+            col_lo = _column(f"{key}__{'min' if agg in ('avg', 'last', 'min') else agg}")
+            col_hi = _column(f"{key}__{'max' if agg in ('avg', 'last', 'max') else agg}")
+        lo = float("-inf") if since is None else float(since)
+        hi = float("inf") if until is None else float(until)
+        empty = np.empty(0, dtype=np.float64), np.empty(0, dtype=np.float32)
+        con = self._connect_ro()
+        if con is None:
+            return empty
+        try:
+            where = "tunnel_id = ? AND ts BETWEEN ? AND ?"
+            args = (tunnel_id, lo, hi)
+            rows = None
+            if max_points:
+                n, first, last = con.execute(f"SELECT COUNT(*), MIN(ts), MAX(ts) FROM samples WHERE {where}", args).fetchone()
+                if n > max_points:
+                    # Dos puntos por tramo; con un único MIN()/MAX() SQLite da el ts de esa fila
+                    buckets = max(1, max_points // 2)
+                    group = (first, (last - first) / buckets or 1.0, buckets - 1)
+                    rows = []
+                    for fn, c in (("MIN", col_lo), ("MAX", col_hi)):
+                        rows += con.execute(
+                            f"SELECT ts, {fn}({c}) FROM samples WHERE {where} "
+                            f"GROUP BY MIN(CAST((ts - ?) / ? AS INTEGER), ?)",
+                            args + group,
+                        ).fetchall()
+                    # Mínimo y máximo en la misma fila: un solo punto
+                    rows = sorted(set(rows), key=lambda r: r[0])
+            if rows is None:
+                rows = con.execute(f"SELECT ts, {col} FROM samples WHERE {where} ORDER BY ts", args).fetchall()
+        except sqlite3.OperationalError:
+            # Base aún sin tabla o sin esa columna
+            return empty
+        if not rows:
+            return empty
+        ts, values = zip(*rows)
+        return np.asarray(ts, dtype=np.float64), np.asarray([np.nan if v is None else v for v in values], dtype=np.float32)
+
+    def submit_query(self, tunnel_id: int, key: str, since=None, until=None, max_points=None, agg="avg") -> Future:
+        """Ejecutar ``query`` en el hilo lector; el Future devuelve (sellos, valores)."""
+        with self._lock:
+            if self._reader is None:
+                self._reader = ThreadPoolExecutor(max_workers=1, thread_name_prefix="historian-read")
+            reader = self._reader
+        return reader.submit(self.query, tunnel_id, key, since, until, max_points, agg)
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "historian_written": self.written,
+            "historian_queued": self._queue.qsize(),
+            "historian_dropped": self.dropped,
+            "historian_transactions": self.transactions,
+            "historian_errors": self.errors,
+        }
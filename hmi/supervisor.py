@@ -0,0 +1,164 @@
+from __future__ import annotations
+
+import random
+import socket
+from concurrent.futures import Future, ThreadPoolExecutor
+from threading import Event, Lock
+from time import monotonic, time
+from typing import Callable, List, Optional, Sequence
+
+from .models import ConnectionEvent
+
+
+def tcp_probe(host: str, ports: Sequence[int], timeout_s: float = 1.0) -> Optional[int]:
+    """Comprobación rápida de alcance: primer puerto TCP que acepta conexión, o None."""
+    for port in ports:
+        try:
+            with socket.create_connection((host, int(port)), timeout=timeout_s):
+                return int(port)
+        except OSError:
+            continue
+    return None
+
+
+class ReconnectSupervisor:
+    """Reconexión al PLC en segundo plano con backoff exponencial y jitter.
+
+    ``kick()`` nunca bloquea: si toca reintentar, lanza el intento en el hilo
+    del supervisor. Cada intento hace primero una sonda TCP corta
+    (``probe``) y solo si responde ejecuta la conexión completa
+    (``connect``), de modo que un PLC apagado no cuesta los timeouts de
+    snap7. Entre fallos la espera crece como base·2^n hasta ``cap_s``, con un
+    jitter aleatorio del 50 %. Las caídas y recuperaciones se publican como
+    ConnectionEvent con la duración del corte. ``stop()`` cancela lo
+    pendiente y hace que un intento en curso no siga adelante, para no
+    retrasar el cierre de la aplicación.
+    """
+
+    def __init__(
+        self,
+        connect: Callable[[], bool],
+        probe: Optional[Callable[[], bool]] = None,
+        base_s: float = 0.5,
+        cap_s: float = 30.0,
+        name: str = "",
+    ):
+        self._connect = connect
+        self._probe = probe
+        self.base_s = float(base_s)
+        self.cap_s = float(cap_s)
+        self.name = name
+        self.attempts = 0
+        self.next_attempt = 0.0
+        self.down_since: Optional[float] = None
+        self._up = False
+        self.last_error: Optional[str] = None
+        self._future: Optional[Future] = None
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"reconnect-{name or 'plc'}")
+        self._events: List[ConnectionEvent] = []
+        self._lock = Lock()
+        self._stop = Event()
+
+    @property
+    def busy(self) -> bool:
+        return self._future is not None and not self._future.done()
+
+    def delay(self) -> float:
+        """Espera antes del siguiente intento tras ``attempts`` fallos."""
+        d = min(self.cap_s, self.base_s * (2 ** max(0, self.attempts - 1)))
+        return d * random.uniform(0.5, 1.0)
+
+    def report_down(self, error: Optional[str] = None) -> None:
+        """Registrar una caída detectada por la lectura o la escritura (idempotente)."""
+        with self._lock:
+            if self.down_since is not None:
+                return
+            self.down_since = monotonic()
+            was_up = self._up
+            self._up = False
+            if was_up:
+                self._events.append(ConnectionEvent(plc=self.name, connected=False, ts=time(), error=error or ""))
+
+    def kick(self) -> None:
+        """Lanzar un intento de reconexión si toca; no bloquea."""
+        if self._stop.is_set() or self.busy or monotonic() < self.next_attempt:
+            return
+        try:
+            self._future = self._executor.submit(self._attempt)
+        except RuntimeError:
+            # Executor ya cerrado por stop()
+            pass
+
+    def stop(self) -> None:
+        """Dejar de reintentar: cancela lo encolado y corta el intento en curso entre sonda y conexión."""
+        self._stop.set()
+        try:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+        except TypeError:
+            # Python 3.8: sin cancel_futures; lo encolado termina enseguida al ver _stop
+            self._executor.shutdown(wait=False)
+
+    def resume(self) -> None:
+        """Volver a reintentar tras ``stop()`` (p. ej. en un connect() explícito)."""
+        if not self._stop.is_set():
+            return
+        self._stop.clear()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"reconnect-{self.name or 'plc'}")
+
+    def _attempt(self) -> bool:
+        ok = False
+        error = ""
+        try:
+            if self._stop.is_set():
+                return False
+            if self._probe is not None and not self._probe():
+                error = "sin respuesta a la sonda TCP"
+            elif self._stop.is_set():
+                return False
+            else:
+                ok = bool(self._connect())
+        except Exception as e:
+            error = str(e)
+        if ok:
+            self.report_up()
+            return True
+        with self._lock:
+            if self.down_since is None:
+                self.down_since = monotonic()
+            self.attempts += 1
+            self.next_attempt = monotonic() + self.delay()
+            if error:
+                self.last_error = error
+        return False
+
+    def report_up(self) -> None:
+        """Registrar la conexión establecida (por el supervisor o por un connect() directo)."""
+        with self._lock:
+            if self._up and self.down_since is None:
+                return
+            outage = monotonic() - self.down_since if self.down_since is not None else 0.0
+            self._events.append(
+                ConnectionEvent(plc=self.name, connected=True, ts=time(), outage_s=outage, attempts=self.attempts + 1)
+            )
+            self.attempts = 0
+            self.next_attempt = 0.0
+            self.down_since = None
+            self._up = True
+
+    def retry_in(self) -> float:
+        """Segundos hasta el próximo intento (0 si ya está en curso o toca)."""
+        return max(0.0, self.next_attempt - monotonic())
+
+    def drain_events(self) -> List[ConnectionEvent]:
+        with self._lock:
+            events, self._events = self._events, []
+        return events
+
+    def wait(self, timeout: Optional[float] = None) -> None:
+        """Esperar al intento en curso (útil en pruebas y al cerrar)."""
+        fut = self._future
+        if fut is not None:
+            try:
+                fut.result(timeout=timeout)
+            except Exception:
+                pass
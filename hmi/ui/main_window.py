@@ -16,7 +16,7 @@ from PyQt5.QtWidgets import (
 )
 
 from ..config import ConfigManager
-from ..models import PLCConfig, TunnelConfig, TunnelData, AppConfig
+from ..models import PLCConfig, SnapshotDelta, TunnelConfig, TunnelData, AppConfig
 from .dashboard_view import DashboardView
 from .tunnel_detail_view import TunnelDetailView
 from .settings_view import SettingsView
@@ -33,6 +33,8 @@ class MainWindow(QMainWindow):
     apply_settings = pyqtSignal(object)
     update_tunnel_tags = pyqtSignal(int, dict)
     update_tunnel_calibrations = pyqtSignal(int, dict)
+    # Túnel con el detalle abierto (0 = ninguno), para las lecturas bajo demanda
+    detail_tunnel_changed = pyqtSignal(int)
 
     def __init__(self, tunnels: List[TunnelConfig], initial_plc_connected: bool = False):
         super().__init__()
@@ -182,11 +184,16 @@ class MainWindow(QMainWindow):
 
     def _navigate(self, idx: int):
         self.stack.setCurrentIndex(idx)
-        if idx == 0:
+        if idx == 0 and self._current_tunnel_id is not None:
             self._current_tunnel_id = None
+            self.detail_tunnel_changed.emit(0)
+
+    def current_detail_tunnel(self) -> int:
+        return self._current_tunnel_id or 0
 
     def _open_detail(self, tunnel_id: int):
         self._current_tunnel_id = tunnel_id
+        self.detail_tunnel_changed.emit(tunnel_id)
         cfg = self.tunnels_map.get(tunnel_id)
         if cfg:
             # Ajustar el nombre visible según la nomenclatura del tablero
@@ -212,9 +219,12 @@ class MainWindow(QMainWindow):
         self._navigate(0)
 
     # Slots públicos para workers
-    def on_data_update(self, data: Dict[int, TunnelData]):
-        self._last_data = data
-        self.view_dashboard.update_data(data)
+    def on_data_update(self, delta: SnapshotDelta):
+        # Solo llegan los túneles que cambiaron; el resto conserva lo último recibido
+        data: Dict[int, TunnelData] = getattr(delta, "tunnels", delta)
+        self._last_data.update(data)
+        if data:
+            self.view_dashboard.update_data(data)
         # Actualizar sello de tiempo de última actualización
         try:
             self.lbl_update.setText(f"Últ. act.: {strftime('%H:%M:%S', localtime())}")
@@ -294,6 +304,28 @@ class MainWindow(QMainWindow):
         except Exception:
             pass
 
+    def on_connection_event(self, ev):
+        # Caídas y reconexiones del PLC con la duración del corte
+        try:
+            if ev.connected:
+                if ev.outage_s < 1.0:
+                    return
+                dur = f"{ev.outage_s / 60:.1f} min" if ev.outage_s >= 120 else f"{ev.outage_s:.0f} s"
+                self.on_plc_error(f"PLC {ev.plc}: reconectado tras {dur} sin conexión ({ev.attempts} intentos)")
+            else:
+                self.on_plc_error(f"PLC {ev.plc}: conexión perdida {ev.error}".strip())
+        except Exception:
+            pass
+
+    def on_command_done(self, result):
+        # Resultado de una orden de escritura: solo se avisan los fallos
+        try:
+            if not result.ok:
+                name = self.tunnels_map.get(result.tunnel_id).name if result.tunnel_id in self.tunnels_map else result.tunnel_id
+                self.on_plc_error(f"{name}: orden '{result.name}' fallida — {result.error or 'sin respuesta'}")
+        except Exception:
+            pass
+
     def on_plc_error(self, message: str):
         # Mostrar texto breve y guardar detalle en tooltip
         self.lbl_status.setToolTip(message or "")
@@ -10,8 +10,11 @@ from PyQt5.QtWidgets import (
     QSpinBox,
     QCheckBox,
     QPushButton,
+    QComboBox,
 )
 
+from dataclasses import replace
+
 from ..models import PLCConfig
 from typing import Optional
 
@@ -25,6 +28,8 @@ class SettingsView(QWidget):
 
     def __init__(self, plc_cfg: PLCConfig):
         super().__init__()
+        # Configuración base: conserva los campos avanzados que no tienen control en pantalla
+        self._base_cfg = plc_cfg
         self._build_ui()
         self.set_values(plc_cfg)
 
@@ -54,6 +59,11 @@ class SettingsView(QWidget):
 
         self.chk_sim = QCheckBox("Simulación")
 
+        # Modo de lectura (multi-variable o una petición por tag)
+        self.cb_read_mode = QComboBox()
+        self.cb_read_mode.addItem("Multi-variable", "multi")
+        self.cb_read_mode.addItem("Por tag", "single")
+
         # Preferencias de UI
         self.sp_visible = QSpinBox()
         self.sp_visible.setRange(1, 200)
@@ -74,6 +84,7 @@ class SettingsView(QWidget):
         add_row("Puerto:", self.sp_port)
         add_row("Intervalo (ms):", self.sp_poll)
         add_row("Modo:", self.chk_sim)
+        add_row("Lectura:", self.cb_read_mode)
         layout.addSpacing(8)
         layout.addWidget(QLabel("Preferencias de Interfaz"))
         add_row("Túneles visibles:", self.sp_visible)
@@ -103,12 +114,15 @@ class SettingsView(QWidget):
         self.btn_test.clicked.connect(self._emit_test)
 
     def set_values(self, cfg: PLCConfig):
+        self._base_cfg = cfg
         self.ed_ip.setText(cfg.ip)
         self.sp_rack.setValue(cfg.rack)
         self.sp_slot.setValue(cfg.slot)
         self.sp_port.setValue(cfg.port)
         self.sp_poll.setValue(cfg.poll_interval_ms)
         self.chk_sim.setChecked(cfg.simulation)
+        idx = self.cb_read_mode.findData(getattr(cfg, "read_mode", "multi"))
+        self.cb_read_mode.setCurrentIndex(idx if idx >= 0 else 0)
 
     def set_ui_prefs(self, ui: dict, total_tunnels: int):
         try:
@@ -150,15 +164,20 @@ class SettingsView(QWidget):
             except Exception:
                 pass
 
-    def _emit_apply(self):
-        cfg = PLCConfig(
+    def _build_cfg(self) -> PLCConfig:
+        return replace(
+            self._base_cfg,
             ip=self.ed_ip.text().strip() or "192.168.0.1",
             rack=int(self.sp_rack.value()),
             slot=int(self.sp_slot.value()),
             port=int(self.sp_port.value()),
             poll_interval_ms=int(self.sp_poll.value()),
             simulation=bool(self.chk_sim.isChecked()),
+            read_mode=str(self.cb_read_mode.currentData() or "multi"),
         )
+
+    def _emit_apply(self):
+        cfg = self._build_cfg()
         self.apply_settings.emit(cfg)
         # Sincronizar visibles con Cantidad (consistencia de lo que realmente se muestra)
         try:
@@ -176,14 +195,7 @@ class SettingsView(QWidget):
             pass
 
     def _emit_test(self):
-        cfg = PLCConfig(
-            ip=self.ed_ip.text().strip() or "192.168.0.1",
-            rack=int(self.sp_rack.value()),
-            slot=int(self.sp_slot.value()),
-            port=int(self.sp_port.value()),
-            poll_interval_ms=int(self.sp_poll.value()),
-            simulation=bool(self.chk_sim.isChecked()),
-        )
+        cfg = self._build_cfg()
         # Indicar estado inicial
         self.show_test_result("Probando conexión...", None)
         self.test_connection.emit(cfg)
@@ -0,0 +1,392 @@
+from __future__ import annotations
+
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from PyQt5 import QtCore
+from PyQt5.QtCore import QPointF, QTimer, pyqtSignal
+from PyQt5.QtGui import QColor, QPainter, QPen, QPolygonF
+from PyQt5.QtWidgets import QComboBox, QHBoxLayout, QLabel, QPushButton, QVBoxLayout, QWidget
+
+from ..decimate import lttb, minmax
+
+# Ventanas seleccionables (etiqueta, segundos)
+WINDOWS = [
+    ("15 min", 900),
+    ("1 h", 3600),
+    ("6 h", 6 * 3600),
+    ("24 h", 86400),
+    ("7 días", 7 * 86400),
+    ("30 días", 30 * 86400),
+]
+# Series: clave, etiqueta, color y eje ("temp" a la izquierda en °C, "pct" a la derecha en %)
+SERIES = [
+    ("temp_ambiente", "Ambiente", "#00e5ff", "temp"),
+    ("temp_pulpa1", "Pulpa 1", "#10b981", "temp"),
+    ("temp_pulpa2", "Pulpa 2", "#fbbf24", "temp"),
+    ("setpoint", "Setpoint", "#fb7185", "temp"),
+    ("valvula_posicion", "Válvula", "#60a5fa", "pct"),
+]
+# Reducción antes de dibujar: min/max conserva los picos; LTTB, la forma de curvas suaves (sin huecos)
+DECIMATION = [("Picos", "minmax"), ("Forma (LTTB)", "lttb")]
+_MARGINS = (46, 10, 40, 24)  # izquierda, arriba, derecha, abajo (px)
+
+
+class TrendPlot(QWidget):
+    """Gráfico de tendencia de un túnel dibujado con QPainter (sin dependencias extra).
+
+    Los datos salen del histórico en memoria (RingHistory, sin copia) si
+    cubre el rango, o del histórico en disco (TieredHistorian) en su hilo
+    lector, en el nivel de resumen que toque. Al desplazar solo se piden los
+    tramos que faltan por los bordes; al cambiar de nivel se pide todo y se
+    sigue mostrando lo anterior hasta que llega. Cada serie se reduce a unos
+    2 puntos por píxel (min/max o LTTB, según ``decimation``) antes de
+    dibujar. Oculto no consulta nada: lo pendiente se carga al mostrarse.
+    """
+
+    _loaded = pyqtSignal(object)
+
+    def __init__(self, parent: Optional[QWidget] = None):
+        super().__init__(parent)
+        self.ring = None
+        self.historian = None
+        self.tunnel_id: Optional[int] = None
+        self.span = float(WINDOWS[0][1])
+        # Fin de la ventana; None = siguiendo el tiempo real
+        self.end: Optional[float] = None
+        self._data: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+        self._range = (0.0, 0.0)
+        self._source: Optional[Tuple[str, int]] = None
+        self._gen = 0
+        # Hubo cambios mientras estaba oculto: cargar al mostrarse
+        self._dirty = False
+        self.decimation = "minmax"
+        self._drag: Optional[Tuple[float, float]] = None
+        self.setMinimumHeight(220)
+        self._loaded.connect(self._on_loaded)
+        # Recarga diferida tras desplazar o ampliar (un gesto = una consulta)
+        self._reload = QTimer(self)
+        self._reload.setSingleShot(True)
+        self._reload.setInterval(150)
+        self._reload.timeout.connect(self.load)
+        # Avance en tiempo real, solo mientras el gráfico es visible
+        self._live = QTimer(self)
+        self._live.setInterval(1000)
+        self._live.timeout.connect(self._on_live)
+
+    # --- Estado ----------------------------------------------------------------
+
+    def set_sources(self, ring, historian) -> None:
+        self.ring = ring
+        self.historian = historian
+        self._reset()
+
+    def set_tunnel(self, tunnel_id: Optional[int]) -> None:
+        if tunnel_id != self.tunnel_id:
+            self.tunnel_id = tunnel_id
+            self._reset()
+
+    def set_span(self, seconds: float) -> None:
+        self.span = float(seconds)
+        self.load()
+
+    def pan(self, fraction: float) -> None:
+        """Desplazar la ventana una fracción de su ancho (negativo = hacia el pasado)."""
+        end = (time.time() if self.end is None else self.end) + fraction * self.span
+        self.end = None if end >= time.time() else end
+        self.update()
+        self._reload.start()
+
+    def go_live(self) -> None:
+        self.end = None
+        self.load()
+
+    def set_decimation(self, mode: str) -> None:
+        self.decimation = mode
+        self.update()
+
+    def view_range(self) -> Tuple[float, float]:
+        until = time.time() if self.end is None else self.end
+        return until - self.span, until
+
+    def _reset(self) -> None:
+        self._gen += 1
+        self._data = {}
+        self._range = (0.0, 0.0)
+        self._source = None
+        self.load()
+
+    # --- Carga de datos --------------------------------------------------------
+
+    def _ring_covers(self, since: float) -> bool:
+        oldest = self.ring.oldest() if self.ring is not None else None
+        return oldest is not None and since >= oldest
+
+    def load(self) -> None:
+        if not self.isVisible():
+            self._dirty = True
+            return
+        self._dirty = False
+        if self.tunnel_id is None:
+            self.update()
+            return
+        since, until = self.view_range()
+        width = max(100, self.width() - _MARGINS[0] - _MARGINS[2])
+        level = self.historian.select_tier(since, until, width) if self.historian is not None else 0
+        if self.ring is not None and (self.historian is None or (level == 0 and self._ring_covers(since))):
+            # Histórico en memoria: vistas sin copia, en el acto
+            for key, _, _, _ in SERIES:
+                try:
+                    self._data[key] = self.ring.window(self.tunnel_id, key, since, until)
+                except KeyError:
+                    self._data.pop(key, None)
+            self._source = ("ring", 0)
+            self._range = (since, until)
+            self.update()
+            return
+        if self.historian is None:
+            return
+        r0, r1 = self._range
+        if self._source == ("disk", level) and since < r1 and until > r0:
+            # Mismo nivel: solo los bordes que faltan
+            pieces = []
+            if since < r0:
+                pieces.append((since, r0, "left"))
+                r0 = since
+            # Por la derecha, solo cuando ya puede haber un intervalo nuevo en ese nivel
+            if until >= r1 + self.historian.period_of(level):
+                pieces.append((r1, until, "right"))
+                r1 = until
+            self._range = (r0, r1)
+        else:
+            self._gen += 1
+            pieces = [(since, until, "replace")]
+            self._source = ("disk", level)
+            self._range = (since, until)
+        gen = self._gen
+        for a, b, mode in pieces:
+            for key, _, _, _ in SERIES:
+                fut = self.historian.submit_query(self.tunnel_id, key, a, b, width, "avg", level)
+                fut.add_done_callback(lambda f, key=key, mode=mode: self._loaded.emit((gen, key, mode, f)))
+        self.update()
+
+    def _on_loaded(self, payload) -> None:
+        gen, key, mode, fut = payload
+        if gen != self._gen:
+            return
+        try:
+            ts, values = fut.result()
+        except Exception:
+            return
+        old = self._data.get(key)
+        if mode == "replace" or old is None or not len(old[0]):
+            self._data[key] = (ts, values)
+        elif mode == "left":
+            keep = ts < old[0][0]
+            self._data[key] = (np.concatenate((ts[keep], old[0])), np.concatenate((values[keep], old[1])))
+        else:
+            keep = ts > old[0][-1]
+            self._data[key] = (np.concatenate((old[0], ts[keep])), np.concatenate((old[1], values[keep])))
+        self._trim(key)
+        self.update()
+
+    def _trim(self, key: str) -> None:
+        """No acumular más de una ventana a cada lado de la visible."""
+        since, until = self.view_range()
+        ts, values = self._data[key]
+        if len(ts) and (ts[0] < since - self.span or ts[-1] > until + self.span):
+            lo = int(np.searchsorted(ts, since - self.span))
+            hi = int(np.searchsorted(ts, until + self.span, side="right"))
+            self._data[key] = (ts[lo:hi], values[lo:hi])
+            self._range = (max(self._range[0], since - self.span), min(self._range[1], until + self.span))
+
+    def _on_live(self) -> None:
+        if self.end is None and self._drag is None:
+            self.load()
+
+    def showEvent(self, event):
+        super().showEvent(event)
+        self._live.start()
+        # En tiempo real también hay que ponerse al día
+        if self._dirty or self.end is None:
+            self.load()
+
+    def hideEvent(self, event):
+        self._live.stop()
+        super().hideEvent(event)
+
+    def resizeEvent(self, event):
+        self._reload.start()
+        super().resizeEvent(event)
+
+    # --- Interacción (arrastrar = desplazar, rueda = ampliar) ------------------
+
+    def mousePressEvent(self, event):
+        self._drag = (event.x(), time.time() if self.end is None else self.end)
+        event.accept()
+
+    def mouseMoveEvent(self, event):
+        if self._drag is None:
+            return
+        x0, end0 = self._drag
+        width = max(1, self.width() - _MARGINS[0] - _MARGINS[2])
+        end = end0 - (event.x() - x0) / width * self.span
+        self.end = None if end >= time.time() else end
+        self.update()
+        event.accept()
+
+    def mouseReleaseEvent(self, event):
+        self._drag = None
+        self.load()
+        event.accept()
+
+    def wheelEvent(self, event):
+        factor = 0.8 if event.angleDelta().y() > 0 else 1.25
+        self.span = min(float(WINDOWS[-1][1]), max(float(WINDOWS[0][1]), self.span * factor))
+        self.update()
+        self._reload.start()
+        event.accept()
+
+    # --- Dibujo ----------------------------------------------------------------
+
+    def _visible(self, since: float, until: float, buckets: int) -> Dict[str, Tuple[np.ndarray, np.ndarray]]:
+        out = {}
+        for key, _, _, _ in SERIES:
+            data = self._data.get(key)
+            if data is None or not len(data[0]):
+                continue
+            ts, values = data
+            lo = max(0, int(np.searchsorted(ts, since)) - 1)
+            hi = int(np.searchsorted(ts, until, side="right")) + 1
+            if self.decimation == "lttb":
+                out[key] = lttb(ts[lo:hi], values[lo:hi], 2 * buckets)
+            else:
+                out[key] = minmax(ts[lo:hi], values[lo:hi], buckets)
+        return out
+
+    def paintEvent(self, event):
+        p = QPainter(self)
+        try:
+            self._paint(p)
+        finally:
+            p.end()
+
+    def _paint(self, p: QPainter) -> None:
+        ml, mt, mr, mb = _MARGINS
+        w = max(1, self.width() - ml - mr)
+        h = max(1, self.height() - mt - mb)
+        p.fillRect(self.rect(), QColor("#0f1316"))
+        since, until = self.view_range()
+        visible = self._visible(since, until, w)
+        # Escala de temperaturas ajustada a lo visible
+        finite = [visible[key][1] for key, _, _, axis in SERIES if axis == "temp" and key in visible]
+        finite = [v[np.isfinite(v)] for v in finite]
+        finite = [v for v in finite if len(v)]
+        if finite:
+            lo = float(min(v.min() for v in finite))
+            hi = float(max(v.max() for v in finite))
+        else:
+            lo, hi = 0.0, 10.0
+        pad = max(0.5, (hi - lo) * 0.08)
+        lo, hi = lo - pad, hi + pad
+        grid = QPen(QColor("#1e2a33"))
+        text = QColor("#e0e6ed")
+        # Rejilla y escalas: °C a la izquierda, % a la derecha
+        for i in range(5):
+            y = mt + h * i / 4.0
+            p.setPen(grid)
+            p.drawLine(QPointF(ml, y), QPointF(ml + w, y))
+            p.setPen(text)
+            p.drawText(QtCore.QRectF(0, y - 8, ml - 4, 16), QtCore.Qt.AlignRight | QtCore.Qt.AlignVCenter, f"{hi - (hi - lo) * i / 4.0:.1f}")
+            p.drawText(QtCore.QRectF(ml + w + 4, y - 8, mr - 4, 16), QtCore.Qt.AlignLeft | QtCore.Qt.AlignVCenter, f"{100 - 25 * i}%")
+        fmt = "%H:%M" if self.span <= 86400 else "%d/%m %H:%M"
+        for i in range(5):
+            x = ml + w * i / 4.0
+            p.setPen(grid)
+            p.drawLine(QPointF(x, mt), QPointF(x, mt + h))
+            p.setPen(text)
+            label = time.strftime(fmt, time.localtime(since + self.span * i / 4.0))
+            p.drawText(QtCore.QRectF(x - 50, mt + h + 4, 100, mb - 4), QtCore.Qt.AlignHCenter | QtCore.Qt.AlignTop, label)
+        if not visible:
+            p.setPen(text)
+            p.drawText(QtCore.QRectF(ml, mt, w, h), QtCore.Qt.AlignCenter, "Sin datos en este intervalo")
+            return
+        p.setClipRect(QtCore.QRectF(ml, mt, w, h))
+        for key, _, color, axis in SERIES:
+            if key not in visible:
+                continue
+            ts, values = visible[key]
+            xs = ml + (ts - since) / self.span * w
+            if axis == "pct":
+                ys = mt + h * (1.0 - np.asarray(values, dtype=np.float64) / 100.0)
+            else:
+                ys = mt + h * (hi - np.asarray(values, dtype=np.float64)) / (hi - lo)
+            pen = QPen(QColor(color))
+            pen.setWidth(2 if axis == "temp" else 1)
+            p.setPen(pen)
+            for poly in _polylines(xs, ys):
+                p.drawPolyline(poly)
+
+
+def _polylines(xs: np.ndarray, ys: np.ndarray) -> List[QPolygonF]:
+    """Tramos continuos (los NaN cortan la línea)."""
+    ok = np.isfinite(ys)
+    out = []
+    if not ok.any():
+        return out
+    # Límites de cada tramo de valores válidos
+    edges = np.flatnonzero(np.diff(np.concatenate(([0], ok.astype(np.int8), [0]))))
+    for a, b in zip(edges[0::2], edges[1::2]):
+        out.append(QPolygonF([QPointF(x, y) for x, y in zip(xs[a:b].tolist(), ys[a:b].tolist())]))
+    return out
+
+
+class TrendPanel(QWidget):
+    """Panel de tendencia: ventana (15 min a 30 días), desplazamiento, leyenda y gráfico."""
+
+    def __init__(self, parent: Optional[QWidget] = None):
+        super().__init__(parent)
+        outer = QVBoxLayout(self)
+        outer.setContentsMargins(0, 0, 0, 0)
+        outer.setSpacing(6)
+        bar = QHBoxLayout()
+        self.cb_window = QComboBox()
+        for label, seconds in WINDOWS:
+            self.cb_window.addItem(label, seconds)
+        self.cb_window.setMinimumHeight(40)
+        self.btn_prev = QPushButton("◀")
+        self.btn_next = QPushButton("▶")
+        self.btn_live = QPushButton("Ahora")
+        for b in (self.btn_prev, self.btn_next, self.btn_live):
+            b.setMinimumHeight(40)
+        bar.addWidget(self.cb_window)
+        bar.addWidget(self.btn_prev)
+        bar.addWidget(self.btn_next)
+        bar.addWidget(self.btn_live)
+        self.cb_decimation = QComboBox()
+        for label, mode in DECIMATION:
+            self.cb_decimation.addItem(label, mode)
+        self.cb_decimation.setMinimumHeight(40)
+        bar.addWidget(self.cb_decimation)
+        bar.addSpacing(12)
+        for _, label, color, _ in SERIES:
+            lbl = QLabel(label)
+            lbl.setProperty("class", "metricLabel")
+            lbl.setStyleSheet(f"color: {color};")
+            bar.addWidget(lbl)
+        bar.addStretch(1)
+        outer.addLayout(bar)
+        self.plot = TrendPlot()
+        outer.addWidget(self.plot, 1)
+        self.cb_window.currentIndexChanged.connect(lambda i: self.plot.set_span(self.cb_window.itemData(i)))
+        self.cb_decimation.currentIndexChanged.connect(lambda i: self.plot.set_decimation(self.cb_decimation.itemData(i)))
+        self.btn_prev.clicked.connect(lambda: self.plot.pan(-0.5))
+        self.btn_next.clicked.connect(lambda: self.plot.pan(0.5))
+        self.btn_live.clicked.connect(self.plot.go_live)
+
+    def set_sources(self, ring, historian) -> None:
+        self.plot.set_sources(ring, historian)
+
+    def set_tunnel(self, tunnel_id: Optional[int]) -> None:
+        self.plot.set_tunnel(tunnel_id)
@@ -5,7 +5,14 @@ from PyQt5 import QtCore
 from PyQt5.QtWidgets import QWidget, QVBoxLayout, QLabel, QHBoxLayout, QPushButton, QDoubleSpinBox, QGridLayout, QSizePolicy, QDialog, QFormLayout, QSpinBox, QComboBox, QInputDialog, QMessageBox, QLineEdit, QFrame, QToolButton, QScrollArea, QScroller, QScrollerProperties
 
 from ..models import TunnelConfig, TunnelData, TagAddress
-from typing import Optional
+from .trend_chart import TrendPanel
+from typing import Dict, Optional
+
+# Señales con control propio en esta vista; el resto del registro se muestra como métrica extra
+_BUILTIN_SIGNALS = frozenset({
+    "temp_ambiente", "temp_pulpa1", "temp_pulpa2", "setpoint", "setpoint_pulpa1", "setpoint_pulpa2",
+    "estado", "deshielo_activo", "valvula_posicion", "tiempo_enfriamiento",
+})
 
 
 class TunnelDetailView(QWidget):
@@ -36,6 +43,8 @@ class TunnelDetailView(QWidget):
         self._cal_p2_dirty = False
         self._step = 0.1
         self._defrost_active = False
+        # Métricas de señales declaradas en config (clave -> (etiqueta de valor, unidad, BOOL))
+        self._extra_metrics: Dict[str, tuple] = {}
         self._build_ui()
 
     def _build_ui(self):
@@ -114,6 +123,7 @@ class TunnelDetailView(QWidget):
         metrics.addWidget(sp_w, 1, 1)
         metrics.addWidget(valve_w, 2, 0)
         metrics.addWidget(time_w, 2, 1)
+        self._metrics = metrics
 
         layout.addLayout(metrics)
 
@@ -336,6 +346,11 @@ class TunnelDetailView(QWidget):
         self.sec_cal = CollapsibleSection("Calibración de Sensores (offset, °C)", self.calib_frame, collapsed=True, right_widget=self.btn_edit_tags, on_toggle=lambda ch: self._on_section_toggle('sec_cal_open', ch))
         layout.addWidget(self.sec_cal)
 
+        # Tendencia del túnel (histórico); solo consulta y dibuja mientras está abierta
+        self.trend = TrendPanel()
+        self.sec_trend = CollapsibleSection("Tendencia", self.trend, collapsed=True, on_toggle=lambda ch: self._on_section_toggle('sec_trend_open', ch))
+        layout.addWidget(self.sec_trend)
+
         self.btn_back = QPushButton("Volver")
         self.btn_back.setProperty("size", "xl")
         self.btn_back.setMinimumHeight(48)
@@ -394,6 +409,10 @@ class TunnelDetailView(QWidget):
             self.sec_cal.set_collapsed(not open_cal)
         except Exception:
             pass
+        try:
+            self.sec_trend.set_collapsed(not bool(ui.get('sec_trend_open', False)))
+        except Exception:
+            pass
         # Refrescar resúmenes
         self._update_section_summaries()
 
@@ -451,9 +470,52 @@ class TunnelDetailView(QWidget):
             self.sec_sp_adv.setVisible(True)
         except Exception:
             pass
+        try:
+            self.trend.set_tunnel(config.id)
+        except Exception:
+            pass
         # Actualizar resúmenes de secciones
         self._update_section_summaries()
 
+    def set_history(self, ring, historian) -> None:
+        """Fuentes del gráfico de tendencia: histórico en memoria y en disco (cualquiera puede ser None)."""
+        self.trend.set_sources(ring, historian)
+
+    def set_signals(self, registry) -> None:
+        """Añadir una métrica por cada señal del registro sin control propio (ui=True)."""
+        for val, _unit, _is_bool in self._extra_metrics.values():
+            try:
+                w = val.parentWidget()
+                self._metrics.removeWidget(w)
+                w.deleteLater()
+            except Exception:
+                pass
+        self._extra_metrics = {}
+        pos = 6  # tras las 6 métricas fijas (3 filas x 2)
+        for sig in registry:
+            if not sig.ui or sig.key in _BUILTIN_SIGNALS:
+                continue
+            w = QWidget(); vb = QVBoxLayout(w); vb.setContentsMargins(0,0,0,0); vb.setSpacing(2)
+            lbl = QLabel(registry.label(sig.key)); lbl.setProperty("class", "metricLabel")
+            val = QLabel(f"-- {sig.unit}".strip()); val.setProperty("class", "bigValue"); val.setAlignment(QtCore.Qt.AlignLeft | QtCore.Qt.AlignVCenter)
+            vb.addWidget(lbl); vb.addWidget(val)
+            self._metrics.addWidget(w, pos // 2, pos % 2)
+            pos += 1
+            self._extra_metrics[sig.key] = (val, sig.unit, sig.type.upper() == "BOOL")
+
+    def _update_extra_metrics(self, data: TunnelData) -> None:
+        for key, (val, unit, is_bool) in self._extra_metrics.items():
+            try:
+                value = getattr(data, key, None)
+                if value is None:
+                    val.setText(f"-- {unit}".strip())
+                elif is_bool:
+                    val.setText("Sí" if value else "No")
+                else:
+                    val.setText(f"{float(value):.1f} {unit}".strip())
+            except Exception:
+                pass
+
     def update_data(self, data: TunnelData):
         self._in_update = True
         try:
@@ -522,6 +584,8 @@ class TunnelDetailView(QWidget):
             self.val_valve.setText(f"{float(getattr(data, 'valvula_posicion', 0.0)):.0f} %")
         except Exception:
             pass
+        # Señales declaradas en config
+        self._update_extra_metrics(data)
         # Re-polish para aplicar QSS reactivo
         for w in (self.state_chip, self.status_dot, self.header_frame):
             try:
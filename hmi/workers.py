@@ -1,77 +1,287 @@
 from __future__ import annotations
 
+from concurrent.futures import Future
 from typing import Dict, List, Optional
 
-from PyQt5.QtCore import QObject, QTimer, pyqtSignal, pyqtSlot
-from time import time
+from PyQt5.QtCore import QObject, Qt, QTimer, pyqtSignal, pyqtSlot
+from time import monotonic, time
 
-from .models import TunnelConfig, TunnelData
+from .changes import ChangeDetector
+from .commands import (
+    COALESCE_WINDOW_S,
+    PRIORITY_LOW,
+    PRIORITY_NORMAL,
+    PRIORITY_SAFETY,
+    CommandQueue,
+    WriteCommand,
+)
+from .models import SCAN_FAST, SCAN_ON_DEMAND, SCAN_SLOW, CommandResult, TunnelConfig, TunnelData
 from .plc_client import BasePLC
+from .pulses import PULSE_S, PulseScheduler
+from .scheduler import CycleClock, PollPacer
 
 
 class Poller(QObject):
-    updated = pyqtSignal(dict)  # Dict[int, TunnelData]
+    updated = pyqtSignal(object)  # SnapshotDelta: solo túneles y campos que cambiaron
     plc_status_changed = pyqtSignal(bool)
     plc_error = pyqtSignal(str)
+    connection_event = pyqtSignal(object)  # ConnectionEvent
+    command_done = pyqtSignal(object)  # CommandResult
+    _commands_ready = pyqtSignal()
     stop_requested = pyqtSignal()
 
-    def __init__(self, plc: BasePLC, tunnels: List[TunnelConfig], interval_ms: int = 1000):
+    def __init__(
+        self,
+        plc: BasePLC,
+        tunnels: List[TunnelConfig],
+        interval_ms: int = 1000,
+        slow_interval_ms: int = 10000,
+        pacer: Optional[PollPacer] = None,
+        changes: Optional[ChangeDetector] = None,
+        history=None,
+        historian=None,
+    ):
         super().__init__()
         self.plc = plc
         self.tunnels = tunnels
         self.tunnels_map: Dict[int, TunnelConfig] = {t.id: t for t in tunnels}
         self.interval_ms = int(max(200, interval_ms))
+        # Intervalo adaptativo (sin pacer: fijo, solo contando desbordes)
+        self.pacer = pacer or PollPacer(self.interval_ms, adaptive=False)
+        self.interval_ms = self.pacer.interval_ms
+        # Detección de cambios: la UI recibe solo lo que salió de la banda muerta
+        self.changes = changes or ChangeDetector()
+        # Histórico reciente en memoria (RingHistory), alimentado en cada ciclo con datos
+        self.history = history
+        # Histórico en disco (DiskHistorian); escribe este mismo hilo
+        self.historian = historian
+        # Plazos absolutos de adquisición (sin deriva, saltando ciclos perdidos)
+        self.clock = CycleClock(self.interval_ms / 1000.0)
+        # Último aviso de desborde (para no inundar la barra de estado)
+        self._overrun_reported = 0.0
+        # Grupo lento: nunca más frecuente que el rápido
+        self.slow_interval_ms = int(max(self.interval_ms, slow_interval_ms))
+        # Próxima lectura del grupo lento (0 = en el siguiente ciclo)
+        self._next_slow = 0.0
         self._timer: Optional[QTimer] = None
+        # fsync periódico del histórico en disco, aunque no lleguen muestras
+        self._sync_timer: Optional[QTimer] = None
         self._running = False
         self._last_status: Optional[bool] = None
         # Seguimiento de tiempo de enfriamiento (inicio del ciclo ON por túnel)
         self._on_since: Dict[int, Optional[float]] = {}
+        # Órdenes de escritura: cola por prioridad; las de seguridad interrumpen la lectura
+        self.commands = CommandQueue(self.plc.last_error, self._write_batch)
+        # Rearme para las órdenes retenidas por la ventana de agrupación
+        self._commands_timer: Optional[QTimer] = None
+        # Reposiciones de pulsos por plazos; también se atienden entre peticiones de lectura
+        self.pulses = PulseScheduler()
+        self._pulse_timer: Optional[QTimer] = None
+        self.plc.preempt_hook = self._preempt
+        self._commands_ready.connect(self._drain_commands)
 
     @pyqtSlot()
     def start(self):
         if self._timer is None:
+            # Temporizador de un disparo, rearmado tras cada ciclo hasta el siguiente plazo
             self._timer = QTimer()
-            self._timer.setInterval(self.interval_ms)
+            self._timer.setSingleShot(True)
+            self._timer.setTimerType(Qt.PreciseTimer)
             self._timer.timeout.connect(self._on_tick)
+        if self._sync_timer is None and getattr(self.historian, "sync_due", None) is not None:
+            self._sync_timer = QTimer()
+            self._sync_timer.timeout.connect(self._sync_historian)
+        if self._sync_timer is not None:
+            # Se comprueba cada segundo (o cada fsync_s si es menor); solo hace fsync si toca
+            period = min(1.0, float(getattr(self.historian, "fsync_s", 1.0)))
+            self._sync_timer.start(max(100, int(period * 1000.0)))
         self._running = True
-        self._timer.start()
+        self.clock.start(monotonic())
+        self._timer.start(0)
+
+    def _arm(self, delay_s: float):
+        if self._timer is not None and self._running:
+            self._timer.start(max(0, int(round(delay_s * 1000.0))))
 
     @pyqtSlot()
     def stop(self):
         self._running = False
         if self._timer is not None:
             self._timer.stop()
+        if self._commands_timer is not None:
+            self._commands_timer.stop()
+        if self._pulse_timer is not None:
+            self._pulse_timer.stop()
+        if self._sync_timer is not None:
+            self._sync_timer.stop()
+        # No dejar mandos en alto al salir: reponer ya lo pendiente
+        try:
+            self.pulses.run_due(self.plc.write_many, everything=True)
+        except Exception:
+            pass
+        if self.historian is not None:
+            try:
+                self.historian.close()
+            except Exception:
+                pass
         try:
             self.plc.disconnect()
         except Exception:
             pass
 
+    def _store(self, data, cycle_ts: float):
+        """Anexar el ciclo al histórico en disco; un fallo de disco se avisa una vez, sin parar la lectura."""
+        if self.historian is None:
+            return
+        errors = self.historian.errors
+        try:
+            self.historian.append(data, cycle_ts)
+        except Exception as e:
+            self.historian.errors += 1
+            self.historian.last_error = str(e)
+        if self.historian.errors and not errors:
+            self.plc_error.emit(f"Histórico en disco: {self.historian.last_error}")
+
+    @pyqtSlot()
+    def _sync_historian(self):
+        if self.historian is None:
+            return
+        errors = self.historian.errors
+        try:
+            self.historian.sync_due()
+        except Exception as e:
+            self.historian.errors += 1
+            self.historian.last_error = str(e)
+        if self.historian.errors and not errors:
+            self.plc_error.emit(f"Histórico en disco: {self.historian.last_error}")
+
     def _emit_status(self, status: bool):
         if status != self._last_status:
             self._last_status = status
             self.plc_status_changed.emit(status)
 
+    def _scan_classes(self) -> set:
+        """Clases a leer en este ciclo: rápidas y bajo demanda siempre, lentas al vencer su plazo."""
+        classes = {SCAN_FAST, SCAN_ON_DEMAND}
+        now = monotonic()
+        if now >= self._next_slow:
+            classes.add(SCAN_SLOW)
+            self._next_slow = now + self.slow_interval_ms / 1000.0
+        return classes
+
+    def _request_full_read(self):
+        # Tras una escritura, releer también el grupo lento en el siguiente ciclo
+        self._next_slow = 0.0
+        self.pacer.kick()
+        self._apply_interval()
+        # Adelantar la próxima lectura para confirmar la escritura cuanto antes
+        self._arm(self.clock.advance_to(monotonic()))
+
+    def _apply_interval(self):
+        if self.pacer.interval_ms != self.interval_ms:
+            self.interval_ms = self.pacer.interval_ms
+            self.clock.set_period(self.interval_ms / 1000.0)
+
+    def _pace(self, started: float, data: Dict[int, TunnelData]):
+        """Ajustar el intervalo según la duración del ciclo y el ritmo de cambio; avisar desbordes."""
+        now = monotonic()
+        cycle_ms = (now - started) * 1000.0
+        rate, event = self.pacer.change_rate(data, now) if data else (0.0, False)
+        interval = self.interval_ms
+        if self.pacer.update(cycle_ms, rate, event) and now - self._overrun_reported >= 30.0:
+            self._overrun_reported = now
+            self.plc_error.emit(
+                f"Ciclo de lectura lento: {cycle_ms:.0f} ms (intervalo {interval} ms, "
+                f"{self.pacer.overruns} desbordes, {self.clock.skipped} ciclos saltados)"
+            )
+        self._apply_interval()
+
+    def poll_stats(self) -> dict:
+        stats = self.pacer.stats()
+        stats.update(self.clock.stats())
+        stats.update(self.changes.stats())
+        if self.history is not None:
+            stats.update(self.history.stats())
+        if self.historian is not None:
+            stats.update(self.historian.stats())
+        stats["pulses_pending"] = len(self.pulses)
+        stats["pulses_sent"] = self.pulses.sent
+        stats["pulse_failures"] = self.pulses.failures
+        stats["pulses_dropped"] = self.pulses.dropped
+        return stats
+
+    def pending_pulses(self) -> list:
+        """Pulsos y órdenes temporizadas aún sin reponer (diagnóstico)."""
+        return self.pulses.pending()
+
+    def _preempt(self):
+        """Entre peticiones de lectura: órdenes de seguridad y reposiciones vencidas."""
+        self.commands.run_pending(PRIORITY_SAFETY)
+        self._run_pulses()
+
+    def _pulse(self, tunnel_id: int, tag_key: str, delay_s: float = PULSE_S, value=False) -> None:
+        """Programar la vuelta a reposo de un tag tras ``delay_s`` segundos."""
+        self.pulses.schedule(tunnel_id, tag_key, delay_s, value)
+        self._arm_pulses()
+
+    def _arm_pulses(self):
+        due = self.pulses.next_due()
+        if due is None:
+            return
+        if self._pulse_timer is None:
+            self._pulse_timer = QTimer()
+            self._pulse_timer.setSingleShot(True)
+            self._pulse_timer.setTimerType(Qt.PreciseTimer)
+            self._pulse_timer.timeout.connect(self._run_pulses)
+        self._pulse_timer.start(max(0, int((due - monotonic()) * 1000.0) + 1))
+
+    def _run_pulses(self):
+        failed = self.pulses.run_due(self.plc.write_many)
+        for reset in failed:
+            # Avisar del primer fallo y, si el PLC la rechaza hasta descartarla, del abandono
+            if reset.dropped:
+                self.plc_error.emit(
+                    f"Reposición de {reset.tag_key} (túnel {reset.tunnel_id}) descartada tras "
+                    f"{reset.attempts} intentos: {reset.last_error}"
+                )
+            elif reset.attempts == 1:
+                self.plc_error.emit(f"Reposición pendiente de {reset.tag_key} (túnel {reset.tunnel_id}): {reset.last_error}")
+        self._arm_pulses()
+
     def _on_tick(self):
+        started = monotonic()
+        self.clock.begin(started)
+        # Marca temporal única del ciclo para toda la instantánea
+        cycle_ts = time()
         try:
-            data = self.plc.read_all()
+            data = self.plc.read_all(self._scan_classes())
             status = self.plc.is_connected()
             self._emit_status(status)
+            for ev in self.plc.drain_events():
+                self.connection_event.emit(ev)
+                # Tras un corte, refrescar la UI entera
+                self.changes.force_keyframe()
             if data:
+                data.ts = cycle_ts
                 # Calcular tiempo de enfriamiento por túnel
-                now = time()
                 for tid, td in data.items():
                     if td.estado:
                         start = self._on_since.get(tid)
                         if not start:
                             # iniciar ciclo ON ahora
-                            self._on_since[tid] = now
-                            start = now
-                        td.tiempo_enfriamiento = max(0.0, float(now - start))
+                            self._on_since[tid] = cycle_ts
+                            start = cycle_ts
+                        td.tiempo_enfriamiento = max(0.0, float(cycle_ts - start))
                     else:
                         # reset si está apagado
                         self._on_since[tid] = None
                         td.tiempo_enfriamiento = 0.0
-                self.updated.emit(data)
+                if self.history is not None:
+                    self.history.append(data, cycle_ts)
+                self._store(data, cycle_ts)
+                # Solo lo que cambió; sin cambios se emite vacío para el sello de última actualización
+                self.updated.emit(self.changes.diff(data, monotonic(), cycle_ts))
+            self._pace(started, data)
             if not status:
                 # Enviar último error si disponible
                 err = self.plc.last_error()
@@ -79,121 +289,193 @@ class Poller(QObject):
                     self.plc_error.emit(str(err))
         except Exception:
             self._emit_status(False)
+        finally:
+            # Reposiciones que vencieron durante un ciclo largo
+            try:
+                self._run_pulses()
+            except Exception:
+                pass
+            self._arm(self.clock.next_delay(monotonic()))
+
+    # --- Órdenes de escritura -------------------------------------------------
+    # Los slots públicos solo encolan (se conectan con Qt.DirectConnection y se
+    # ejecutan en el hilo de la UI); la escritura real la hace el hilo de sondeo
+    # en _drain_commands o, si es de seguridad, entre peticiones de lectura.
+
+    def submit(
+        self,
+        name: str,
+        tunnel_id: int,
+        run,
+        priority: int = PRIORITY_NORMAL,
+        callback=None,
+        write=None,
+        coalesce_key=None,
+        delay_s: float = 0.0,
+    ) -> Future:
+        """Encolar una orden; el Future devuelve su CommandResult."""
+        cmd = WriteCommand(
+            name,
+            tunnel_id,
+            run,
+            priority,
+            callback or self._on_command_done,
+            write=write,
+            coalesce_key=coalesce_key,
+            delay_s=delay_s,
+        )
+        fut = self.commands.submit(cmd)
+        self._commands_ready.emit()
+        return fut
+
+    def _submit_value(self, name: str, tunnel_id: int, tag_key: str, value, write):
+        """Escritura simple de un valor: agrupable con otras y sustituible por una posterior al mismo tag."""
+        self.submit(
+            name,
+            tunnel_id,
+            lambda: self._do_write(write, tunnel_id, value),
+            write=(tunnel_id, tag_key, value),
+            coalesce_key=(tag_key, tunnel_id),
+            delay_s=COALESCE_WINDOW_S,
+        )
+
+    @pyqtSlot()
+    def _drain_commands(self):
+        self.commands.run_pending()
+        due = self.commands.next_due()
+        if due is None:
+            return
+        if self._commands_timer is None:
+            self._commands_timer = QTimer()
+            self._commands_timer.setSingleShot(True)
+            self._commands_timer.timeout.connect(self._drain_commands)
+        self._commands_timer.start(max(0, int((due - monotonic()) * 1000.0) + 1))
+
+    def _write_batch(self, items) -> list:
+        """Escribir en bloque las órdenes simples vencidas a la vez (un resultado por ítem)."""
+        results = self.plc.write_many(items)
+        if any(r is None for r in results):
+            self._request_full_read()
+        return results
+
+    def _on_command_done(self, result: CommandResult):
+        if not result.ok:
+            self._emit_status(False)
+        self.command_done.emit(result)
+
+    def _tags_of(self, tunnel_id: int) -> dict:
+        try:
+            return self.tunnels_map.get(tunnel_id).tags if tunnel_id in self.tunnels_map else {}
+        except Exception:
+            return {}
 
     @pyqtSlot(int, bool)
     def set_deshielo(self, tunnel_id: int, on: bool):
+        # Cancelar un deshielo es una orden de seguridad
+        self.submit(
+            "deshielo_on" if on else "deshielo_off",
+            tunnel_id,
+            lambda: self._do_set_deshielo(tunnel_id, on),
+            PRIORITY_NORMAL if on else PRIORITY_SAFETY,
+        )
+
+    def _do_set_deshielo(self, tunnel_id: int, on: bool) -> bool:
         """Activa o desactiva deshielo escribiendo un tag de ESTADO (no pulso).
         Orden de preferencia de tag a escribir (BOOL):
           deshielo_mando, deshielo_set, deshielo_onoff, deshielo_activo
         """
-        try:
-            tags = self.tunnels_map.get(tunnel_id).tags if tunnel_id in self.tunnels_map else {}
-        except Exception:
-            tags = {}
-        try:
-            write_key = None
-            for k in ("deshielo_mando", "deshielo_set", "deshielo_onoff", "deshielo_activo"):
-                if k in tags:
-                    write_key = k
-                    break
-            if write_key is None:
-                # No existe tag de estado configurado: intentamos última opción con deshielo_activo
-                write_key = "deshielo_activo"
-            ok = self.plc.write_by_key(tunnel_id, write_key, bool(on))
-            if not ok:
-                self._emit_status(False)
-                return
-        except Exception:
-            self._emit_status(False)
-            try:
-                err = self.plc.last_error()
-                if err:
-                    self.plc_error.emit(str(err))
-            except Exception:
-                pass
+        tags = self._tags_of(tunnel_id)
+        write_key = None
+        for k in ("deshielo_mando", "deshielo_set", "deshielo_onoff", "deshielo_activo"):
+            if k in tags:
+                write_key = k
+                break
+        if write_key is None:
+            # No existe tag de estado configurado: intentamos última opción con deshielo_activo
+            write_key = "deshielo_activo"
+        ok = self.plc.write_by_key(tunnel_id, write_key, bool(on))
+        if ok:
+            self._request_full_read()
+        return ok
 
     @pyqtSlot(int, float)
     def write_setpoint(self, tunnel_id: int, value: float):
-        try:
-            ok = self.plc.write_setpoint(tunnel_id, value)
-            if not ok:
-                self._emit_status(False)
-        except Exception:
-            self._emit_status(False)
+        self._submit_value("setpoint", tunnel_id, "setpoint", value, self.plc.write_setpoint)
+
+    def _do_write(self, write, tunnel_id: int, value) -> bool:
+        ok = write(tunnel_id, value)
+        if ok:
+            self._request_full_read()
+        return ok
 
     @pyqtSlot(int, bool)
     def write_estado(self, tunnel_id: int, value: bool):
-        try:
-            # Si existen tags de comando por pulso, usarlos
-            key = None
-            try:
-                tags = self.tunnels_map.get(tunnel_id).tags if tunnel_id in self.tunnels_map else {}
-            except Exception:
-                tags = {}
-            if value and tags and "cmd_encender" in tags:
-                key = "cmd_encender"
-            elif (not value) and tags and "cmd_apagar" in tags:
-                key = "cmd_apagar"
-
-            if key:
-                ok = self.plc.write_by_key(tunnel_id, key, True)
-                if not ok:
-                    self._emit_status(False)
-                    return
-                # Generar pulso: volver a 0 tras 200 ms
-                QTimer.singleShot(200, lambda tid=tunnel_id, k=key: self.plc.write_by_key(tid, k, False))
-            else:
-                # Fallback: escribir directamente el estado booleano
-                ok = self.plc.write_estado(tunnel_id, value)
-                if not ok:
-                    self._emit_status(False)
-        except Exception:
-            self._emit_status(False)
+        # Apagar es una orden de seguridad: se adelanta a la lectura en curso
+        self.submit(
+            "encender" if value else "apagar",
+            tunnel_id,
+            lambda: self._do_write_estado(tunnel_id, value),
+            PRIORITY_NORMAL if value else PRIORITY_SAFETY,
+        )
+
+    def _do_write_estado(self, tunnel_id: int, value: bool) -> bool:
+        # Si existen tags de comando por pulso, usarlos
+        key = None
+        tags = self._tags_of(tunnel_id)
+        if value and tags and "cmd_encender" in tags:
+            key = "cmd_encender"
+        elif (not value) and tags and "cmd_apagar" in tags:
+            key = "cmd_apagar"
+
+        if key:
+            ok = self.plc.write_by_key(tunnel_id, key, True)
+            if not ok:
+                return False
+            # Generar pulso: volver a 0 tras 200 ms
+            self._pulse(tunnel_id, key)
+        else:
+            # Fallback: escribir directamente el estado booleano
+            if not self.plc.write_estado(tunnel_id, value):
+                return False
+        self._request_full_read()
+        return True
 
     @pyqtSlot(int, float)
     def write_setpoint_p1(self, tunnel_id: int, value: float):
-        try:
-            ok = self.plc.write_setpoint_p1(tunnel_id, value)
-            if not ok:
-                self._emit_status(False)
-        except Exception:
-            self._emit_status(False)
+        self._submit_value("setpoint_pulpa1", tunnel_id, "setpoint_pulpa1", value, self.plc.write_setpoint_p1)
 
     @pyqtSlot(int, float)
     def write_setpoint_p2(self, tunnel_id: int, value: float):
-        try:
-            ok = self.plc.write_setpoint_p2(tunnel_id, value)
-            if not ok:
-                self._emit_status(False)
-        except Exception:
-            self._emit_status(False)
+        self._submit_value("setpoint_pulpa2", tunnel_id, "setpoint_pulpa2", value, self.plc.write_setpoint_p2)
 
     @pyqtSlot(int)
     def trigger_deshielo(self, tunnel_id: int):
+        self.submit("deshielo", tunnel_id, lambda: self._do_trigger_deshielo(tunnel_id))
+
+    def _do_trigger_deshielo(self, tunnel_id: int) -> bool:
         """Activa un ciclo de deshielo. Preferentemente pulsa el tag cmd_deshielo.
         Fallback: si no existe cmd_deshielo, intenta escribir deshielo_activo True por 30s.
         """
+        tags = self._tags_of(tunnel_id)
+        if tags and "cmd_deshielo" in tags:
+            if not self.plc.write_by_key(tunnel_id, "cmd_deshielo", True):
+                return False
+            # pulso corto por seguridad
+            self._pulse(tunnel_id, "cmd_deshielo")
+            return True
+        # Fallback simulado (no recomendable en PLC real): togglear estado
+        if not self.plc.write_by_key(tunnel_id, "deshielo_activo", True):
+            return False
+        self._pulse(tunnel_id, "deshielo_activo", 30.0)
+        return True
+
+    @pyqtSlot(int)
+    def set_detail_tunnel(self, tunnel_id: int):
+        """Túnel con el detalle abierto (0 = ninguno); sus señales bajo demanda pasan a leerse."""
         try:
-            tags = self.tunnels_map.get(tunnel_id).tags if tunnel_id in self.tunnels_map else {}
-        except Exception:
-            tags = {}
-        try:
-            if tags and "cmd_deshielo" in tags:
-                ok = self.plc.write_by_key(tunnel_id, "cmd_deshielo", True)
-                if not ok:
-                    self._emit_status(False)
-                    return
-                # pulso corto por seguridad
-                QTimer.singleShot(200, lambda tid=tunnel_id: self.plc.write_by_key(tid, "cmd_deshielo", False))
-                return
-            # Fallback simulado (no recomendable en PLC real): togglear estado
-            ok = self.plc.write_by_key(tunnel_id, "deshielo_activo", True)
-            if not ok:
-                self._emit_status(False)
-                return
-            QTimer.singleShot(30000, lambda tid=tunnel_id: self.plc.write_by_key(tid, "deshielo_activo", False))
+            self.plc.set_on_demand_tunnels([tunnel_id] if tunnel_id else [])
         except Exception:
-            self._emit_status(False)
+            pass
 
     @pyqtSlot(int, dict)
     def update_tunnel_tags(self, tunnel_id: int, tags: dict):
@@ -203,6 +485,8 @@ class Poller(QObject):
                 self.plc.tunnels_map[tunnel_id].tags = tags
             if tunnel_id in self.tunnels_map:
                 self.tunnels_map[tunnel_id].tags = tags
+            # Los tags cambiaron: recompilar el plan de lectura en el próximo ciclo
+            self.plc.invalidate_read_plan()
         except Exception:
             # Si falla, no derribar; el siguiente ciclo reportará estado
             self._emit_status(False)
@@ -216,16 +500,20 @@ class Poller(QObject):
             if tunnel_id in self.plc.tunnels_map:
                 # Mantener en el objeto también
                 self.plc.tunnels_map[tunnel_id].calibrations = cal
-            # Intentar escribir a PLC si existen tags de calibración
+            # Intentar escribir a PLC si existen tags de calibración (prioridad baja)
             for key_src, key_tag in (
                 ("temp_ambiente", "cal_temp_ambiente"),
                 ("temp_pulpa1", "cal_temp_pulpa1"),
                 ("temp_pulpa2", "cal_temp_pulpa2"),
             ):
-                try:
-                    if key_src in cal:
-                        self.plc.write_by_key(tunnel_id, key_tag, float(cal[key_src]))
-                except Exception:
-                    pass
+                if key_src in cal:
+                    # Sin tag de calibración en el PLC la escritura falla: se ignora como antes
+                    self.submit(
+                        key_tag,
+                        tunnel_id,
+                        lambda k=key_tag, v=float(cal[key_src]): self.plc.write_by_key(tunnel_id, k, v),
+                        PRIORITY_LOW,
+                        callback=lambda _result: None,
+                    )
         except Exception:
             self._emit_status(False)
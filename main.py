@@ -6,22 +6,54 @@ from PyQt5.QtCore import QThread, QMetaObject, Qt, QTimer
 from hmi.config import ConfigManager
 from hmi.simulator import SimulatedPLC
 from hmi.plc_client import Snap7PLC, BasePLC
+from hmi.multi_plc import MultiPLC
+from hmi.changes import ChangeDetector
+from hmi.history import RingHistory
+from hmi.rollups import TieredHistorian
+from hmi.signals import SignalRegistry
+from hmi.scheduler import PollPacer
 from hmi.workers import Poller
 from hmi.ui.main_window import MainWindow
 
 
-def build_plc(plc_cfg, tunnels):
+def build_plc(plc_cfg, tunnels, signals=None):
     # Selecciona implementación según configuración.
     if getattr(plc_cfg, "simulation", True):
-        return SimulatedPLC(plc_cfg, tunnels)
+        return SimulatedPLC(plc_cfg, tunnels, signals)
     # Intentar Snap7, si falla usar Simulación
     try:
-        return Snap7PLC(plc_cfg, tunnels)
+        return Snap7PLC(plc_cfg, tunnels, signals)
     except Exception as e:
         print(f"[WARN] No se pudo inicializar Snap7 ({e}). Usando Simulación.")
         sim_cfg = plc_cfg
         setattr(sim_cfg, "simulation", True)
-        return SimulatedPLC(sim_cfg, tunnels)
+        return SimulatedPLC(sim_cfg, tunnels, signals)
+
+
+def build_topology(app_cfg, signals=None):
+    # Un único PLC o varios leídos en paralelo según AppConfig.plcs
+    signals = signals or SignalRegistry.from_config(app_cfg)
+    plcs = app_cfg.all_plcs()
+    if len(plcs) == 1:
+        return build_plc(app_cfg.plc, app_cfg.tunnels, signals)
+    primary = app_cfg.plc.id
+    controllers = {}
+    for plc_cfg in plcs:
+        own = [t for t in app_cfg.tunnels if (t.plc_id or primary) == plc_cfg.id]
+        controllers[plc_cfg.id] = build_plc(plc_cfg, own, signals)
+    return MultiPLC(app_cfg.plc, app_cfg.tunnels, controllers, signals)
+
+
+def build_historian(plc_cfg, tunnels, signals, root):
+    # Histórico en disco según PLCConfig.historian ("" = sin histórico):
+    # bruto ("file" o "sqlite") más los niveles de resumen de PLCConfig.rollups
+    if getattr(plc_cfg, "historian", "file") not in ("file", "sqlite"):
+        return None
+    try:
+        return TieredHistorian.from_config(plc_cfg, tunnels, signals, root)
+    except Exception as e:
+        print(f"[WARN] No se pudo iniciar el histórico ({e}). Sin histórico en disco.")
+    return None
 
 
 def main():
@@ -40,33 +72,53 @@ def main():
     tunnels = app_cfg.tunnels
     plc_cfg = app_cfg.plc
 
+    # Registro de señales (estándar + declaradas en config)
+    signals = SignalRegistry.from_config(app_cfg)
+
     # PLC y worker de sondeo en hilo dedicado
-    plc: BasePLC = build_plc(plc_cfg, tunnels)
+    plc: BasePLC = build_topology(app_cfg, signals)
+    # Histórico en memoria; sobrevive a los reinicios del Poller al cambiar ajustes
+    history = RingHistory.from_config(plc_cfg, tunnels, signals)
+    historian = build_historian(plc_cfg, tunnels, signals, cfg_manager.root)
 
     poller_thread = QThread()
-    poller = Poller(plc=plc, tunnels=tunnels, interval_ms=plc_cfg.poll_interval_ms)
+    poller = Poller(
+        plc=plc,
+        tunnels=tunnels,
+        interval_ms=plc_cfg.poll_interval_ms,
+        slow_interval_ms=plc_cfg.slow_interval_ms,
+        pacer=PollPacer.from_config(plc_cfg),
+        changes=ChangeDetector.from_config(plc_cfg, signals),
+        history=history,
+        historian=historian,
+    )
     poller.moveToThread(poller_thread)
 
     # UI principal
     window = MainWindow(tunnels=tunnels, initial_plc_connected=False)
+    window.view_detail.set_signals(signals)
+    window.view_detail.set_history(history, historian)
 
     # Conexiones señales/slots
     poller.updated.connect(window.on_data_update)
     poller.plc_status_changed.connect(window.on_plc_status)
     poller.plc_error.connect(window.on_plc_error)
-
-    window.request_setpoint.connect(poller.write_setpoint)
-    window.request_setpoint_p1.connect(poller.write_setpoint_p1)
-    window.request_setpoint_p2.connect(poller.write_setpoint_p2)
-    window.request_estado.connect(poller.write_estado)
-    window.request_deshielo.connect(poller.trigger_deshielo)
-    window.request_deshielo_set.connect(poller.set_deshielo)
+    poller.connection_event.connect(window.on_connection_event)
+    poller.command_done.connect(window.on_command_done)
+
+    window.request_setpoint.connect(poller.write_setpoint, Qt.DirectConnection)
+    window.request_setpoint_p1.connect(poller.write_setpoint_p1, Qt.DirectConnection)
+    window.request_setpoint_p2.connect(poller.write_setpoint_p2, Qt.DirectConnection)
+    window.request_estado.connect(poller.write_estado, Qt.DirectConnection)
+    window.request_deshielo.connect(poller.trigger_deshielo, Qt.DirectConnection)
+    window.request_deshielo_set.connect(poller.set_deshielo, Qt.DirectConnection)
     window.update_tunnel_tags.connect(poller.update_tunnel_tags)
     window.update_tunnel_calibrations.connect(poller.update_tunnel_calibrations)
+    window.detail_tunnel_changed.connect(poller.set_detail_tunnel)
 
     def apply_settings(new_plc_cfg):
         # Guardar y reiniciar infraestructura
-        nonlocal plc, poller, poller_thread, app_cfg
+        nonlocal plc, poller, poller_thread
         app_cfg.plc = new_plc_cfg
         cfg_manager.save(app_cfg)
 
@@ -79,23 +131,36 @@ def main():
         poller_thread.wait()
 
         # Re-crear PLC y Poller
-        plc = build_plc(new_plc_cfg, tunnels)
+        plc = build_topology(app_cfg, signals)
         poller_thread = QThread()
-        poller = Poller(plc=plc, tunnels=tunnels, interval_ms=new_plc_cfg.poll_interval_ms)
+        poller = Poller(
+            plc=plc,
+            tunnels=tunnels,
+            interval_ms=new_plc_cfg.poll_interval_ms,
+            slow_interval_ms=new_plc_cfg.slow_interval_ms,
+            pacer=PollPacer.from_config(new_plc_cfg),
+            changes=ChangeDetector.from_config(new_plc_cfg, signals),
+            history=history,
+            historian=historian,
+        )
         poller.moveToThread(poller_thread)
 
         # Re-conectar señales
         poller.updated.connect(window.on_data_update)
         poller.plc_status_changed.connect(window.on_plc_status)
         poller.plc_error.connect(window.on_plc_error)
-        window.request_setpoint.connect(poller.write_setpoint)
-        window.request_setpoint_p1.connect(poller.write_setpoint_p1)
-        window.request_setpoint_p2.connect(poller.write_setpoint_p2)
-        window.request_estado.connect(poller.write_estado)
-        window.request_deshielo.connect(poller.trigger_deshielo)
-        window.request_deshielo_set.connect(poller.set_deshielo)
+        poller.connection_event.connect(window.on_connection_event)
+        poller.command_done.connect(window.on_command_done)
+        window.request_setpoint.connect(poller.write_setpoint, Qt.DirectConnection)
+        window.request_setpoint_p1.connect(poller.write_setpoint_p1, Qt.DirectConnection)
+        window.request_setpoint_p2.connect(poller.write_setpoint_p2, Qt.DirectConnection)
+        window.request_estado.connect(poller.write_estado, Qt.DirectConnection)
+        window.request_deshielo.connect(poller.trigger_deshielo, Qt.DirectConnection)
+        window.request_deshielo_set.connect(poller.set_deshielo, Qt.DirectConnection)
         window.update_tunnel_tags.connect(poller.update_tunnel_tags)
         window.update_tunnel_calibrations.connect(poller.update_tunnel_calibrations)
+        window.detail_tunnel_changed.connect(poller.set_detail_tunnel)
+        poller.set_detail_tunnel(window.current_detail_tunnel())
 
         # Iniciar
         poller_thread.started.connect(poller.start)
@@ -109,14 +174,19 @@ def main():
             window.view_settings.show_test_result("Modo Simulación activo. No se requiere conexión.", True)
             return
         try:
-            tmp = Snap7PLC(plc_cfg, tunnels)
+            tmp = Snap7PLC(plc_cfg, tunnels, signals)
         except Exception as e:
             window.view_settings.show_test_result(f"No se pudo inicializar Snap7: {e}", False)
             return
         ok = tmp.connect()
         if ok:
+            try:
+                st = tmp.read_stats()
+                extra = f" — PDU {st['pdu_size']} bytes, {st['requests_planned']} peticiones/ciclo"
+            except Exception:
+                extra = ""
             window.view_settings.show_test_result(
-                f"Conectado a {plc_cfg.ip}:{getattr(plc_cfg, 'port', 102)} (rack {plc_cfg.rack}, slot {plc_cfg.slot})",
+                f"Conectado a {plc_cfg.ip}:{getattr(plc_cfg, 'port', 102)} (rack {plc_cfg.rack}, slot {plc_cfg.slot}){extra}",
                 True,
             )
             try:
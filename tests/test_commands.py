@@ -0,0 +1,78 @@
+import time
+
+from hmi.commands import COALESCE_WINDOW_S, PRIORITY_NORMAL, PRIORITY_SAFETY, CommandQueue, WriteCommand
+
+
+class Writer:
+    """batch_writer falso: anota cada bloque y acepta todo."""
+
+    def __init__(self, log=None):
+        self.calls = []
+        self.log = log if log is not None else []
+
+    def __call__(self, items):
+        self.calls.append(list(items))
+        self.log.extend(("write", item) for item in items)
+        return [None] * len(items)
+
+
+def _setpoint(tunnel_id, value, delay_s=COALESCE_WINDOW_S):
+    return WriteCommand(
+        "setpoint",
+        tunnel_id,
+        lambda: True,
+        PRIORITY_NORMAL,
+        write=(tunnel_id, "setpoint", value),
+        coalesce_key=("setpoint", tunnel_id),
+        delay_s=delay_s,
+    )
+
+
+def test_setpoints_within_window_coalesce_into_one_write():
+    writer = Writer()
+    queue = CommandQueue(batch_writer=writer)
+    futures = [queue.submit(_setpoint(1, v)) for v in (-10.0, -12.0, -15.0)]
+    assert len(queue) == 1
+    # Dentro de la ventana aún no se escribe nada
+    assert queue.run_pending() == 0
+    time.sleep(COALESCE_WINDOW_S + 0.02)
+    queue.run_pending()
+    # Una sola escritura con el último valor
+    assert writer.calls == [[(1, "setpoint", -15.0)]]
+    results = [f.result(timeout=0) for f in futures]
+    assert all(r.ok for r in results)
+    assert [r.coalesced for r in results] == [2, 0, 0]
+    assert len(queue) == 0
+
+
+def test_safety_command_jumps_ahead_of_queued_setpoints():
+    log = []
+    queue = CommandQueue(batch_writer=Writer(log))
+    setpoints = [queue.submit(_setpoint(t, -18.0, delay_s=0.0)) for t in (1, 2)]
+    stop = queue.submit(WriteCommand("apagar", 3, lambda: log.append(("apagar", 3)) or True, PRIORITY_SAFETY))
+    # Entre peticiones de lectura solo se ejecutan las de seguridad
+    assert queue.run_pending(PRIORITY_SAFETY) == 1
+    assert log == [("apagar", 3)]
+    assert stop.result(timeout=0).ok
+    assert not any(f.done() for f in setpoints)
+    queue.run_pending()
+    assert log[1:] == [("write", (1, "setpoint", -18.0)), ("write", (2, "setpoint", -18.0))]
+
+
+def test_safety_runs_first_when_draining_everything():
+    log = []
+    queue = CommandQueue(batch_writer=Writer(log))
+    queue.submit(_setpoint(1, -18.0, delay_s=0.0))
+    queue.submit(WriteCommand("apagar", 2, lambda: log.append(("apagar", 2)) or True, PRIORITY_SAFETY))
+    assert queue.run_pending() == 2
+    assert log[0] == ("apagar", 2)
+
+
+def test_batch_errors_are_reported_per_command():
+    queue = CommandQueue(batch_writer=lambda items: [None, "Escritura rechazada"])
+    ok = queue.submit(_setpoint(1, -18.0, delay_s=0.0))
+    bad = queue.submit(_setpoint(2, -18.0, delay_s=0.0))
+    queue.run_pending()
+    assert ok.result(timeout=0).ok
+    result = bad.result(timeout=0)
+    assert not result.ok and result.error == "Escritura rechazada"
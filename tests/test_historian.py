@@ -0,0 +1,22 @@
+import time
+
+import numpy as np
+
+from hmi.historian import DiskHistorian
+
+
+def test_sync_due_flushes_without_new_samples(tmp_path):
+    hist = DiskHistorian(tmp_path, [1, 2], ["temp_ambiente"], interval_s=1.0, fsync_s=0.05)
+    row = np.zeros((1, 2), dtype=np.float32)
+    now = time.time()
+    assert hist.append_row(now, row)
+    assert hist.append_row(now + 1.0, row)
+    # Recién sincronizado al abrir: lo último sigue pendiente hasta que venza fsync_s
+    assert hist._dirty
+    assert not hist.sync_due()
+    time.sleep(0.06)
+    # Sin más muestras, la llamada periódica hace el fsync
+    assert hist.sync_due()
+    assert not hist._dirty
+    assert not hist.sync_due()
+    hist.close()
@@ -0,0 +1,66 @@
+import threading
+import time
+
+from hmi.commands import PRIORITY_SAFETY, CommandQueue, WriteCommand
+from hmi.config import ConfigManager
+from hmi.multi_plc import MultiPLC
+from hmi.plc_client import BasePLC
+
+
+class SlowPLC(BasePLC):
+    """PLC de prueba: cada lectura son 20 peticiones de 50 ms, con punto de preempción entre ellas."""
+
+    def __init__(self, cfg, tunnels):
+        super().__init__(cfg, tunnels)
+        self.log = []
+        self.read_done = threading.Event()
+
+    def connect(self) -> bool:
+        return True
+
+    def is_connected(self) -> bool:
+        return True
+
+    def read_all(self, scan_classes=None):
+        for _ in range(20):
+            self._preempt()
+            time.sleep(0.05)
+        self.log.append("read_done")
+        self.read_done.set()
+        return self._snaps.next()
+
+    def write_estado(self, tunnel_id: int, value: bool) -> bool:
+        self.log.append(("write_estado", tunnel_id, value))
+        return True
+
+
+def _multi():
+    cfg = ConfigManager().default_config()
+    child = SlowPLC(cfg.plc, cfg.tunnels)
+    return MultiPLC(cfg.plc, cfg.tunnels, {cfg.plc.id: child}), child
+
+
+def test_safety_write_preempts_slow_child_read():
+    plc, child = _multi()
+    # Como el Poller: las órdenes de seguridad se atienden en los puntos de preempción
+    commands = CommandQueue(plc.last_error)
+    plc.preempt_hook = lambda: commands.run_pending(PRIORITY_SAFETY)
+    fut = commands.submit(WriteCommand("apagar", 1, lambda: plc.write_estado(1, False), PRIORITY_SAFETY))
+    plc.read_all()
+    assert fut.result(timeout=2.0).ok
+    assert child.read_done.wait(2.0)
+    # El paro se escribió antes de que terminara la lectura en curso
+    assert child.log == [("write_estado", 1, False), "read_done"]
+
+
+def test_write_does_not_wait_for_read_in_progress():
+    plc, child = _multi()
+    reader = threading.Thread(target=plc.read_all)
+    reader.start()
+    time.sleep(0.1)
+    started = time.monotonic()
+    assert plc.write_estado(1, False)
+    assert time.monotonic() - started < 0.5
+    reader.join()
+    assert child.read_done.wait(2.0)
+    assert child.log[0] == ("write_estado", 1, False)
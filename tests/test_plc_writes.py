@@ -0,0 +1,110 @@
+import pytest
+
+from hmi.models import PLCConfig, TagAddress, TunnelConfig
+
+pytest.importorskip("snap7")
+
+from hmi.plc_client import S7_WL_BIT, S7_WL_BYTE, Snap7PLC  # noqa: E402
+
+
+class FakeClient:
+    """Cliente snap7 falso.
+
+    ``error`` es la excepción que devuelve write_area; ``reject`` son las
+    (DB, inicio) que write_multi_vars rechaza en el resultado del ítem.
+    """
+
+    def __init__(self, error=None, reject=()):
+        self.error = error
+        self.reject = set(reject)
+        self.writes = []
+        self.requests = []
+
+    def write_multi_vars(self, items):
+        request = []
+        for item in items:
+            request.append((item.DBNumber, item.WordLen, item.Start, item.Amount, item.pData[0]))
+            if (item.DBNumber, item.Start) in self.reject:
+                item.Result = 0x05
+        self.requests.append(request)
+
+    def write_area(self, area, db, start, data):
+        if self.error is not None:
+            raise self.error
+        self.writes.append((db, start, bytes(data)))
+
+
+def _plc(client):
+    tunnel = TunnelConfig(
+        id=1,
+        name="Túnel 1",
+        tags={
+            "temp_ambiente": TagAddress(db=101, start=0, type="REAL"),
+            "temp_pulpa1": TagAddress(db=101, start=4, type="REAL"),
+            "temp_pulpa2": TagAddress(db=101, start=8, type="REAL"),
+            "setpoint": TagAddress(db=201, start=0, type="REAL"),
+            "estado": TagAddress(db=301, start=0, type="BOOL"),
+            "cmd_encender": TagAddress(db=301, start=0, type="BOOL", bit=1),
+            "cmd_apagar": TagAddress(db=301, start=1, type="BOOL", bit=2),
+            "setpoint_pulpa1": TagAddress(db=201, start=4, type="REAL"),
+        },
+    )
+    plc = Snap7PLC(PLCConfig(simulation=False), [tunnel])
+    plc.client = client
+    plc._connected = True
+    return plc
+
+
+def test_rejected_write_keeps_connection():
+    plc = _plc(FakeClient(RuntimeError("CPU : Address out of range")))
+    assert not plc.write_setpoint(1, -18.0)
+    assert "Address out of range" in plc.last_error()
+    assert plc._connected
+
+
+def test_comm_error_on_write_drops_connection():
+    plc = _plc(FakeClient(RuntimeError("ISO : An error occurred during send TCP : Connection reset by peer")))
+    assert not plc.write_setpoint(1, -18.0)
+    assert not plc._connected
+
+
+def test_write_many_mixed_batch_reports_per_item():
+    # El setpoint_pulpa1 (DB201.4) lo rechaza la CPU
+    client = FakeClient(reject={(201, 4)})
+    plc = _plc(client)
+    results = plc.write_many(
+        [
+            (1, "setpoint", -18.0),
+            (1, "cmd_apagar", True),
+            (1, "setpoint_pulpa1", -2.0),
+            (1, "estado", True),
+            (1, "no_existe", 1.0),
+            (1, "cmd_encender", False),
+        ]
+    )
+    assert results[0] is None and results[1] is None and results[3] is None and results[5] is None
+    assert "rechazada" in results[2] and "DB201.4" in results[2]
+    assert "no_existe" in results[4]
+    # Todo en una petición; la conexión sigue arriba tras el rechazo
+    assert len(client.requests) == 1
+    assert plc._connected
+    items = client.requests[0]
+    bits = [it for it in items if it[1] == S7_WL_BIT]
+    reals = [it for it in items if it[1] == S7_WL_BYTE]
+    # BOOL como bit (inicio = byte·8 + bit, cantidad 1), sin leer el byte antes
+    assert bits == [
+        (301, S7_WL_BIT, 0, 1, 1),
+        (301, S7_WL_BIT, 1, 1, 0),
+        (301, S7_WL_BIT, 10, 1, 1),
+    ]
+    assert sorted((r[0], r[2], r[3]) for r in reals) == [(201, 0, 4), (201, 4, 4)]
+    # Los bits del mismo byte viajan juntos y antes que los REAL
+    assert items[: len(bits)] == bits
+
+
+def test_write_many_same_bit_keeps_last_value():
+    client = FakeClient()
+    plc = _plc(client)
+    results = plc.write_many([(1, "estado", True), (1, "estado", False)])
+    assert results == [None, None]
+    assert [(it[2], it[4]) for it in client.requests[0]] == [(0, 0)]
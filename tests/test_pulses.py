@@ -0,0 +1,55 @@
+from time import monotonic
+
+from hmi.config import ConfigManager
+from hmi.pulses import PulseScheduler, is_rejection
+from hmi.simulator import SimulatedPLC
+
+REJECTED = "Escritura rechazada DB301.0.1/BOOL: código 0x5"
+COMM = "Escritura multi-variable fallida (1 ítems): ISO : An error occurred during recv TCP"
+
+
+def _run(scheduler, error, times):
+    """Ejecutar ``times`` veces todo lo pendiente con un write_many que siempre falla con ``error``."""
+    failed = []
+    for _ in range(times):
+        failed = scheduler.run_due(lambda items: [error] * len(items), everything=True)
+    return failed
+
+
+def test_error_classification():
+    assert is_rejection(REJECTED)
+    assert is_rejection("Tag cmd_x no definido para túnel 3")
+    assert is_rejection("Escritura fallida DB301.0/BOOL: CPU : Address out of range")
+    assert not is_rejection(COMM)
+    assert not is_rejection("PLC desconectado; reintento en 4 s")
+
+
+def test_rejected_reset_is_dropped_after_max_attempts():
+    scheduler = PulseScheduler(max_rejections=3)
+    scheduler.schedule(1, "cmd_encender", 0.0)
+    assert not any(r.dropped for r in _run(scheduler, REJECTED, 2))
+    assert len(scheduler) == 1
+    failed = _run(scheduler, REJECTED, 1)
+    assert [r.dropped for r in failed] == [True]
+    assert len(scheduler) == 0
+    assert scheduler.dropped == 1
+
+
+def test_comm_failure_retries_with_backoff():
+    scheduler = PulseScheduler(retry_s=0.5, retry_cap_s=4.0, max_rejections=3)
+    reset = scheduler.schedule(1, "cmd_encender", 0.0)
+    delays = []
+    for _ in range(6):
+        _run(scheduler, COMM, 1)
+        delays.append(round(reset.due - monotonic(), 1))
+    # Nunca se descarta; la espera se dobla hasta el tope
+    assert delays == [0.5, 1.0, 2.0, 4.0, 4.0, 4.0]
+    assert len(scheduler) == 1 and not reset.dropped
+    assert scheduler.dropped == 0
+
+
+def test_simulator_accepts_command_resets(tmp_path):
+    cfg = ConfigManager(tmp_path / "config.json").default_config()
+    plc = SimulatedPLC(cfg.plc, cfg.tunnels)
+    assert plc.write_many([(1, "cmd_deshielo", False), (1, "cmd_encender", False)]) == [None, None]
+    assert is_rejection(plc.write_many([(1, "no_existe", 1.0)])[0])
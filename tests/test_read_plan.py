@@ -0,0 +1,166 @@
+import struct
+from time import time
+
+import pytest
+
+from hmi.models import QUALITY_BAD_ADDRESS, QUALITY_GOOD, PLCConfig, TagAddress, TunnelConfig
+from hmi.read_plan import (
+    MAX_VARS_PER_REQUEST,
+    chunk_spans,
+    compile_read_plan,
+    plan_spans,
+)
+
+snap7 = pytest.importorskip("snap7")
+
+from hmi.plc_client import Snap7PLC  # noqa: E402
+
+
+def _tunnel(tid, temp_db, estado_bit):
+    """Túnel con el setpoint en DB201.0, compartido por todos."""
+    return TunnelConfig(
+        id=tid,
+        name=f"Túnel {tid}",
+        tags={
+            "temp_ambiente": TagAddress(db=temp_db, start=0, type="REAL"),
+            "temp_pulpa1": TagAddress(db=temp_db, start=4, type="REAL"),
+            "temp_pulpa2": TagAddress(db=temp_db, start=8, type="REAL"),
+            "setpoint": TagAddress(db=201, start=0, type="REAL"),
+            "estado": TagAddress(db=300, start=0, type="BOOL", bit=estado_bit),
+        },
+    )
+
+
+def _tunnels():
+    return {1: _tunnel(1, 101, 0), 2: _tunnel(2, 102, 1)}
+
+
+def _compile(**kw):
+    # Todo en la clase rápida: un solo grupo
+    return compile_read_plan(_tunnels(), lambda area: area, scan_classes={}, **kw)
+
+
+def test_plan_spans_merges_within_coalesce_gap():
+    tags = [
+        TagAddress(db=1, start=0, type="REAL"),
+        TagAddress(db=1, start=20, type="REAL"),  # hueco de 16 bytes: se fusiona
+        TagAddress(db=1, start=41, type="REAL"),  # hueco de 17 bytes: tramo nuevo
+        TagAddress(db=2, start=4, type="REAL"),  # otro DB: tramo nuevo
+    ]
+    spans = plan_spans(tags, max_gap=16)
+    assert [(s.db, s.start, s.size) for s in spans] == [(1, 0, 24), (1, 41, 4), (2, 4, 4)]
+    assert [len(s.tags) for s in spans] == [2, 1, 1]
+
+
+def test_plan_spans_negative_gap_disables_merge():
+    tags = [TagAddress(db=1, start=0, type="REAL"), TagAddress(db=1, start=4, type="REAL")]
+    assert len(plan_spans(tags, max_gap=-1)) == 2
+    assert len(plan_spans(tags, max_gap=0)) == 1
+
+
+def test_plan_spans_respects_max_span():
+    tags = [TagAddress(db=1, start=4 * i, type="REAL") for i in range(10)]
+    spans = plan_spans(tags, max_gap=16, max_span=16)
+    assert [s.size for s in spans] == [16, 16, 8]
+
+
+@pytest.mark.parametrize("pdu", [240, 480])
+def test_chunk_spans_fits_pdu(pdu):
+    sizes = [200, 100, 60, 30, 9, 4, 4, 1] + [4] * 30
+    requests = chunk_spans(sizes, pdu)
+    assert sorted(i for r in requests for i in r) == list(range(len(sizes)))
+    max_items = min(MAX_VARS_PER_REQUEST, (pdu - 12) // 12)
+    for r in requests:
+        assert len(r) <= max_items
+        # Respuesta: cabecera + (4 + datos, alineados a par) por ítem
+        assert 14 + sum(4 + sizes[i] + (sizes[i] & 1) for i in r) <= pdu
+    # First-fit: los tramos pequeños rellenan los huecos de los grandes
+    assert len(requests) == len(chunk_spans(sorted(sizes, reverse=True), pdu))
+
+
+def test_compile_read_plan_dedups_shared_location():
+    plan = _compile()
+    assert not plan.errors
+    keys = [loc.key for loc in plan.locations]
+    assert len(keys) == len(set(keys))
+    # 3 temperaturas por túnel + setpoint compartido + un bit de estado por túnel
+    assert len(plan.locations) == 9
+    sp1 = plan.tunnels[0].fields["setpoint"]
+    sp2 = plan.tunnels[1].fields["setpoint"]
+    assert sp1 == sp2
+    assert sorted(plan.locations[sp1].users) == [(1, "setpoint"), (2, "setpoint")]
+    # Los dos bits de DB300.0 son ubicaciones distintas en el mismo tramo
+    assert plan.tunnels[0].fields["estado"] != plan.tunnels[1].fields["estado"]
+    assert sorted((s.db, s.start, s.size) for s in plan.spans) == [(101, 0, 12), (102, 0, 12), (201, 0, 4), (300, 0, 1)]
+
+
+def test_span_decoder_values_and_bits():
+    plan = _compile()
+    buf = plan.new_buffer()
+    raw = {
+        101: struct.pack(">fff", 1.5, 2.5, 3.5),
+        102: struct.pack(">fff", -4.0, 5.0, 6.0),
+        201: struct.pack(">f", -18.0),
+        300: bytes([0b10]),
+    }
+    for span in plan.spans:
+        span.decoder.decode_into(raw[span.db], buf, 100.0)
+    t1, t2 = plan.tunnels
+    assert [buf.values[t1.fields[k]] for k in ("temp_ambiente", "temp_pulpa1", "temp_pulpa2")] == [1.5, 2.5, 3.5]
+    assert [buf.values[t2.fields[k]] for k in ("temp_ambiente", "temp_pulpa1", "temp_pulpa2")] == [-4.0, 5.0, 6.0]
+    assert buf.values[t1.fields["setpoint"]] == -18.0
+    assert buf.values[t1.fields["estado"]] == 0
+    assert buf.values[t2.fields["estado"]] == 1
+    assert all(q == QUALITY_GOOD for q in buf.quality)
+    assert all(ts == 100.0 for ts in buf.ts)
+
+
+class FakeClient:
+    """Cliente snap7 falso: ``bad`` son las (db, byte) que la CPU rechaza."""
+
+    def __init__(self, bad=()):
+        self.bad = set(bad)
+        self.reads = []
+
+    def read_area(self, area, db, start, size):
+        self.reads.append((db, start))
+        if (db, start) in self.bad:
+            raise RuntimeError("CPU : Address out of range")
+        return bytearray(size)
+
+
+def _plc(client):
+    plc = Snap7PLC(PLCConfig(simulation=False, read_mode="single", quarantine_retry_s=30.0), list(_tunnels().values()))
+    plc.client = client
+    plc._connected = True
+    return plc
+
+
+def test_rejected_address_is_quarantined_and_retried():
+    client = FakeClient(bad={(102, 4)})
+    plc = _plc(client)
+    before = time()
+    plc.read_all()
+    # Rechazo de la CPU: calidad BAD_ADDRESS, cuarentena y la conexión sigue arriba
+    i = plc._plan.tunnels[1].fields["temp_pulpa1"]
+    key = plc._plan.locations[i].key
+    assert plc._values.quality[i] == QUALITY_BAD_ADDRESS
+    assert plc._quarantine[key] >= before + 30.0
+    assert plc._connected
+
+    # Antes del plazo no se vuelve a pedir; el plan la deja fuera de los tramos
+    client.reads.clear()
+    plc.read_all()
+    assert (102, 4) not in client.reads
+    i = plc._plan.tunnels[1].fields["temp_pulpa1"]
+    assert plc._plan.quarantined == [i]
+    assert plc._values.quality[i] == QUALITY_BAD_ADDRESS
+
+    # Vencido el plazo y corregida la dirección, sale de la cuarentena
+    client.bad.clear()
+    plc._quarantine[key] = 0.0
+    plc.read_all()
+    assert (102, 4) in client.reads
+    assert plc._values.quality[i] == QUALITY_GOOD
+    assert key not in plc._quarantine
+    assert not plc._read_plan().quarantined
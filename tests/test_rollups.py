@@ -0,0 +1,154 @@
+import time
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from hmi.decimate import lttb, minmax
+from hmi.historian import DiskHistorian
+from hmi.rollups import AGGREGATES, Downsampler, TieredHistorian
+from hmi.sqlite_historian import SqliteHistorian
+
+# Inicio de hora exacto: los intervalos de 1 min y 1 h empiezan en T0
+T0 = 1_700_000_000.0 - 1_700_000_000.0 % 3600.0
+KEYS = ["temp_ambiente"]
+
+
+def _sample(value):
+    return {1: SimpleNamespace(temp_ambiente=value, quality={})}
+
+
+def _store(tmp_path, backend, name, period, days=90):
+    aggregates = AGGREGATES if name != "raw" else ()
+    if backend == "sqlite":
+        return SqliteHistorian(
+            tmp_path / f"{name}.sqlite3", [1], KEYS, period, batch_s=0.0, retention_days=days, aggregates=aggregates
+        )
+    return DiskHistorian(tmp_path / name, [1], KEYS, period, retention_days=days, aggregates=aggregates)
+
+
+def _tiered(tmp_path, backend="file", days=(90, 90, 90)):
+    tiers = [
+        (name, period, _store(tmp_path, backend, name, period, d))
+        for (name, period), d in zip((("1m", 60.0), ("1h", 3600.0)), days[1:])
+    ]
+    return TieredHistorian(_store(tmp_path, backend, "raw", 1.0, days[0]), tiers)
+
+
+def _row(store, ts):
+    """Agregados (min, max, avg, last, n) de la fila ``ts`` de un nivel."""
+    out = []
+    for agg in AGGREGATES:
+        t, v = store.query(1, "temp_ambiente", ts, ts, agg=agg)
+        assert list(t) == [ts]
+        out.append(float(v[0]))
+    return out
+
+
+@pytest.mark.parametrize("backend", ["file", "sqlite"])
+def test_close_and_reopen_within_bucket_keeps_all_samples(tmp_path, backend):
+    hist = _tiered(tmp_path, backend)
+    for i in range(30):
+        hist.append(_sample(float(i)), T0 + i)
+    # Reinicio del Poller a mitad de minuto: se guarda la fila a medias
+    hist.close()
+    for i in range(30, 61):
+        hist.append(_sample(float(i)), T0 + i)
+    hist.close()
+    one_min, one_hour = hist.tiers[0][2], hist.tiers[1][2]
+    # El minuto completo sustituye a la fila a medias
+    assert _row(one_min, T0) == [0.0, 59.0, 29.5, 59.0, 60.0]
+    # La hora, guardada a medias en cada cierre, lleva las 61 muestras una sola vez
+    assert _row(one_hour, T0) == [0.0, 60.0, 30.0, 60.0, 61.0]
+
+
+def test_downsampler_cascade_two_tiers():
+    nan = np.nan
+    minute = Downsampler(60.0, (1, 2))
+    hour = Downsampler(3600.0, (1, 2))
+    rows = []
+
+    def cascade(closed):
+        # El intervalo devuelto es un búfer interno: copiarlo antes de seguir
+        if closed is not None:
+            rows.append((closed[0], closed[1].copy()))
+            hour.add_rollup(*closed)
+
+    # Dos túneles; el segundo no tiene muestras válidas en el primer minuto y nadie en el tercero
+    samples = [
+        (0, [5.0, nan]),
+        (10, [nan, nan]),
+        (20, [1.0, nan]),
+        (60, [3.0, nan]),
+        (70, [7.0, 2.0]),
+        (120, [nan, nan]),
+    ]
+    for dt, values in samples:
+        cascade(minute.add_sample(T0 + dt, np.array([values], dtype=np.float32)))
+    cascade(minute.flush())
+
+    assert [ts for ts, _ in rows] == [T0, T0 + 60, T0 + 120]
+    m0, m1, m2 = (agg[:, 0] for _, agg in rows)
+    # (min, max, avg, last, n) por túnel
+    np.testing.assert_array_equal(m0[:, 0], [1.0, 5.0, 3.0, 1.0, 2.0])
+    np.testing.assert_array_equal(m0[:, 1], [nan, nan, nan, nan, 0.0])
+    np.testing.assert_array_equal(m1[:, 0], [3.0, 7.0, 5.0, 7.0, 2.0])
+    np.testing.assert_array_equal(m1[:, 1], [2.0, 2.0, 2.0, 2.0, 1.0])
+    np.testing.assert_array_equal(m2, [[nan, nan]] * 4 + [[0.0, 0.0]])
+
+    bucket, h = hour.flush()
+    assert bucket == T0
+    # El minuto vacío no pisa el último valor ni cuenta en la media
+    np.testing.assert_array_equal(h[:, 0, 0], [1.0, 7.0, 4.0, 7.0, 4.0])
+    np.testing.assert_array_equal(h[:, 0, 1], [2.0, 2.0, 2.0, 2.0, 1.0])
+    assert hour.flush() is None
+
+
+def test_select_tier_by_width_and_retention(tmp_path):
+    hist = _tiered(tmp_path, days=(7, 365, 3650))
+    now = time.time()
+    day = 86400.0
+    # Al menos un punto por píxel en el nivel más grueso posible
+    assert hist.select_tier(now - 900.0, now, 1000) == 0
+    assert hist.select_tier(now - 7 * day + 60.0, now, 1000) == 1
+    assert hist.select_tier(now - 300 * day, now, 1000) == 2
+    # Sin ancho, el bruto; si el bruto ya purgó el inicio del rango, un nivel más grueso
+    assert hist.select_tier(now - 3600.0, now) == 0
+    assert hist.select_tier(now - 30 * day, now, 100_000) == 1
+    assert hist.select_tier(now - 2 * 365 * day, now, 100_000) == 2
+    assert [hist.period_of(level) for level in range(3)] == [1.0, 60.0, 3600.0]
+
+
+def test_minmax_keeps_bucket_extremes():
+    rng = np.random.default_rng(1)
+    ts = np.arange(1000, dtype=np.float64)
+    values = rng.normal(0.0, 1.0, 1000)
+    values[137] = 50.0
+    values[642] = -50.0
+    values[800:900] = np.nan
+    out_ts, out_v = minmax(ts, values, 10)
+    assert len(out_ts) == 20
+    assert np.all(np.diff(out_ts) >= 0)
+    for k in range(10):
+        chunk = slice(100 * k, 100 * (k + 1))
+        inside = (out_ts >= 100 * k) & (out_ts < 100 * (k + 1))
+        if k == 8:
+            # Tramo sin datos: hueco
+            assert np.isnan(out_v[inside]).all()
+            continue
+        assert sorted(out_v[inside]) == [np.nanmin(values[chunk]), np.nanmax(values[chunk])]
+    assert 50.0 in out_v and -50.0 in out_v
+
+
+def test_lttb_keeps_endpoints_and_size():
+    ts = np.linspace(0.0, 600.0, 5000)
+    values = np.sin(ts / 30.0)
+    values[1000:1100] = np.nan
+    out_ts, out_v = lttb(ts, values, 200)
+    assert len(out_ts) == len(out_v) == 200
+    assert out_ts[0] == ts[0] and out_ts[-1] == ts[-1]
+    assert out_v[0] == values[0] and out_v[-1] == values[-1]
+    assert np.all(np.diff(out_ts) > 0)
+    assert not np.isnan(out_v).any()
+    # Sin reducir si ya hay pocos puntos
+    assert len(lttb(ts[:50], values[:50], 200)[0]) == 50
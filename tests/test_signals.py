@@ -0,0 +1,28 @@
+import json
+
+import pytest
+
+from hmi.config import ConfigManager
+from hmi.signals import CORE_SIGNALS, SignalRegistry, merge_signals
+
+
+@pytest.mark.parametrize("key", CORE_SIGNALS)
+def test_core_signal_cannot_be_disabled(key):
+    with pytest.raises(ValueError, match=key):
+        merge_signals([{"key": key, "enabled": False}])
+
+
+def test_optional_signal_can_be_disabled():
+    registry = SignalRegistry(merge_signals([{"key": "valvula_posicion", "enabled": False}]))
+    assert "valvula_posicion" not in registry
+    assert "estado" in registry
+
+
+def test_config_with_disabled_core_signal_fails_on_load(tmp_path):
+    manager = ConfigManager(tmp_path / "config.json")
+    manager.save(manager.default_config())
+    data = json.loads(manager.path.read_text(encoding="utf-8"))
+    data["signals"] = [{"key": "estado", "enabled": False}]
+    manager.path.write_text(json.dumps(data), encoding="utf-8")
+    with pytest.raises(ValueError, match="estado"):
+        manager.load()